@@ -1,28 +1,35 @@
 import logging
-
-# Create the Logger
-loggers = logging.getLogger(__name__)
-loggers.setLevel(logging.DEBUG)
-
-# Create the Handler for logging data to the console and a file
-file_handler = logging.FileHandler(filename='fpl.log')
-file_handler.setLevel(logging.INFO)
-
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-
-# Create a Formatter for formatting the log messages
-logger_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-# Add the Formatter to the Handlers
-file_handler.setFormatter(logger_formatter)
-console_handler.setFormatter(logger_formatter)
-
-# Add the Handler to the Logger
-loggers.addHandler(file_handler)
-loggers.addHandler(console_handler)
-loggers.info('Completed configuring logger()!')
-
-
-# Block DEBUG level from other modules
-logging.getLogger('matplotlib').setLevel(logging.WARNING)
+from typing import Optional
+
+# Nothing is configured on import: the command line (fpl.cli) or the scripts call setup_logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+def setup_logging(level: int = logging.DEBUG, log_file: Optional[str] = 'fpl.log'):
+    """
+    Log the messages of the project to the console and to a file
+    :param level:       Level of the console messages
+    :param log_file:    File receiving the messages from INFO level (none if None)
+    """
+    # Create the Logger
+    loggers = logging.getLogger(__name__)
+    loggers.setLevel(logging.DEBUG)
+
+    # Create a Formatter for formatting the log messages
+    logger_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Create the Handler for logging data to the console and a file
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(level)
+    console_handler.setFormatter(logger_formatter)
+    loggers.addHandler(console_handler)
+
+    if log_file is not None:
+        file_handler = logging.FileHandler(filename=log_file)
+        file_handler.setLevel(logging.INFO)
+        file_handler.setFormatter(logger_formatter)
+        loggers.addHandler(file_handler)
+    loggers.debug('Completed configuring logger()!')
+
+    # Block DEBUG level from other modules
+    logging.getLogger('matplotlib').setLevel(logging.WARNING)
@@ -0,0 +1,4 @@
+import sys
+from fpl.cli import main
+
+sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Command line of the project: python -m fpl <command> (fpl <command> once installed)
+Only argparse is loaded on start, each command imports its own dependencies (pandas, pulp, requests)
+"""
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_TARGETS = ['bootstrap', 'players', 'fixtures', 'history']
+
+
+def cmd_scrape(args: argparse.Namespace):
+    from fpl.pipeline.download import scrape
+    from fpl.pipeline.download.client import ScraperClient
+    client = ScraperClient()
+    if args.target == 'bootstrap':
+        scrape.scrape_bootstrap(compression=args.compression, client=client)
+    elif args.target == 'fixtures':
+        scrape.scrape_fixtures(compression=args.compression, client=client)
+    elif args.target == 'players':
+        scrape.scrape_player_detailed(compression=args.compression, client=client)
+    else:
+        scrape.scrape_manager_history(nb_managers=args.nb_managers, include_current=args.include_current, client=client)
+
+
+def cmd_preprocess(args: argparse.Namespace):
+    import fpl.pipeline.transform.clean_historical
+    import fpl.pipeline.transform.preprocess_bootstrap
+    fpl.pipeline.transform.preprocess_bootstrap.run(
+        workers=args.workers, incremental=args.incremental, horizon=args.horizon
+    )
+    fpl.pipeline.transform.clean_historical.run(workers=args.workers, incremental=args.incremental)
+
+
+def cmd_features(args: argparse.Namespace):
+    import fpl.pipeline.transform.features
+    fpl.pipeline.transform.features.run(reload_data=args.reload, incremental=args.incremental)
+
+
+def cmd_predict(args: argparse.Namespace):
+    import fpl.model.predict
+    fpl.model.predict.run(reload_data=args.reload)
+
+
+def cmd_pipeline(args: argparse.Namespace):
+    import fpl.pipeline.dag
+    fpl.pipeline.dag.run(
+        workers=args.workers, force=args.force, incremental=args.incremental, horizon=args.horizon,
+        stage_workers=args.stage_workers
+    )
+
+
+def cmd_select(args: argparse.Namespace):
+    import fpl.main
+    fpl.main.select_weekly_players()
+
+
+def cmd_manager(args: argparse.Namespace):
+    import fpl.main
+    fpl.main.get_current_manager_info()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='fpl', description='Optimise team selection for Fantasy Football')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log debug messages to the console')
+    parser.add_argument('--log-file', default=None, help='Also log the messages from INFO level to this file')
+    parser.add_argument('--metrics', action='store_true', help='Record the metrics of the stages (data/metrics)')
+    parser.add_argument('--profile', action='store_true', help='Record a cProfile dump of the stages (data/metrics)')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    scrape = commands.add_parser('scrape', help='Download a snapshot from the FPL API')
+    scrape.add_argument('target', choices=SCRAPE_TARGETS)
+    scrape.add_argument('--compression', choices=['gzip', 'zstd'], default=None)
+    scrape.add_argument('--nb-managers', type=int, default=2000, help='Number of managers (history)')
+    scrape.add_argument('--include-current', action='store_true', help='Include the current season (history)')
+    scrape.set_defaults(func=cmd_scrape)
+
+    preprocess = commands.add_parser('preprocess', help='Build the intermediate bootstrap / historical datasets')
+    _add_build_arguments(preprocess)
+    preprocess.set_defaults(func=cmd_preprocess)
+
+    features = commands.add_parser('features', help='Build the features')
+    features.add_argument('--reload', action='store_true', help='Preprocess the raw data first')
+    features.add_argument('--incremental', action='store_true', help='Only add the new gameweeks')
+    features.set_defaults(func=cmd_features)
+
+    predict = commands.add_parser('predict', help='Predict the points of the players')
+    predict.add_argument('--reload', action='store_true', help='Build the features first')
+    predict.set_defaults(func=cmd_predict)
+
+    pipeline = commands.add_parser('pipeline', help='Run the stages whose inputs changed (raw data -> predictions)')
+    _add_build_arguments(pipeline)
+    pipeline.add_argument('--force', action='store_true', help='Run all the stages')
+    pipeline.add_argument(
+        '--stage-workers', type=int, default=None,
+        help='Number of stages run at the same time, sharing the --workers processes (default: 2)'
+    )
+    pipeline.set_defaults(func=cmd_pipeline, workers=2)
+
+    select = commands.add_parser('select', help='Select the best team for the last gameweek')
+    select.set_defaults(func=cmd_select)
+
+    manager = commands.add_parser('manager', help='Show the team of the manager (fpl.credentials)')
+    manager.set_defaults(func=cmd_manager)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    import fpl
+    fpl.setup_logging(level=logging.DEBUG if args.verbose else logging.INFO, log_file=args.log_file)
+    if args.metrics or args.profile:
+        from fpl.constants.structure import DIR_PROFILES, FILE_METRICS
+        from fpl.utils import metrics
+        metrics.configure(FILE_METRICS if args.metrics else None, DIR_PROFILES if args.profile else None)
+    args.func(args)
+    return 0
+
+
+def _add_build_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes')
+    parser.add_argument('--incremental', action='store_true', help='Only process the new / changed snapshots')
+    parser.add_argument('--horizon', type=int, default=0, help='Number of gameweeks of fixture features')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
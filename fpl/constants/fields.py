@@ -33,6 +33,12 @@ GAME_1_TEAM_NAME = 'game_1_team_name'
 GAME_2_TEAM_NAME = 'game_2_team_name'
 GAME_1_TEAM_STRENGTH = 'game_1_team_strength'
 GAME_2_TEAM_STRENGTH = 'game_2_team_strength'
+# Fixtures of the next gameweeks (k = 1 is the next gameweek)
+FIXTURE_K_GAME_NB = 'fixture_{}_game_nb'
+FIXTURE_K_HOME_NB = 'fixture_{}_home_nb'
+FIXTURE_K_OPPONENT_STRENGTH = 'fixture_{}_opponent_strength'
+FIXTURE_HORIZON_GAME_NB = 'fixture_horizon_game_nb'
+FIXTURE_HORIZON_OPPONENT_STRENGTH = 'fixture_horizon_opponent_strength'
 
 # Other FPL info
 FPL_TRANSFERS_IN = 'fpl_transfers_in'
@@ -53,6 +59,13 @@ STAT_MINUTES_TOTAL_SEASON = 'stat_minutes_total_season'
 # Historical
 STAT_POINTS_AVG_SEASON_PREV = 'stat_points_avg_season_prev'
 
+# Form (current season, before the gameweek)
+FORM_GAMEWEEKS_NB = 'form_gameweeks_nb'
+FORM_POINTS_AVG_LAST_N = 'form_points_avg_last_n'
+FORM_POINTS_EWMA = 'form_points_ewma'
+FORM_MINUTES_EWMA = 'form_minutes_ewma'
+FORM_POINTS_PER_90 = 'form_points_per_90'
+
 #############################################
 # Machine Learning
 ML_PREDICT = 'predict'
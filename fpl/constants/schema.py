@@ -0,0 +1,91 @@
+# Types of the fields of the project (intermediate / processed datasets)
+# * category: names and positions (few distinct values, repeated on every row)
+# * Int64:    ids, gameweeks and counts (nullable, e.g. no gameweek at the end of the season)
+# * boolean:  flags (nullable, e.g. no second game)
+import re
+from typing import Dict, Optional
+import fpl.constants.fields as fld
+
+CATEGORY = 'category'
+INT = 'Int64'
+BOOL = 'boolean'
+FLOAT = 'float64'
+
+SCHEMA: Dict[str, str] = {
+    # General
+    fld.SEASON_ID: INT,
+    fld.SEASON_NAME: CATEGORY,
+    fld.GW: INT,
+    fld.GW_PREV: INT,
+    # Player
+    fld.PLAYER_ID: INT,
+    fld.PLAYER_ID_SEASON: INT,
+    fld.PLAYER_NAME: CATEGORY,
+    fld.PLAYER_STATUS: CATEGORY,
+    fld.PLAYER_CHANCE_PLAY: FLOAT,
+    fld.PLAYER_COST: INT,
+    fld.POSITION_ID: INT,
+    fld.PLAYER_POSITION: CATEGORY,
+    # Team
+    fld.TEAM_ID: INT,
+    fld.TEAM_ID_SEASON: INT,
+    fld.TEAM_NAME: CATEGORY,
+    fld.TEAM_STRENGTH: INT,
+    # Game to Play
+    fld.GAME_NB: INT,
+    fld.GAME_1_HOME: BOOL,
+    fld.GAME_2_HOME: BOOL,
+    fld.GAME_1_TEAM_ID_SEASON: INT,
+    fld.GAME_2_TEAM_ID_SEASON: INT,
+    fld.GAME_1_TEAM_NAME: CATEGORY,
+    fld.GAME_2_TEAM_NAME: CATEGORY,
+    fld.GAME_1_TEAM_STRENGTH: INT,
+    fld.GAME_2_TEAM_STRENGTH: INT,
+    fld.FIXTURE_HORIZON_GAME_NB: INT,
+    fld.FIXTURE_HORIZON_OPPONENT_STRENGTH: FLOAT,
+    # Other FPL info
+    fld.FPL_TRANSFERS_IN: INT,
+    fld.FPL_TRANSFERS_OUT: INT,
+    fld.FPL_COST_CHANGE: INT,
+    fld.FPL_SELECTED_BY: FLOAT,
+    fld.FPL_EXPECTED_POINTS: FLOAT,
+    fld.FPL_INFLUENCE: FLOAT,
+    fld.FPL_CREATIVITY: FLOAT,
+    fld.FPL_THREAT: FLOAT,
+    fld.FPL_ICT_INDEX: FLOAT,
+    # Result
+    fld.RESULT_POINTS_PREV: FLOAT,
+    fld.RESULT_POINTS: FLOAT,
+    fld.STAT_MINUTES_TOTAL_SEASON: FLOAT,
+    # Historical
+    fld.STAT_POINTS_AVG_SEASON_PREV: FLOAT,
+    # Form
+    fld.FORM_GAMEWEEKS_NB: INT,
+    fld.FORM_POINTS_AVG_LAST_N: FLOAT,
+    fld.FORM_POINTS_EWMA: FLOAT,
+    fld.FORM_MINUTES_EWMA: FLOAT,
+    fld.FORM_POINTS_PER_90: FLOAT,
+    # Machine Learning
+    fld.ML_PREDICT: FLOAT
+}
+
+# Fields built from a template (e.g. fixture_{}_game_nb)
+TEMPLATE_SCHEMA: Dict[str, str] = {
+    fld.FIXTURE_K_GAME_NB: INT,
+    fld.FIXTURE_K_HOME_NB: INT,
+    fld.FIXTURE_K_OPPONENT_STRENGTH: FLOAT
+}
+_TEMPLATE_PATTERNS = [
+    (re.compile('^' + re.escape(template).replace(r'\{\}', r'\d+') + '$'), dtype)
+    for template, dtype in TEMPLATE_SCHEMA.items()
+]
+
+
+def get_dtype(field: str) -> Optional[str]:
+    """ Type of a field, None if the field is not in the registry """
+    if field in SCHEMA:
+        return SCHEMA[field]
+    for pattern, dtype in _TEMPLATE_PATTERNS:
+        if pattern.match(field):
+            return dtype
+    return None
@@ -1,7 +1,8 @@
+import os
 import pathlib
 
-# Structure Data
-DIR_DATA = pathlib.Path(__file__).parent.parent.parent.joinpath('data')
+# Structure Data (FPL_DATA_DIR points the whole project to another data folder, e.g. a synthetic tree)
+DIR_DATA = pathlib.Path(os.environ.get('FPL_DATA_DIR') or pathlib.Path(__file__).parent.parent.parent.joinpath('data'))
 
 # Data - Raw
 DIR_RAW_PLAYER_DETAILS = DIR_DATA.joinpath('raw', 'player-details')
@@ -9,9 +10,25 @@ DIR_RAW_BOOTSTRAP = DIR_DATA.joinpath('raw', 'bootstrap')
 DIR_RAW_FIXTURES = DIR_DATA.joinpath('raw', 'fixtures')
 DIR_MANAGER_HISTORY = DIR_DATA.joinpath('raw', 'manager')
 
-FILE_INTER_BOOTSTRAP = DIR_DATA.joinpath('intermediate', 'bootstrap.csv')
-FILE_INTER_HISTORICAL = DIR_DATA.joinpath('intermediate', 'player-details.csv')
+FILE_INTER_BOOTSTRAP = DIR_DATA.joinpath('intermediate', 'bootstrap.parquet')
+FILE_INTER_HISTORICAL = DIR_DATA.joinpath('intermediate', 'player-details.parquet')
+FILE_INTER_SNAPSHOT_INDEX = DIR_DATA.joinpath('intermediate', 'snapshot-index.csv')
+DIR_INTER_BOOTSTRAP_WEEKS = DIR_DATA.joinpath('intermediate', 'bootstrap-weeks')
+DIR_INTER_BOOTSTRAP_PARTITIONS = DIR_DATA.joinpath('intermediate', 'bootstrap')
+DIR_INTER_HISTORY_CACHE = DIR_DATA.joinpath('intermediate', 'history-cache')
+FILE_INTER_FORM_STATE = DIR_DATA.joinpath('intermediate', 'form-state.parquet')
+FILE_INTER_FORM_WEEKS = DIR_DATA.joinpath('intermediate', 'form-weeks.csv')
+FILE_PIPELINE_STATE = DIR_DATA.joinpath('intermediate', 'pipeline-state.json')
 
-FILE_PROC_FEATURES = DIR_DATA.joinpath('processed', 'features.csv')
+# Partitioned by season / gameweek
+DIR_PROC_FEATURES = DIR_DATA.joinpath('processed', 'features')
 
-FILE_PREDICTIONS = DIR_DATA.joinpath('results', 'predictions.csv')
\ No newline at end of file
+DIR_PREDICTIONS = DIR_DATA.joinpath('results', 'predictions')
+
+# Metrics of the stages (json lines) and cProfile dumps
+FILE_METRICS = DIR_DATA.joinpath('metrics', 'metrics.jsonl')
+DIR_PROFILES = DIR_DATA.joinpath('metrics', 'profiles')
+
+# Benchmarks of the pipeline (synthetic trees and results)
+DIR_BENCHMARK = DIR_DATA.joinpath('benchmark')
+FILE_BENCHMARKS = DIR_DATA.joinpath('metrics', 'benchmarks.jsonl')
\ No newline at end of file
@@ -1,15 +1,13 @@
 import logging
-import pandas as pd
-import constants.fields as fld
-import fpl.model.predict
-import fpl.optimise
-from fpl.manager import ManagerTeam
-from fpl.credentials import EMAIL, PASSWORD
+import fpl
+from fpl.constants.structure import DIR_PROC_FEATURES, FILE_METRICS
 
-pd.options.display.max_columns = 15
+# The heavy dependencies (pandas, pulp, credentials) are imported by the functions using them
 
 
 def get_current_manager_info():
+    from fpl.credentials import EMAIL, PASSWORD
+    from fpl.manager import ManagerTeam
     team = ManagerTeam(money=100)
     team.fetch_fpl_info(email=EMAIL, password=PASSWORD)
     print(team.money_bank)
@@ -19,20 +17,34 @@ def get_current_manager_info():
 
 
 def select_weekly_players():
-    df = fpl.model.predict.run(reload_data=False)
-    # Select only last gameweek
-
-    df_season = df[df[fld.SEASON_ID] == df[fld.SEASON_ID].max()]
-    df_gw = df_season[df_season[fld.GW] == df_season[fld.GW].max()]
+    import pandas as pd
+    import fpl.constants.fields as fld
+    import fpl.model.predict
+    import fpl.optimise
+    import fpl.pipeline.storage
+    pd.options.display.max_columns = 15
+    # Select only last gameweek (only its partition is read)
+    latest = fpl.pipeline.storage.latest_partition(DIR_PROC_FEATURES)
+    if latest is None:
+        logging.warning(f'No features in {DIR_PROC_FEATURES}: run the pipeline first')
+        return
+    season_id, gw = latest
+    df_gw = fpl.model.predict.run(reload_data=False, seasons=[season_id], gameweeks=[gw])
+    if df_gw.empty:
+        return
     logging.info(f'Process Season {df_gw[fld.SEASON_NAME].unique()} - Week {df_gw[fld.GW].unique()}')
     print(fpl.optimise.select_team(df_gw))
 
 
 if __name__ == '__main__':
-    logging.basicConfig(level=logging.DEBUG)
+    import fpl.utils.metrics
+    fpl.setup_logging()
+    # Metrics of the stages in data/metrics/metrics.jsonl (add DIR_PROFILES for cProfile dumps)
+    fpl.utils.metrics.configure(FILE_METRICS)
     # fpl.extract.player-details.run()
     # fpl.transform.features.run(reload_data=False)
     # fpl.model.predict.run(reload_data=True)
+    # fpl.pipeline.dag.run()
     # fpl.download.download.get_manager_info(email=EMAIL, password=PASSWORD)
     # get_current_manager_info()
     # select_weekly_players()
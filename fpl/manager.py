@@ -1,7 +1,7 @@
 import logging
 from typing import List
-from pipeline.download.scrape import scrape_manager_team
-from manager_player import ManagerPlayer, PlayerRole
+from fpl.pipeline.download.scrape import scrape_manager_team
+from fpl.manager_player import ManagerPlayer, PlayerRole
 
 logger = logging.getLogger(__name__)
 
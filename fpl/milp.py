@@ -0,0 +1,195 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Backends: scipy.optimize.milp (HiGHS, scipy >= 1.9) in matrix form, pulp (CBC) as a fallback
+BACKEND_AUTO = 'auto'
+BACKEND_SCIPY = 'scipy'
+BACKEND_PULP = 'pulp'
+BACKENDS = [BACKEND_AUTO, BACKEND_SCIPY, BACKEND_PULP]
+
+# Status of a solution (same names as pulp.LpStatus)
+STATUS_OPTIMAL = 'Optimal'
+STATUS_INFEASIBLE = 'Infeasible'
+STATUS_UNBOUNDED = 'Unbounded'
+STATUS_NOT_SOLVED = 'Not Solved'
+
+
+@dataclass
+class MilpProblem(object):
+    """
+    Mixed integer linear problem in matrix form: maximise c.x  s.t.  lb <= A.x <= ub,  x_lb <= x <= x_ub
+    * c:            objective (n)
+    * A:            constraints (m x n, sparse)
+    * lb, ub:       bounds of the constraints (m), -inf / inf if unbounded
+    * integrality:  1 for the integer variables, 0 for the continuous ones (n)
+    * x_lb, x_ub:   bounds of the variables (n)
+    """
+    c: np.ndarray
+    A: sparse.csr_matrix
+    lb: np.ndarray
+    ub: np.ndarray
+    integrality: np.ndarray
+    x_lb: np.ndarray
+    x_ub: np.ndarray
+
+
+@dataclass
+class MilpResult(object):
+    """ Solution: values of the variables (None if not solved), objective, status, backend used, gap """
+    x: Optional[np.ndarray]
+    objective: Optional[float]
+    status: str
+    backend: str
+    mip_gap: Optional[float] = None
+
+
+def binary_problem(c: np.ndarray, A: sparse.spmatrix, lb: np.ndarray, ub: np.ndarray) -> MilpProblem:
+    """ Problem where all the variables are binary """
+    nb_vars = len(c)
+    return MilpProblem(
+        c=np.asarray(c, dtype=float),
+        A=sparse.csr_matrix(A, dtype=float),
+        lb=np.asarray(lb, dtype=float),
+        ub=np.asarray(ub, dtype=float),
+        integrality=np.ones(nb_vars, dtype=np.int64),
+        x_lb=np.zeros(nb_vars),
+        x_ub=np.ones(nb_vars)
+    )
+
+
+def stack(*blocks) -> sparse.csr_matrix:
+    """ Rows of constraints on the same variables, one block after the other """
+    return sparse.vstack(blocks, format='csr')
+
+
+def has_scipy_milp() -> bool:
+    try:
+        from scipy.optimize import milp  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def solve(
+        problem: MilpProblem,
+        backend: str = BACKEND_AUTO,
+        time_limit: Optional[float] = None,
+        mip_rel_gap: Optional[float] = None,
+        x0: Optional[np.ndarray] = None
+) -> MilpResult:
+    """
+    Solve a problem (maximisation)
+    :param problem:     Problem in matrix form
+    :param backend:     scipy, pulp or auto (scipy when scipy.optimize.milp is available, pulp otherwise)
+    :param time_limit:  Maximum solving time (s), the best solution found is returned when reached
+    :param mip_rel_gap: Relative gap between the solution and the bound at which the solver stops
+    :param x0:          Known solution to start from (pulp / CBC only, scipy.optimize.milp takes no warm start)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend}, expected one of {BACKENDS}')
+    if backend == BACKEND_AUTO:
+        backend = BACKEND_SCIPY if has_scipy_milp() else BACKEND_PULP
+    if backend == BACKEND_SCIPY:
+        return _solve_scipy(problem, time_limit, mip_rel_gap)
+    return _solve_pulp(problem, time_limit, mip_rel_gap, x0)
+
+
+def has_solution(result: MilpResult) -> bool:
+    """ Whether the result is a solution: optimal, or the best one found within the limits (time, gap) """
+    return result.x is not None and result.status in (STATUS_OPTIMAL, STATUS_NOT_SOLVED)
+
+
+def is_feasible(problem: MilpProblem, x: Optional[np.ndarray], tolerance: float = 1e-6) -> bool:
+    """ Whether a solution satisfies the constraints and the bounds of the problem """
+    if x is None:
+        return False
+    Ax = problem.A @ x
+    return bool(
+        np.all(Ax >= problem.lb - tolerance) and np.all(Ax <= problem.ub + tolerance)
+        and np.all(x >= problem.x_lb - tolerance) and np.all(x <= problem.x_ub + tolerance)
+    )
+
+
+def _solve_scipy(problem: MilpProblem, time_limit: Optional[float], mip_rel_gap: Optional[float]) -> MilpResult:
+    from scipy.optimize import Bounds, LinearConstraint, milp
+    options = {}
+    if time_limit is not None:
+        options['time_limit'] = time_limit
+    if mip_rel_gap is not None:
+        options['mip_rel_gap'] = mip_rel_gap
+    constraints = [LinearConstraint(problem.A, problem.lb, problem.ub)] if problem.A.shape[0] else []
+    result = milp(
+        -problem.c, constraints=constraints, integrality=problem.integrality,
+        bounds=Bounds(problem.x_lb, problem.x_ub), options=options
+    )
+    # 0: optimal, 1: iteration / time limit (a feasible solution may exist), 2: infeasible, 3: unbounded
+    status = {0: STATUS_OPTIMAL, 2: STATUS_INFEASIBLE, 3: STATUS_UNBOUNDED}.get(result.status, STATUS_NOT_SOLVED)
+    if result.x is None:
+        return MilpResult(None, None, status, BACKEND_SCIPY)
+    x = _round_integers(result.x, problem.integrality)
+    mip_gap = getattr(result, 'mip_gap', None)
+    return MilpResult(x, float(problem.c @ x), status, BACKEND_SCIPY, mip_gap)
+
+
+def _solve_pulp(
+        problem: MilpProblem,
+        time_limit: Optional[float],
+        mip_rel_gap: Optional[float],
+        x0: Optional[np.ndarray] = None
+) -> MilpResult:
+    import pulp
+    prob = pulp.LpProblem('Problem', pulp.LpMaximize)
+    variables = [
+        pulp.LpVariable(
+            f'x{i}', lowBound=_finite(problem.x_lb[i]), upBound=_finite(problem.x_ub[i]),
+            cat=pulp.LpInteger if problem.integrality[i] else pulp.LpContinuous
+        )
+        for i in range(len(problem.c))
+    ]
+    prob += pulp.LpAffineExpression([(variables[i], problem.c[i]) for i in np.flatnonzero(problem.c)])
+    # One expression per row of the sparse matrix: O(non-zero) terms
+    A = problem.A.tocsr()
+    for row in range(A.shape[0]):
+        start, end = A.indptr[row], A.indptr[row + 1]
+        expression = pulp.LpAffineExpression(
+            [(variables[col], value) for col, value in zip(A.indices[start:end], A.data[start:end])]
+        )
+        lb, ub = problem.lb[row], problem.ub[row]
+        if lb == ub:
+            prob += expression == lb
+        else:
+            if np.isfinite(lb):
+                prob += expression >= lb
+            if np.isfinite(ub):
+                prob += expression <= ub
+    if x0 is not None:
+        # The start may no longer be within the bounds of the variables (e.g. a variable fixed to 0 since)
+        for variable, value in zip(variables, np.clip(x0, problem.x_lb, problem.x_ub)):
+            variable.setInitialValue(value)
+    solver = pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit, gapRel=mip_rel_gap, warmStart=x0 is not None)
+    prob.solve(solver)
+    # CBC fills the values of the variables whatever the status (e.g. infeasible): only a solution found is kept,
+    # the best one found at the time limit has the status of scipy in this case (not solved, with a solution)
+    status = pulp.LpStatus[prob.status]
+    if prob.sol_status == pulp.LpSolutionIntegerFeasible:
+        status = STATUS_NOT_SOLVED
+    values = [variable.varValue for variable in variables]
+    if prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible) \
+            or any(value is None for value in values):
+        return MilpResult(None, None, status, BACKEND_PULP)
+    x = _round_integers(np.array(values, dtype=float), problem.integrality)
+    return MilpResult(x, float(problem.c @ x), status, BACKEND_PULP)
+
+
+def _round_integers(x: np.ndarray, integrality: np.ndarray) -> np.ndarray:
+    # Solvers return integer variables with a tolerance (e.g. 0.9999999)
+    return np.where(integrality > 0, np.round(x), x)
+
+
+def _finite(value: float) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
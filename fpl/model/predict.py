@@ -1,8 +1,14 @@
+import logging
+from typing import List, Optional
 import numpy as np
 import pandas as pd
-import pipeline.transform.features
-import constants.fields as fld
-from constants import FILE_PROC_FEATURES, FILE_PREDICTIONS
+import fpl.pipeline.transform.features
+import fpl.constants.fields as fld
+from fpl.constants.structure import DIR_PROC_FEATURES, DIR_PREDICTIONS
+from fpl.pipeline import storage
+from fpl.utils.metrics import instrument
+
+logger = logging.getLogger(__name__)
 
 
 def predict_simple(df: pd.DataFrame):
@@ -20,17 +26,25 @@ def predict_simple(df: pd.DataFrame):
     return df
 
 
-def run(reload_data: bool):
+@instrument(inputs=[DIR_PROC_FEATURES], outputs=[DIR_PREDICTIONS])
+def run(reload_data: bool, seasons: Optional[List[int]] = None, gameweeks: Optional[List[int]] = None):
     """ Produce a list of predictions for the dataset
     
     Arguments:
         reload_data {bool} -- If True, process previous steps (extract/transfom)
+        seasons {List[int]} -- Only predict these seasons (all if None)
+        gameweeks {List[int]} -- Only predict these gameweeks (all if None)
     """
     if reload_data:
-        pipeline.transform.features.run(reload_data=True)
+        fpl.pipeline.transform.features.run(reload_data=True)
 
-    df_features = pd.read_csv(FILE_PROC_FEATURES, encoding='utf-8-sig')
+    # Only the partitions of the selected season / gameweeks are read
+    df_features = storage.read_partitions(DIR_PROC_FEATURES, seasons=seasons, gameweeks=gameweeks)
+    if df_features.empty:
+        logger.warning(f'No features for seasons {seasons} / gameweeks {gameweeks}: nothing to predict')
+        return df_features
 
     df_combined = predict_simple(df_features)
-    df_combined.to_csv(FILE_PREDICTIONS, index=False, encoding='utf-8-sig')
+    # Full run: the partitions of the features which no longer exist are removed
+    storage.write_partitions(df_combined, DIR_PREDICTIONS, overwrite=seasons is None and gameweeks is None)
     return df_combined
@@ -1,14 +1,28 @@
+import logging
 import numpy as np
 import pandas as pd
-import constants.fields as fld
-from typing import List, Dict
-from pulp import LpProblem, LpMaximize, LpVariable, lpSum, LpSolverDefault, LpStatus
-from manager_player import PlayerRole
+import fpl.constants.fields as fld
+from typing import Iterable, List, Optional
+from scipy import sparse
+from fpl import milp
+from fpl.manager_player import PlayerRole
+from fpl.utils.metrics import instrument
+
+logger = logging.getLogger(__name__)
 
 # Added during preprocess
 SQUAD_ROLE = 'squad_role'
 IN_MANAGER_TEAM = 'in_manager_team'
 
+# Rules of the squad
+SQUAD_SIZE = 15
+SQUAD_POSITIONS = {'GKP': 2, 'DEF': 5, 'MID': 5, 'FWD': 3}
+MAX_BY_TEAM = 3
+
+# Rows of the constraints updated by TeamOptimiser (see build_team_problem)
+ROW_COST = 1
+ROW_TRANSFERS = 2
+
 
 def preprocess(df_pred, col_pred):
     """
@@ -28,6 +42,232 @@ def preprocess(df_pred, col_pred):
     return df_preprocessed
 
 
+def incidence(keys: pd.Series) -> sparse.csr_matrix:
+    """ One row per distinct key, 1 for the lines of the key (keys x lines) """
+    codes, uniques = pd.factorize(keys)
+    lines = np.flatnonzero(codes >= 0)
+    return sparse.csr_matrix(
+        (np.ones(len(lines)), (codes[lines], lines)), shape=(len(uniques), len(keys))
+    )
+
+
+def build_team_problem(
+        df: pd.DataFrame,
+        col_id: str,
+        col_cost: str,
+        col_pred: str,
+        col_pos: str,
+        col_team: str,
+        value_team: int,
+        free_transfers: int
+) -> milp.MilpProblem:
+    """
+    Selection of the squad as a binary problem (one variable per line of the preprocessed dataset)
+    Each kind of constraint is a sparse block built at once: size, cost, transfers, positions,
+    teams, captain and player (a player is selected at most once, as normal player or captain)
+    """
+    nb_lines = len(df)
+    ones = np.ones((1, nb_lines))
+    is_captain = (df[SQUAD_ROLE] == PlayerRole.CAPTAIN).to_numpy(dtype=float)
+    positions = list(SQUAD_POSITIONS)
+    position_rows = sparse.csr_matrix(
+        np.vstack([(df[col_pos] == position).to_numpy(dtype=float) for position in positions])
+    )
+    teams = incidence(df[col_team])
+    players = incidence(df[col_id])
+
+    A = milp.stack(
+        sparse.csr_matrix(ones),
+        sparse.csr_matrix(df[col_cost].to_numpy(dtype=float)[None, :]),
+        sparse.csr_matrix(df[IN_MANAGER_TEAM].to_numpy(dtype=float)[None, :]),
+        position_rows,
+        teams,
+        sparse.csr_matrix(is_captain[None, :]),
+        players
+    )
+    nb_teams, nb_players = teams.shape[0], players.shape[0]
+    lb = np.concatenate([
+        [-np.inf, -np.inf, SQUAD_SIZE - free_transfers],
+        [SQUAD_POSITIONS[position] for position in positions],
+        np.full(nb_teams, -np.inf),
+        [1],
+        np.full(nb_players, -np.inf)
+    ])
+    ub = np.concatenate([
+        [SQUAD_SIZE, value_team, np.inf],
+        [SQUAD_POSITIONS[position] for position in positions],
+        np.full(nb_teams, MAX_BY_TEAM),
+        [1],
+        np.ones(nb_players)
+    ])
+    return milp.binary_problem(df[col_pred].to_numpy(dtype=float), A, lb, ub)
+
+
+class TeamOptimiser(object):
+    """
+    Squad selection built once for a pool of players (a gameweek), then updated in place:
+    predictions, budget, free transfers, locked (forced in) and excluded players
+    The last solution is kept and returned without solving again while no update can improve it
+    (e.g. excluding a player who is not selected), it is the warm start of the next solve otherwise with pulp (CBC)
+    only: scipy.optimize.milp (HiGHS, the default backend) takes no warm start and solves from scratch
+    A player both locked and excluded raises a ValueError (no squad could be found)
+    """
+    df: pd.DataFrame
+    problem: milp.MilpProblem
+    result: Optional[milp.MilpResult]
+
+    def __init__(self,
+                 df_predict: pd.DataFrame,
+                 col_id: str = fld.PLAYER_ID,
+                 col_cost: str = fld.PLAYER_COST,
+                 col_pred: str = fld.ML_PREDICT,
+                 col_pos: str = fld.PLAYER_POSITION,
+                 col_team: str = fld.TEAM_NAME,
+                 value_team: int = 1000,
+                 free_transfers: int = 15,
+                 existing_team: List[int] = None,
+                 backend: str = milp.BACKEND_AUTO):
+        self.col_id = col_id
+        self.col_pred = col_pred
+        self.backend = backend
+        self.result = None
+
+        # Pre-process (double the lines - 1 for normal, 1 for captain)
+        self.df = preprocess(df_predict, col_pred=col_pred)
+        self.df[IN_MANAGER_TEAM] = np.where(self.df[col_id].isin(existing_team or []), 1, 0)
+        self.problem = build_team_problem(
+            self.df, col_id, col_cost, col_pred, col_pos, col_team, value_team, free_transfers
+        )
+        self._multiplier = np.where(self.df[SQUAD_ROLE] == PlayerRole.CAPTAIN, 2., 1.)
+
+        # Rows "selected at most once" of the players: last rows of the problem, same order as incidence
+        self._line_players, players = pd.factorize(self.df[col_id])
+        self._players = pd.Index(players)
+        self._first_player_row = self.problem.A.shape[0] - len(self._players)
+        # Whether an update since the last solve may give a better solution
+        self._improvable = True
+
+    def set_predictions(self, predictions: pd.Series):
+        """
+        :param predictions: Predicted points by player id (the players missing keep their prediction)
+        """
+        points = self.df[self.col_id].map(predictions)
+        known = points.notna().to_numpy()
+        self.df.loc[known, self.col_pred] = points[known] * self._multiplier[known]
+        self.problem.c = self.df[self.col_pred].to_numpy(dtype=float)
+        self._improvable = True
+
+    def set_budget(self, value_team: int):
+        self._set_row_bounds(ROW_COST, ub=value_team)
+
+    def set_free_transfers(self, free_transfers: int):
+        self._set_row_bounds(ROW_TRANSFERS, lb=SQUAD_SIZE - free_transfers)
+
+    def set_existing_team(self, existing_team: List[int]):
+        self.df[IN_MANAGER_TEAM] = np.where(self.df[self.col_id].isin(existing_team), 1, 0)
+        in_team = sparse.csr_matrix(self.df[IN_MANAGER_TEAM].to_numpy(dtype=float)[None, :])
+        A = self.problem.A
+        self.problem.A = milp.stack(A[:ROW_TRANSFERS], in_team, A[ROW_TRANSFERS + 1:])
+        self._improvable = True
+
+    def lock(self, player_ids: Iterable[int]):
+        """ Force the players in the squad (as normal player or captain) """
+        player_ids = list(player_ids)
+        rows = self._player_rows(player_ids)
+        # Lines of the players still allowed (normal player / captain)
+        allowed = np.bincount(self._line_players, weights=self.problem.x_ub, minlength=len(self._players))
+        excluded = np.asarray(player_ids)[allowed[rows - self._first_player_row] == 0].tolist()
+        if excluded:
+            raise ValueError(f'Players {excluded} are excluded, include them before locking them')
+        self.problem.lb[rows] = 1
+
+    def unlock(self, player_ids: Iterable[int]):
+        self.problem.lb[self._player_rows(player_ids)] = -np.inf
+        self._improvable = True
+
+    def exclude(self, player_ids: Iterable[int]):
+        """ Keep the players out of the squad """
+        player_ids = list(player_ids)
+        lines = self._player_lines(player_ids)
+        locked = np.asarray(player_ids)[self.problem.lb[self._player_rows(player_ids)] == 1].tolist()
+        if locked:
+            raise ValueError(f'Players {locked} are locked, unlock them before excluding them')
+        self.problem.x_ub[lines] = 0
+
+    def include(self, player_ids: Iterable[int]):
+        self.problem.x_ub[self._player_lines(player_ids)] = 1
+        self._improvable = True
+
+    def solve(self, time_limit: Optional[float] = None, mip_rel_gap: Optional[float] = None) -> pd.DataFrame:
+        """
+        Best squad for the current state of the problem
+        :param time_limit:  Maximum solving time (s)
+        :param mip_rel_gap: Relative gap at which the solver stops
+        :return: Lines selected (players and their role)
+        """
+        last = self.result
+        # An optimal solution which still satisfies tighter constraints is still optimal
+        if (last is None or last.status != milp.STATUS_OPTIMAL or self._improvable
+                or not milp.is_feasible(self.problem, last.x)):
+            self.result = milp.solve(
+                self.problem, backend=self.backend, time_limit=time_limit, mip_rel_gap=mip_rel_gap,
+                x0=last.x if last is not None else None
+            )
+            self._improvable = False
+            logger.debug(f'Squad solved ({self.result.backend}): {self.result.status}')
+        return self.selection()
+
+    def selection(self) -> pd.DataFrame:
+        x = self.result.x if self.result is not None and milp.has_solution(self.result) else np.zeros(len(self.df))
+        self.df['selected'] = x.astype('int64')
+        return self.df[(self.df['selected'] == 1)]
+
+    def what_if(self,
+                sell: Iterable[int] = (),
+                buy: Iterable[int] = (),
+                value_team: Optional[int] = None,
+                free_transfers: Optional[int] = None) -> pd.DataFrame:
+        """
+        Best squad with temporary changes (e.g. "what if I sell X"), the state is restored afterwards
+        :param sell:            Players excluded
+        :param buy:             Players locked in the squad
+        :param value_team:      Budget
+        :param free_transfers:  Number of free transfers
+        """
+        problem = self.problem
+        saved = problem.lb.copy(), problem.ub.copy(), problem.x_ub.copy(), self.result, self._improvable
+        try:
+            self.exclude(sell)
+            self.lock(buy)
+            if value_team is not None:
+                self.set_budget(value_team)
+            if free_transfers is not None:
+                self.set_free_transfers(free_transfers)
+            return self.solve()
+        finally:
+            problem.lb, problem.ub, problem.x_ub, self.result, self._improvable = saved
+
+    def _set_row_bounds(self, row: int, lb: Optional[float] = None, ub: Optional[float] = None):
+        if lb is not None:
+            self._improvable |= lb < self.problem.lb[row]
+            self.problem.lb[row] = lb
+        if ub is not None:
+            self._improvable |= ub > self.problem.ub[row]
+            self.problem.ub[row] = ub
+
+    def _player_rows(self, player_ids: Iterable[int]) -> np.ndarray:
+        codes = self._players.get_indexer(list(player_ids))
+        if (codes < 0).any():
+            raise KeyError(f'Unknown players {np.asarray(list(player_ids))[codes < 0].tolist()}')
+        return self._first_player_row + codes
+
+    def _player_lines(self, player_ids: Iterable[int]) -> np.ndarray:
+        player_ids = list(player_ids)
+        self._player_rows(player_ids)
+        return np.flatnonzero(self.df[self.col_id].isin(player_ids).to_numpy())
+
+
+@instrument()
 def select_team(df_predict: pd.DataFrame,
                 col_id: str = fld.PLAYER_ID,
                 col_cost: str = fld.PLAYER_COST,
@@ -36,85 +276,22 @@ def select_team(df_predict: pd.DataFrame,
                 col_team: str = fld.TEAM_NAME,
                 value_team: int = 1000,
                 free_transfers: int = 15,
-                existing_team: List[int] = None
-                ) -> List[Dict[int, PlayerRole]]:
+                existing_team: List[int] = None,
+                backend: str = milp.BACKEND_AUTO
+                ) -> pd.DataFrame:
     """ Optimise to find the best team for a gameweek
-    Returns the list of the players in the new team and their role
+    Returns the lines of the players in the new team and their role (empty if no squad can be built)
+    The problem is solved in matrix form (scipy / HiGHS), with pulp as a fallback (backend)
+    Use TeamOptimiser to solve again the same pool with other predictions / constraints
     """
-
-    # Pre-process (double the lines - 1 for normal, 1 for captain)
-    df = preprocess(df_predict, col_pred=col_pred)
-    if not existing_team:
-        df[IN_MANAGER_TEAM] = 0
-    else:
-        df[IN_MANAGER_TEAM] = np.where(df[col_id].isin(existing_team), 1, 0)
-
-    # SET HIGH LEVEL CONSTRAINTS
-    max_players = 15
-    max_cost = value_team
-    nb_gkp = 2
-    nb_def = 5
-    nb_mid = 5
-    nb_fwd = 3
-    max_by_team = 3
-    free_transfers = free_transfers
-
-    # INIT LP SOLVER
-    prob = LpProblem('TeamSelection', LpMaximize)
-
-    # SOLVER SETUP
-    player = df.index
-    code = df[col_id]
-    cost = df[col_cost]
-    points = df[col_pred]
-    position = df[col_pos]
-    team = df[col_team]
-    role = df[SQUAD_ROLE]
-    in_manager_team = df[IN_MANAGER_TEAM]
-
-    # x: binary variable for the selection of the player (0: not selected, 1: selected)
-    x = LpVariable.dicts('Selected', player, cat='Binary')
-
-    # SET THE OBJECTIVE FUNCTION
-    prob += sum([x[p] * points[p] for p in player]), 'Total_Points'
-
-    # SET THE CONSTRAINTS
-    prob += lpSum([x[p] for p in player]) <= max_players
-    prob += lpSum([x[p] * cost[p] for p in player]) <= max_cost
-    prob += 15 - lpSum([x[p] * in_manager_team[p] for p in player]) <= free_transfers
-
-    # constraints position
-    prob += lpSum([x[p] if position[p] == 'GKP' else 0 for p in player]) == nb_gkp
-    prob += lpSum([x[p] if position[p] == 'DEF' else 0 for p in player]) == nb_def
-    prob += lpSum([x[p] if position[p] == 'MID' else 0 for p in player]) == nb_mid
-    prob += lpSum([x[p] if position[p] == 'FWD' else 0 for p in player]) == nb_fwd
-
-    # contraints team
-    for t in team.unique():
-        prob += lpSum([x[p] if team[p] == t else 0 for p in player]) <= max_by_team
-
-    # constraints captain
-    prob += lpSum([x[p] if role[p] == PlayerRole.CAPTAIN else 0 for p in player]) == 1
-
-    # constrains player_code (make sure that captain is not also selected as a normal player)
-    for player_code in code.unique():
-        prob += lpSum([x[p] if code[p] == player_code else 0 for p in player]) <= 1
-
-    # WRAP UP AND SOLVE
-    LpSolverDefault.msg = 0
-    # prob.writeLP('TeamOpt.lp')
-    prob.solve()
+    optimiser = TeamOptimiser(
+        df_predict, col_id, col_cost, col_pred, col_pos, col_team, value_team, free_transfers, existing_team, backend
+    )
+    selection = optimiser.solve()
 
     # CHECK SOLUTION
-    total_impact = prob.objective.value()
-    status = LpStatus[prob.status]
-    print('status:', status)
-    print('Total Points:', total_impact)
-
-    # RETRIEVE SOLUTION
-    selection = pd.Series({p: x[p].varValue for p in player})
-    df['selected'] = selection.astype('int64')
-
-    selection = df[(df['selected'] == 1)]
-    print(selection[[fld.PLAYER_ID, fld.PLAYER_COST, fld.ML_PREDICT, fld.PLAYER_POSITION, fld.TEAM_NAME, SQUAD_ROLE]])
+    logger.info(f'Squad selection: {optimiser.result.status}, total points {optimiser.result.objective}')
+    logger.debug('Squad selected:\n%s', selection[
+        [col_id, col_cost, col_pred, col_pos, col_team, SQUAD_ROLE]
+    ])
     return selection
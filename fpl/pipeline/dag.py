@@ -0,0 +1,286 @@
+import hashlib
+import json
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import fpl.constants.structure as struc
+from fpl.pipeline.raw_store import MANIFEST_SUFFIX
+from fpl.utils.metrics import instrument
+
+logger = logging.getLogger(__name__)
+
+# State of the pipeline (json):
+# * files:  digest of the files already hashed, reused while their size and modification time don't change
+# * stages: hash of the inputs (files + parameters) of the last successful run of each stage
+STATE_FILES = 'files'
+STATE_STAGES = 'stages'
+SIZE = 'size'
+MTIME_NS = 'mtime_ns'
+SHA256 = 'sha256'
+
+# Never part of a hash: files written while a stage is running, manifests of the raw snapshots
+# and hidden files (e.g. scraping checkpoints), rewritten at each scrape without changing the data
+IGNORED_SUFFIXES = ['.partial', MANIFEST_SUFFIX]
+IGNORED_PREFIX = '.'
+
+
+@dataclass
+class Stage(object):
+    """
+    Step of the pipeline
+    * name:     unique name of the stage
+    * func:     function running the stage (no argument, picklable to run in another process)
+    * inputs:   files / folders read by the stage
+    * outputs:  files / folders written by the stage, a stage reading them depends on this one
+    * params:   parameters changing the outputs (part of the hash of the inputs)
+    """
+    name: str
+    func: Callable[[], Any]
+    inputs: List[Path]
+    outputs: List[Path]
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+def read_state(state_path: Path) -> Dict[str, Any]:
+    if not state_path.exists():
+        return {STATE_FILES: {}, STATE_STAGES: {}}
+    with state_path.open('r', encoding='utf-8') as f_in:
+        return json.load(f_in)
+
+
+def write_state(state: Dict[str, Any], state_path: Path):
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_name(state_path.name + '.partial')
+    with tmp_path.open('w', encoding='utf-8') as f_out:
+        json.dump(state, f_out, indent=1, sort_keys=True)
+    tmp_path.replace(state_path)
+
+
+def hash_inputs(stage: Stage, file_digests: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Hash of the content of the inputs and of the parameters of a stage
+    :param stage:           Stage
+    :param file_digests:    Digests already computed (path -> size, mtime, sha256), updated with the new files
+    """
+    sha = hashlib.sha256()
+    sha.update(json.dumps(stage.params, sort_keys=True, default=str).encode('utf-8'))
+    for input_path in stage.inputs:
+        sha.update(str(input_path).encode('utf-8'))
+        for file_path in _list_files(input_path):
+            sha.update(str(file_path.relative_to(input_path) if input_path.is_dir() else '').encode('utf-8'))
+            sha.update(_digest_file(file_path, file_digests).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def get_dependencies(stages: List[Stage]) -> Dict[str, Set[str]]:
+    """ Stages each stage depends on: the stages writing one of its inputs (or a folder containing it) """
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f'Stage names must be unique: {names}')
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    dependencies = {}
+    for stage in stages:
+        dependencies[stage.name] = {
+            producer for output, producer in producers.items()
+            for input_path in stage.inputs
+            if producer != stage.name and (input_path == output or output in input_path.parents)
+        }
+    _check_acyclic(dependencies)
+    return dependencies
+
+
+def run_pipeline(
+        stages: List[Stage],
+        state_path: Path,
+        workers: int = 1,
+        force: bool = False
+) -> Dict[str, bool]:
+    """
+    Run the stages in the order of their dependencies
+    A stage is skipped when the hash of its inputs is the one of its last run and its outputs exist,
+    a stage whose inputs are rewritten with the same content is skipped too
+    :param stages:      Stages of the pipeline
+    :param state_path:  Persistent state (hashes of the files and of the inputs of the stages)
+    :param workers:     Number of stages run at the same time (independent stages only), in other processes if > 1
+    :param force:       Run all the stages
+    :return:            Stage name -> True if the stage has run, False if skipped
+    """
+    dependencies = get_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    state = read_state(state_path)
+    file_digests = state[STATE_FILES]
+    done: Dict[str, bool] = {}
+    running: Dict[Future, Tuple[str, str]] = {}
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while len(done) < len(stages):
+            started = {name for name, _ in running.values()}
+            ready = [
+                name for name in by_name
+                if name not in done and name not in started and dependencies[name] <= set(done)
+            ]
+            for name in ready:
+                stage = by_name[name]
+                input_hash = hash_inputs(stage, file_digests)
+                if not force and state[STATE_STAGES].get(name) == input_hash \
+                        and all(output.exists() for output in stage.outputs):
+                    logger.info(f'Stage {name}: inputs unchanged, skip')
+                    done[name] = False
+                    continue
+                logger.info(f'Stage {name}: run')
+                if executor is None:
+                    stage.func()
+                    _complete(state, state_path, name, input_hash)
+                    done[name] = True
+                else:
+                    running[executor.submit(_run_stage, stage.func)] = (name, input_hash)
+            if ready or not running:
+                continue
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, input_hash = running.pop(future)
+                future.result()
+                _complete(state, state_path, name, input_hash)
+                done[name] = True
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        write_state(state, state_path)
+    return done
+
+
+def get_stages(workers: int = 1, incremental: bool = False, horizon: int = 0) -> List[Stage]:
+    """
+    Stages of the project: raw data -> intermediate datasets -> features -> predictions
+    (the bootstrap preprocessing and the historical cleaning are independent)
+    :param workers:      Number of processes of each of the bootstrap / historical stages
+    :param incremental:  Update the intermediate datasets / features from their caches rather than rebuilding them
+    :param horizon:      Number of gameweeks of fixture features
+    """
+    # Imported here: the stages are only loaded when the pipeline is built
+    import fpl.model.predict
+    import fpl.pipeline.transform.clean_historical
+    import fpl.pipeline.transform.features
+    import fpl.pipeline.transform.preprocess_bootstrap
+    return [
+        Stage(
+            name='bootstrap',
+            func=partial(
+                fpl.pipeline.transform.preprocess_bootstrap.run,
+                workers=workers, incremental=incremental, horizon=horizon
+            ),
+            inputs=[struc.DIR_RAW_BOOTSTRAP, struc.DIR_RAW_FIXTURES],
+            outputs=[struc.FILE_INTER_BOOTSTRAP],
+            params={'horizon': horizon}
+        ),
+        Stage(
+            name='historical',
+            func=partial(fpl.pipeline.transform.clean_historical.run, workers=workers, incremental=incremental),
+            inputs=[struc.DIR_RAW_PLAYER_DETAILS],
+            outputs=[struc.FILE_INTER_HISTORICAL]
+        ),
+        Stage(
+            name='features',
+            func=partial(fpl.pipeline.transform.features.run, reload_data=False, incremental=incremental),
+            inputs=[struc.FILE_INTER_BOOTSTRAP, struc.FILE_INTER_HISTORICAL],
+            outputs=[struc.DIR_PROC_FEATURES, struc.FILE_INTER_FORM_STATE, struc.FILE_INTER_FORM_WEEKS]
+        ),
+        Stage(
+            name='predict',
+            func=partial(fpl.model.predict.run, reload_data=False),
+            inputs=[struc.DIR_PROC_FEATURES],
+            outputs=[struc.DIR_PREDICTIONS]
+        )
+    ]
+
+
+@instrument()
+def run(
+        workers: int = 2,
+        force: bool = False,
+        incremental: bool = False,
+        horizon: int = 0,
+        stage_workers: Optional[int] = None
+) -> Dict[str, bool]:
+    """
+    Run the pipeline of the project, only the stages whose inputs changed since their last run
+    :param workers:         Total number of processes, shared between the stages run at the same time
+    :param force:           Run all the stages
+    :param incremental:     Update the intermediate datasets / features from their caches rather than rebuilding them
+    :param horizon:         Number of gameweeks of fixture features
+    :param stage_workers:   Number of stages run at the same time (default: the 2 independent stages if possible)
+    """
+    stage_workers, stage_processes = split_workers(workers, stage_workers)
+    logger.info(f'Pipeline: {stage_workers} stage(s) at the same time, {stage_processes} process(es) by stage')
+    stages = get_stages(workers=stage_processes, incremental=incremental, horizon=horizon)
+    return run_pipeline(stages, struc.FILE_PIPELINE_STATE, workers=stage_workers, force=force)
+
+
+def split_workers(workers: int, stage_workers: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Share the processes between the stages run at the same time and the pool of each stage,
+    at most `workers` processes busy at the same time (no workers x workers nested pools)
+    :param workers:         Total number of processes
+    :param stage_workers:   Number of stages run at the same time (default: min(workers, 2))
+    :return:                Number of stages run at the same time, number of processes of a stage
+    """
+    workers = max(workers, 1)
+    stage_workers = min(workers, 2) if stage_workers is None else min(max(stage_workers, 1), workers)
+    return stage_workers, max(workers // stage_workers, 1)
+
+
+def _run_stage(func: Callable[[], Any]):
+    """ Run a stage in another process, its result (e.g. a dataframe) is not sent back """
+    func()
+
+
+def _complete(state: Dict[str, Any], state_path: Path, name: str, input_hash: str):
+    """ Record a successful run (saved at once: an interrupted pipeline keeps the stages already run) """
+    state[STATE_STAGES][name] = input_hash
+    write_state(state, state_path)
+
+
+def _list_files(path: Path) -> List[Path]:
+    if path.is_file():
+        return [path]
+    if not path.is_dir():
+        return []
+    return sorted(
+        file_path for file_path in path.rglob('*')
+        if file_path.is_file() and file_path.suffix not in IGNORED_SUFFIXES
+        and not any(part.startswith(IGNORED_PREFIX) for part in file_path.relative_to(path).parts)
+    )
+
+
+def _digest_file(file_path: Path, file_digests: Dict[str, Dict[str, Any]]) -> str:
+    path = str(file_path.resolve())
+    stat = file_path.stat()
+    known = file_digests.get(path)
+    if known is not None and known[SIZE] == stat.st_size and known[MTIME_NS] == stat.st_mtime_ns:
+        return known[SHA256]
+    sha = hashlib.sha256()
+    with file_path.open('rb') as f_in:
+        for block in iter(lambda: f_in.read(1 << 20), b''):
+            sha.update(block)
+    file_digests[path] = {SIZE: stat.st_size, MTIME_NS: stat.st_mtime_ns, SHA256: sha.hexdigest()}
+    return file_digests[path][SHA256]
+
+
+def _check_acyclic(dependencies: Dict[str, Set[str]]):
+    remaining = {name: set(deps) for name, deps in dependencies.items()}
+    while remaining:
+        free = [name for name, deps in remaining.items() if not deps]
+        if not free:
+            raise ValueError(f'Cycle between the stages {sorted(remaining)}')
+        for name in free:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(free)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG)
+    run()
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class RateLimiter(object):
+    """ Token bucket shared between threads to limit the number of requests per second """
+    rate: Optional[float]
+    capacity: int
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Block until a token is available """
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedRetry(Retry):
+    """ Retry of urllib3 whose new attempts also take a token of the rate limiter (retries are rate limited too) """
+    limiter: Optional[RateLimiter] = None
+
+    def new(self, **kw) -> 'RateLimitedRetry':
+        retry = super().new(**kw)
+        retry.limiter = self.limiter
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+
+class ScraperClient(object):
+    """
+    HTTP client shared by the scrape functions
+    * pooled keep-alive connections (one requests.Session)
+    * retries with exponential backoff on 429 / 5xx (Retry-After is respected)
+    * timeout on every request
+    * rate limit shared by all the threads using the client, retries included
+    * bootstrap payload downloaded once per client
+    """
+    session: requests.Session
+    limiter: RateLimiter
+    timeout: float
+
+    def __init__(
+            self,
+            rate_limit: Optional[float] = 10.0,
+            max_connections: int = 8,
+            retries: int = 5,
+            backoff_factor: float = 0.5,
+            timeout: float = 30.0
+    ):
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate=rate_limit, burst=max_connections)
+
+        retry = RateLimitedRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=['GET'],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        retry.limiter = self.limiter
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._bootstrap = None
+        self._bootstrap_json = None
+        self._bootstrap_lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """ GET request (rate limited, retried, with timeout) """
+        self.limiter.acquire()
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.get(url, **kwargs)
+        logger.debug(f'GET {url} - {response.status_code}')
+        return response
+
+    def get_bootstrap(self, url: str) -> requests.Response:
+        """ Bootstrap response, only downloaded on the first call """
+        with self._bootstrap_lock:
+            if self._bootstrap is None:
+                response = self.get(url)
+                if response.status_code != 200 or response.text == '{}':
+                    raise requests.exceptions.InvalidURL(url)
+                self._bootstrap = response
+            return self._bootstrap
+
+    def has_bootstrap(self) -> bool:
+        return self._bootstrap is not None
+
+    def set_bootstrap(self, response: requests.Response):
+        """ Keep a bootstrap response downloaded outside of the client """
+        with self._bootstrap_lock:
+            self._bootstrap = response
+            self._bootstrap_json = None
+
+    def get_bootstrap_json(self, url: str) -> Dict[str, Any]:
+        """ Decoded bootstrap payload, only downloaded and parsed on the first call """
+        response = self.get_bootstrap(url)
+        with self._bootstrap_lock:
+            if self._bootstrap_json is None:
+                self._bootstrap_json = response.json()
+            return self._bootstrap_json
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
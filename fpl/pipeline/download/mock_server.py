@@ -0,0 +1,197 @@
+import argparse
+import collections
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from fpl.pipeline import raw_store
+from fpl.utils import synthetic
+
+logger = logging.getLogger(__name__)
+
+PATH_BOOTSTRAP = re.compile(r'^/api/bootstrap-static/?$')
+PATH_FIXTURES = re.compile(r'^/api/fixtures/?$')
+PATH_PLAYER = re.compile(r'^/api/element-summary/(\d+)/?$')
+PATH_MANAGER = re.compile(r'^/api/entry/(\d+)/history/?$')
+
+
+class MockFplServer(object):
+    """
+    Local stand-in for the FPL API (bootstrap-static, fixtures, element-summary/{id}, entry/{id}/history)
+    Responses are read from recorded raw files when provided, otherwise generated (fpl.utils.synthetic)
+    * latency:      delay added to every response (seconds, +/- jitter)
+    * error_rate:   share of the requests answered with a 503
+    * rate_limit:   maximum number of requests per second, the next ones are answered with a 429
+    ETag / If-None-Match are supported (304 when the payload did not change)
+    Point the scrapers to it with scrape.set_url_base(server.url_base)
+    """
+    url_base: str
+
+    def __init__(
+            self,
+            port: int = 0,
+            latency: float = 0.0,
+            latency_jitter: float = 0.0,
+            error_rate: float = 0.0,
+            rate_limit: Optional[float] = None,
+            bootstrap_path: Optional[Path] = None,
+            fixtures_path: Optional[Path] = None,
+            player_details_path: Optional[Path] = None,
+            nb_players: int = 600,
+            year_start: int = 2020,
+            gameweek: Optional[int] = 10,
+            seed: int = 0
+    ):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.year_start = year_start
+        self.gameweek = gameweek
+        self.nb_requests = 0
+        self.nb_throttled = 0
+        self.nb_errors = 0
+        self.nb_requests_by_path = collections.Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = (0, 0)    # (second, number of requests in that second)
+
+        # Recorded or synthetic payloads
+        if bootstrap_path is not None:
+            self._bootstrap = _encode(raw_store.load_json(bootstrap_path))
+        else:
+            self._bootstrap = _encode(synthetic.bootstrap_payload(year_start, gameweek, nb_players, seed))
+        if fixtures_path is not None:
+            self._fixtures = _encode(raw_store.load_json(fixtures_path))
+        else:
+            self._fixtures = _encode(synthetic.fixtures_payload(year_start, gameweek))
+        self._players = {}
+        if player_details_path is not None:
+            # The recorded lines follow the order of the players in bootstrap
+            player_ids = [element['id'] for element in json.loads(self._bootstrap)['elements']]
+            with raw_store.open_text(player_details_path) as f_in:
+                for player_id, line in zip(player_ids, f_in):
+                    self._players[player_id] = line.strip().encode('utf-8')
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+        self.url_base = f'http://127.0.0.1:{self._server.server_port}/api/'
+
+    def start(self) -> 'MockFplServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f'Mock FPL API listening on {self.url_base}')
+        return self
+
+    def serve_forever(self):
+        logger.info(f'Mock FPL API listening on {self.url_base}')
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockFplServer':
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def respond(self, path: str, if_none_match: Optional[str]) -> Tuple[int, Dict[str, str], bytes]:
+        """ Status, headers and body for a request path """
+        with self._lock:
+            self.nb_requests += 1
+            self.nb_requests_by_path[path] += 1
+            if self.rate_limit is not None:
+                second = int(time.monotonic())
+                count = self._window[1] + 1 if self._window[0] == second else 1
+                self._window = (second, count)
+                if count > self.rate_limit:
+                    self.nb_throttled += 1
+                    return 429, {'Retry-After': '1'}, b''
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.nb_errors += 1
+                return 503, {}, b''
+            delay = max(0.0, self.latency + self._rng.uniform(-self.latency_jitter, self.latency_jitter))
+        time.sleep(delay)
+
+        body = self._payload(path)
+        if body is None:
+            return 404, {}, b''
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if if_none_match == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'ETag': etag, 'Content-Type': 'application/json'}, body
+
+    def _payload(self, path: str) -> Optional[bytes]:
+        if PATH_BOOTSTRAP.match(path):
+            return self._bootstrap
+        if PATH_FIXTURES.match(path):
+            return self._fixtures
+        match = PATH_PLAYER.match(path)
+        if match:
+            player_id = int(match.group(1))
+            if self._players:
+                return self._players.get(player_id)
+            return _encode(synthetic.player_details_payload(player_id, self.year_start))
+        match = PATH_MANAGER.match(path)
+        if match:
+            return _encode(synthetic.manager_history_payload(int(match.group(1)), self.year_start, self.gameweek))
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'    # keep-alive
+
+            def do_GET(self):
+                status, headers, body = server.respond(self.path, self.headers.get('If-None-Match'))
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _encode(payload: Any) -> bytes:
+    return json.dumps(payload).encode('utf-8')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Local stand-in for the FPL API')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay of each response (seconds)')
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 503')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests per second before 429')
+    parser.add_argument('--bootstrap', type=Path, default=None, help='Recorded bootstrap file')
+    parser.add_argument('--fixtures', type=Path, default=None, help='Recorded fixtures file')
+    parser.add_argument('--player-details', type=Path, default=None, help='Recorded player-details file')
+    parser.add_argument('--nb-players', type=int, default=600)
+    args = parser.parse_args()
+
+    mock = MockFplServer(
+        port=args.port, latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, bootstrap_path=args.bootstrap, fixtures_path=args.fixtures,
+        player_details_path=args.player_details, nb_players=args.nb_players
+    )
+    print(f'Set FPL_URL_BASE={mock.url_base} to scrape the mock API')
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -1,16 +1,24 @@
+import hashlib
+import json
 import logging
+import os
 import random
+import shutil
 import sys
-import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import requests
-import pandas as pd
-from fpl.constants.structure import DIR_RAW_PLAYER_DETAILS, DIR_MANAGER_HISTORY, DIR_RAW_BOOTSTRAP, DIR_RAW_FIXTURES
-
-# URL
-URL_BASE = 'https://fantasy.premierleague.com/api/'
+from fpl.pipeline import raw_store
+from fpl.pipeline.download.client import ScraperClient
+from fpl.utils import metrics
+from fpl.constants.structure import (
+    DIR_RAW_PLAYER_DETAILS, DIR_MANAGER_HISTORY, DIR_RAW_BOOTSTRAP, DIR_RAW_FIXTURES, FILE_METRICS, DIR_PROFILES
+)
+
+# URL (FPL_URL_BASE overrides the API location, e.g. to use the mock server)
+URL_BASE = os.environ.get('FPL_URL_BASE', 'https://fantasy.premierleague.com/api/')
 URL_BOOTSTRAP = URL_BASE + 'bootstrap-static/'
 URL_PLAYERS = URL_BASE + 'element-summary'
 URL_FIXTURES = URL_BASE + 'fixtures/'
@@ -18,146 +26,403 @@ URL_FIXTURES = URL_BASE + 'fixtures/'
 logger = logging.getLogger(__name__)
 
 
-def scrape_bootstrap(output_dir: Path = DIR_RAW_BOOTSTRAP, filename: str = 'bootstrap_static') -> Path:
+def set_url_base(url_base: str):
+    """ Point all the scrape functions to another API location (e.g. the mock server) """
+    global URL_BASE, URL_BOOTSTRAP, URL_PLAYERS, URL_FIXTURES
+    URL_BASE = url_base if url_base.endswith('/') else url_base + '/'
+    URL_BOOTSTRAP = URL_BASE + 'bootstrap-static/'
+    URL_PLAYERS = URL_BASE + 'element-summary'
+    URL_FIXTURES = URL_BASE + 'fixtures/'
+
+
+@metrics.instrument()
+def scrape_bootstrap(
+        output_dir: Path = DIR_RAW_BOOTSTRAP,
+        filename: str = 'bootstrap_static',
+        compression: Optional[str] = None,
+        client: Optional[ScraperClient] = None
+) -> Path:
     """
     Fetch bootstrap data (all info from the current gameweek)
+    No file is written if the data is identical to the last snapshot
     :param output_dir:   Target directory
     :param filename:     Filename output (date and suffix will be appended)
-    :return:             Path of the downloaded file
+    :param compression:  Compress the file ('gzip' or 'zstd'), None to write plain json
+    :param client:       HTTP client (a new one is created if not provided)
+    :return:             Path of the downloaded file (or of the last snapshot if unchanged)
     """
-    output_dir.mkdir(parents=True, exist_ok=True)     # Create directory if doesn't exist
-    output_path = output_dir / _format_filename(filename, 'json')
-
-    response = requests.get(URL_BOOTSTRAP)
-    if response.status_code == 200 and response.text != '{}':
-        with output_path.open('w', encoding='utf-8') as f_out:
-            f_out.write(response.text)
-        logger.info(f'Bootstrap data written into {output_path.resolve().absolute()}')
-        return output_path
-    else:
-        raise requests.exceptions.InvalidURL(URL_BOOTSTRAP)
+    client = client or ScraperClient()
+    output_path = _download_snapshot(client, URL_BOOTSTRAP, output_dir, filename, compression)
+    logger.info(f'Bootstrap data available in {output_path.resolve().absolute()}')
+    return output_path
 
 
-def scrape_fixtures(output_dir: Path = DIR_RAW_FIXTURES, filename: str = 'fixtures') -> Path:
+@metrics.instrument()
+def scrape_fixtures(
+        output_dir: Path = DIR_RAW_FIXTURES,
+        filename: str = 'fixtures',
+        compression: Optional[str] = None,
+        client: Optional[ScraperClient] = None
+) -> Path:
     """
     Fetch fixtures data (all games of the season)
+    No file is written if the data is identical to the last snapshot
     :param output_dir:   Target directory
     :param filename:     Filename output (date and suffix will be appended)
-    :return:             Path of the downloaded file
+    :param compression:  Compress the file ('gzip' or 'zstd'), None to write plain json
+    :param client:       HTTP client (a new one is created if not provided)
+    :return:             Path of the downloaded file (or of the last snapshot if unchanged)
     """
-    output_dir.mkdir(parents=True, exist_ok=True)     # Create directory if doesn't exist
-    output_path = output_dir / _format_filename(filename, 'json')
+    client = client or ScraperClient()
+    return _download_snapshot(client, URL_FIXTURES, output_dir, filename, compression)
 
-    response = requests.get(URL_FIXTURES)
-    if response.status_code == 200 and response.text != '{}':
-        with output_path.open('w', encoding='utf-8') as f_out:
-            f_out.write(response.text)
-        return output_path
+
+def _download_snapshot(
+        client: ScraperClient, url: str, output_dir: Path, filename: str, compression: Optional[str] = None
+) -> Path:
+    """
+    Download a json snapshot, skip the write if the content did not change since the last snapshot
+    * The request is conditional (ETag / Last-Modified of the last snapshot), a 304 means unchanged
+    * Otherwise the hash of the content is compared with the hash of the last snapshot
+    The state of the last snapshot is kept in a hidden file of the output directory
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)     # Create directory if doesn't exist
+    output_path = output_dir / _format_filename(filename, raw_store.raw_extension(compression))
+    state_path = output_dir / f'.{filename}.state'
+    state = _read_snapshot_state(state_path, output_dir, filename)
+    last_path = output_dir / state['path'] if state else None
+
+    # Reuse the bootstrap already downloaded by the client, otherwise send a conditional request
+    if url == URL_BOOTSTRAP and client.has_bootstrap():
+        response = client.get_bootstrap(url)
+    else:
+        headers = {}
+        if state and state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state and state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+        response = client.get(url, headers=headers)
+        if response.status_code == 304 and last_path is not None:
+            logger.info(f'{url} not modified since {last_path.name}')
+            return last_path
+        if response.status_code != 200 or response.text == '{}':
+            raise requests.exceptions.InvalidURL(url)
+        if url == URL_BOOTSTRAP:
+            client.set_bootstrap(response)
+
+    new_state = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'sha256': _hash_text(response.text)
+    }
+    if state and new_state['sha256'] == state['sha256']:
+        logger.info(f'{url} unchanged since {last_path.name}')
+        output_path = last_path
     else:
-        raise requests.exceptions.InvalidURL(URL_FIXTURES)
+        with raw_store.open_text(output_path, 'w') as f_out:
+            f_out.write(response.text)
+    new_state['path'] = output_path.name
+    with state_path.open('w', encoding='utf-8') as f_out:
+        json.dump(new_state, f_out)
+    return output_path
 
 
-def scrape_player_detailed(output_dir: Path = DIR_RAW_PLAYER_DETAILS, filename: str = 'player_detailed_data') -> Path:
+def _read_snapshot_state(state_path: Path, output_dir: Path, filename: str) -> Optional[Dict[str, Any]]:
+    """ State of the last snapshot (rebuilt from the last file if the state was never saved) """
+    if state_path.exists():
+        with state_path.open(encoding='utf-8') as f_in:
+            state = json.load(f_in)
+        if (output_dir / state['path']).exists():
+            return state
+    snapshots = raw_store.list_raw_files(output_dir, f'*_{filename}')
+    if not snapshots:
+        return None
+    with raw_store.open_text(snapshots[-1]) as f_in:
+        return {'path': snapshots[-1].name, 'sha256': _hash_text(f_in.read())}
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+@metrics.instrument()
+def scrape_player_detailed(
+        output_dir: Path = DIR_RAW_PLAYER_DETAILS,
+        filename: str = 'player_detailed_data',
+        max_workers: int = 8,
+        rate_limit: Optional[float] = 10.0,
+        shard_size: int = 100,
+        processes: int = 1,
+        compression: Optional[str] = None,
+        client: Optional[ScraperClient] = None
+) -> Path:
     """
     Extract the detailed data (including player-details) for all the players
+    Requests are sent concurrently, the output keeps the order of the players in bootstrap
+    The players are split into shards, each shard is written atomically and recorded in the manifest
+    of the snapshot. Calling the function again the same day only fetches the missing shards.
+    The snapshot file is created (and the manifest marked complete) once all the shards are extracted.
     :param output_dir:   Target directory
     :param filename:     Filename output (date and suffix will be appended)
+    :param max_workers:  Maximum number of requests in flight (per process)
+    :param rate_limit:   Maximum number of requests per second (None for no limit), ignored if client is provided
+    :param shard_size:   Number of players by shard
+    :param processes:    Number of processes extracting shards in parallel (the rate limit is split between them)
+    :param compression:  Compress the file ('gzip' or 'zstd'), None to write plain json
+    :param client:       HTTP client (a new one is created if not provided)
     :return:             Path of the downloaded file
     """
+    client = client or ScraperClient(rate_limit=rate_limit, max_connections=max_workers)
     output_dir.mkdir(parents=True, exist_ok=True)     # Create directory if doesn't exist
-    output_path = output_dir / _format_filename(filename, 'json')
-
-    with open(output_path, 'w') as f_out:
-        logger.info('Start extracting player-details data')
-        resp_bootstrap = requests.get(URL_BOOTSTRAP)
-        for player in resp_bootstrap.json()['elements']:
-            player_id = player['id']
-            resp = requests.get(f'{URL_PLAYERS}/{player_id}/')
-            if resp.status_code == 200 and resp.text != '{}':
-                logger.debug(f'Player {player_id} - Success')
-                f_out.writelines(resp.text + '\n')
-            else:
-                logger.warning(f'Player {player_id} - Error : {resp.status_code}')
-                raise requests.exceptions.InvalidURL(f'{URL_PLAYERS}/{player_id}')
-
-            time.sleep(0.1)
-
-        logger.info('Finished extracting player-details data')
+    output_path = output_dir / _format_filename(filename, raw_store.raw_extension(compression))
+    shard_dir = output_dir / (raw_store.snapshot_stem(output_path) + '.shards')
+    shard_dir.mkdir(exist_ok=True)
+
+    logger.info('Start extracting player-details data')
+    manifest = raw_store.read_manifest(output_path)
+    if manifest is not None and not manifest['complete']:
+        logger.info(f'Resume extraction, shards completed: {len(manifest["completed"])}/{len(manifest["shards"])}')
+    else:
+        player_ids = [player['id'] for player in client.get_bootstrap_json(URL_BOOTSTRAP)['elements']]
+        manifest = {
+            'shards': [player_ids[i:i + shard_size] for i in range(0, len(player_ids), shard_size)],
+            'completed': [],
+            'complete': False
+        }
+        raw_store.write_manifest(output_path, manifest)
+
+    def shard_path(shard_idx: int) -> Path:
+        return shard_dir / f'{shard_idx:05d}.json'
+
+    missing = [
+        idx for idx in range(len(manifest['shards']))
+        if idx not in manifest['completed'] or not shard_path(idx).exists()
+    ]
+    manifest['completed'] = [idx for idx in manifest['completed'] if idx not in missing]
+
+    def mark_completed(shard_idx: int):
+        manifest['completed'].append(shard_idx)
+        raw_store.write_manifest(output_path, manifest)
+        logger.debug(f'Shard {shard_idx} - Success ({len(manifest["completed"])}/{len(manifest["shards"])})')
+
+    if processes > 1:
+        rate_process = rate_limit / processes if rate_limit else None
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {
+                pool.submit(_scrape_player_shard_process, shard_path(idx), manifest['shards'][idx],
+                            rate_process, max_workers): idx
+                for idx in missing
+            }
+            for future in as_completed(futures):
+                future.result()
+                mark_completed(futures[future])
+    else:
+        for idx in missing:
+            _scrape_player_shard(shard_path(idx), manifest['shards'][idx], client, max_workers)
+            mark_completed(idx)
+
+    # Merge the shards (in player order) into the snapshot
+    tmp_path = output_path.with_name(output_path.name + raw_store.PARTIAL_SUFFIX)
+    with raw_store.open_text(tmp_path, 'w') as f_out:
+        for idx in range(len(manifest['shards'])):
+            with shard_path(idx).open(encoding='utf-8') as f_in:
+                shutil.copyfileobj(f_in, f_out)
+    os.replace(tmp_path, output_path)
+    manifest['complete'] = True
+    raw_store.write_manifest(output_path, manifest)
+    shutil.rmtree(shard_dir)
+
+    logger.info('Finished extracting player-details data')
     return output_path
 
 
+def _scrape_player_shard(shard_path: Path, player_ids: List[int], client: ScraperClient, max_workers: int) -> Path:
+    """ Fetch the players of a shard and write them (one json by line) atomically """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        # map yields the responses in the order of the players
+        players_text = list(executor.map(lambda x: _fetch_player_detailed(x, client), player_ids))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    raw_store.atomic_write_text(shard_path, ''.join(text + '\n' for text in players_text))
+    return shard_path
+
+
+def _scrape_player_shard_process(
+        shard_path: Path, player_ids: List[int], rate_limit: Optional[float], max_workers: int
+) -> Path:
+    """ Entry point of the worker processes (each process has its own client) """
+    with ScraperClient(rate_limit=rate_limit, max_connections=max_workers) as client:
+        return _scrape_player_shard(shard_path, player_ids, client, max_workers)
+
+
+def _fetch_player_detailed(player_id: int, client: ScraperClient) -> str:
+    resp = client.get(f'{URL_PLAYERS}/{player_id}/')
+    if resp.status_code == 200 and resp.text != '{}':
+        logger.debug(f'Player {player_id} - Success')
+        return resp.text
+    else:
+        logger.warning(f'Player {player_id} - Error : {resp.status_code}')
+        raise requests.exceptions.InvalidURL(f'{URL_PLAYERS}/{player_id}')
+
+
+@metrics.instrument()
 def scrape_manager_history(
         output_dir: Path = DIR_MANAGER_HISTORY,
         filename: str = 'manager',
         nb_managers: int = 2000,
-        include_current: bool = False
+        include_current: bool = False,
+        max_workers: int = 8,
+        chunk_size: int = 500,
+        client: Optional[ScraperClient] = None
 ) -> List[Path]:
     """
     Extract the manager for a list of random managers of fantasy football
-    :param output_dir:   T  arget directory
+    Managers are fetched concurrently and the rows are appended to the csv files chunk by chunk.
+    The run (sample of managers, output files) and the managers already extracted are saved in hidden files
+    next to the outputs: calling the function again resumes an interrupted run (whatever the day),
+    they are removed once the run is complete.
+    :param output_dir:      Target directory
     :param filename:        Filename output (date and suffix will be appended)
-    :param nb_managers:        Number of managers to query
+    :param nb_managers:     Number of managers to query
     :param include_current: If yes, extract the weekly rankings for the current season
+    :param max_workers:     Maximum number of requests in flight
+    :param chunk_size:      Number of managers written to disk at once
+    :param client:          HTTP client (a new one is created if not provided)
     :return:                Path of the downloaded file
     """
-    output_paths = []
+    client = client or ScraperClient(rate_limit=100, max_connections=max_workers)
+    output_dir.mkdir(parents=True, exist_ok=True)     # Create directory if doesn't exist
+    run_path = output_dir / f'.{filename}.run'
+    checkpoint_path = output_dir / f'.{filename}.checkpoint'
 
     logger.info('Start extracting manager')
     # Count number of players + get season_name
-    bootstrap = requests.get(URL_BOOTSTRAP).json()
+    bootstrap = client.get_bootstrap_json(URL_BOOTSTRAP)
     season_name = _extract_season_name(bootstrap)
-    total_managers = bootstrap['total_players']
-    managers_ids = [str(random.randint(0, total_managers)) for _ in range(nb_managers)]
-
-    managers_current = []
-    managers_past = []
-
-    for idx, manager in enumerate(managers_ids, start=1):
-        if (idx % 100) == 0:
-            logger.debug(f'Extracted {idx} Managers')
-        result = requests.get(URL_BASE+'entry/' + manager + '/history/')
-
-        # Extract info current
-        if include_current:
-            current = result.json()['current']
-            for gw in range(len(current)):
-                current[gw]['manager'] = manager
-                current[gw]['season_name'] = season_name
-            managers_current.extend(current)
-
-        # Extract info past
-        past = result.json()['past']
-        for gw in range(len(past)):
-            past[gw]['manager'] = manager
-        managers_past.extend(past)
-
-        time.sleep(0.01)
+    run = _read_run(run_path)
+    if run is not None and run['include_current'] == include_current:
+        logger.info(f'Resume extraction of {len(run["managers"])} managers into {run["past"]}')
+    else:
+        total_managers = bootstrap['total_players']
+        run = {
+            'managers': [str(x) for x in random.sample(range(1, total_managers + 1), min(nb_managers, total_managers))],
+            'current': _format_filename(filename + '_current', 'csv'),
+            'past': _format_filename(filename + '_past', 'csv'),
+            'include_current': include_current
+        }
+        # A new run starts its outputs from scratch
+        for path in [checkpoint_path, output_dir / run['current'], output_dir / run['past']]:
+            path.unlink(missing_ok=True)
+        raw_store.atomic_write_text(run_path, json.dumps(run))
+    managers_ids = run['managers']
+    output_path_current = output_dir / run['current']
+    output_path_past = output_dir / run['past']
+    completed = set(_read_ids(checkpoint_path))
+    pending = [manager for manager in managers_ids if manager not in completed]
+    logger.info(f'{len(completed)} managers already extracted, {len(pending)} remaining')
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            managers_current = []
+            managers_past = []
+            for manager, history in executor.map(lambda x: _fetch_manager_history(x, client), chunk):
+                if history is None:
+                    continue
+                # Extract info current
+                if include_current:
+                    for gw in history['current']:
+                        gw['manager'] = manager
+                        gw['season_name'] = season_name
+                    managers_current.extend(history['current'])
+                # Extract info past
+                for season in history['past']:
+                    season['manager'] = manager
+                managers_past.extend(history['past'])
+
+            # Rows are written before the checkpoint, a crash in between only duplicates the chunk
+            if include_current:
+                _append_csv(managers_current, output_path_current)
+            _append_csv(managers_past, output_path_past)
+            with checkpoint_path.open('a', encoding='utf-8') as f_out:
+                f_out.write('\n'.join(chunk) + '\n')
+            logger.debug(f'Extracted {len(completed) + start + len(chunk)} Managers')
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    run_path.unlink()
+    checkpoint_path.unlink(missing_ok=True)
     logger.info('Finished extracting manager')
 
-    # Output data current (if selected)
+    output_paths = []
     if include_current:
-        output_path_current = output_dir / _format_filename(filename + '_current', 'csv')
-        pd.DataFrame(managers_current).to_csv(output_path_current, index=False)
+        output_path_current.touch()
         logger.info(f'Results (current) wrote to csv file {output_path_current}')
         output_paths.append(output_path_current)
-
-    # Output data past
-    output_path_past = output_dir / _format_filename(filename + '_past', 'csv')
-    df_rankings_past = pd.DataFrame(managers_past).sort_values(['manager', 'season_name'])
-    df_rankings_past.to_csv(output_path_past, index=False)
+    output_path_past.touch()
     logger.info(f'Results (past) wrote to csv file {output_path_past}')
     output_paths.append(output_path_past)
 
     return output_paths
 
 
-def scrape_manager_team(email: str, password: str) -> dict:
+def _fetch_manager_history(manager: str, client: ScraperClient) -> Tuple[str, Optional[Dict[str, Any]]]:
+    resp = client.get(URL_BASE + 'entry/' + manager + '/history/')
+    if resp.status_code != 200:
+        # Deleted accounts return 404
+        logger.warning(f'Manager {manager} - Error : {resp.status_code}')
+        return manager, None
+    return manager, resp.json()
+
+
+def _append_csv(rows: List[Dict[str, Any]], output_path: Path):
+    """
+    Append rows to a csv file, in the columns of the existing file
+    New columns extend the header: the file is written again with all the columns
+    """
+    if not rows:
+        return
+    # Only the manager history needs pandas: the snapshot scrapes (polled by cron) don't import it
+    import pandas as pd
+    df = pd.DataFrame(rows)
+    if not output_path.exists() or output_path.stat().st_size == 0:
+        df.to_csv(output_path, index=False)
+        return
+    columns = pd.read_csv(output_path, nrows=0).columns
+    new_columns = [column for column in df.columns if column not in columns]
+    if not new_columns:
+        df.reindex(columns=columns).to_csv(output_path, mode='a', header=False, index=False)
+        return
+    logger.info(f'New columns {new_columns} added to {output_path.name}')
+    df_all = pd.concat([pd.read_csv(output_path), df], ignore_index=True)
+    tmp_path = output_path.with_name(output_path.name + raw_store.PARTIAL_SUFFIX)
+    df_all.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+
+
+def _read_run(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    with path.open(encoding='utf-8') as f_in:
+        return json.load(f_in)
+
+
+def _read_ids(path: Path) -> List[str]:
+    if not path.exists():
+        return []
+    with path.open(encoding='utf-8') as f_in:
+        return [line.strip() for line in f_in if line.strip()]
+
+
+def scrape_manager_team(email: str, password: str, client: Optional[ScraperClient] = None) -> dict:
     logging.info('Connect - Retrieve manager info from https://fantasy.premierleague.com/')
 
-    # Create Session
-    session = requests.Session()
+    # The session of the client keeps the cookies
+    client = client or ScraperClient()
+    session = client.session
     # Go to login page to get the cookies
-    session.get('https://fantasy.premierleague.com/')
+    session.get('https://fantasy.premierleague.com/', timeout=client.timeout)
     csrftoken = session.cookies['csrftoken']
     login_data = {
         'csrfmiddlewaretoken': csrftoken,
@@ -167,9 +432,9 @@ def scrape_manager_team(email: str, password: str) -> dict:
         'redirect_uri': 'https://fantasy.premierleague.com/a/login'
     }
     # Log in
-    session.post('https://users.premierleague.com/accounts/login/', data=login_data)
+    session.post('https://users.premierleague.com/accounts/login/', data=login_data, timeout=client.timeout)
     # Get List Transfers
-    response = session.get('https://fantasy.premierleague.com/drf/transfers')
+    response = client.get('https://fantasy.premierleague.com/drf/transfers')
     manager_info = response.json()
     logging.debug(f'Manager Info: \n {manager_info}')
     return manager_info
@@ -190,18 +455,23 @@ def _extract_season_name(bootstrap_json: Dict[str, Any]) -> str:
 
 
 if __name__ == '__main__':
+    # --profile: cProfile dump of the scrape in data/metrics/profiles (metrics are always recorded)
+    PROFILE = '--profile' in sys.argv
+    sys.argv = [arg for arg in sys.argv if arg != '--profile']
+    metrics.configure(FILE_METRICS, DIR_PROFILES if PROFILE else None)
     DATA = sys.argv[1]
+    client = ScraperClient()
     if DATA == 'bootstrap':
-        scrape_bootstrap()
+        scrape_bootstrap(client=client)
     elif DATA == 'players':
-        scrape_player_detailed()
+        scrape_player_detailed(client=client)
     elif DATA == 'fixtures':
-        scrape_fixtures()
+        scrape_fixtures(client=client)
     elif DATA == 'history':
         NB_MANAGERS = int(sys.argv[2])
-        scrape_manager_history(nb_managers=NB_MANAGERS)
+        scrape_manager_history(nb_managers=NB_MANAGERS, client=client)
     elif DATA == 'history-include-current':
         NB_MANAGERS = int(sys.argv[2])
-        scrape_manager_history(nb_managers=NB_MANAGERS, include_current=True)
+        scrape_manager_history(nb_managers=NB_MANAGERS, include_current=True, client=client)
     else:
         print('Wrong argument')
@@ -0,0 +1,136 @@
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, TextIO
+
+try:
+    import orjson
+except ImportError:
+    # Optional (pip install orjson): faster decoding of the raw snapshots, json is used otherwise
+    orjson = None
+
+# Raw snapshots are json files, optionally compressed (the suffix gives the compression)
+RAW_EXTENSION = '.json'
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+PARTIAL_SUFFIX = '.partial'
+
+# Raw snapshot written in several parts: the manifest keeps track of the completed parts
+MANIFEST_SUFFIX = '.manifest'
+
+
+def raw_extension(compression: Optional[str] = None) -> str:
+    """ Extension of a raw snapshot (without the leading dot), e.g. json.gz for gzip """
+    if compression is None:
+        return RAW_EXTENSION[1:]
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f'Unknown compression {compression}, expected one of {list(COMPRESSION_SUFFIXES)}')
+    return RAW_EXTENSION[1:] + COMPRESSION_SUFFIXES[compression]
+
+
+def get_compression(path: Path) -> Optional[str]:
+    """ Compression of a raw file, inferred from its suffix (temporary suffix ignored) """
+    name = path.name
+    if name.endswith(PARTIAL_SUFFIX):
+        name = name[:-len(PARTIAL_SUFFIX)]
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if name.endswith(suffix):
+            return compression
+    return None
+
+
+def open_text(path: Path, mode: str = 'r') -> TextIO:
+    """ Open a raw file in text mode (utf-8), (de)compressing on the fly according to its suffix """
+    if get_compression(path) is None:
+        return path.open(mode, encoding='utf-8')
+    return io.TextIOWrapper(open_binary(path, mode), encoding='utf-8')
+
+
+def open_binary(path: Path, mode: str = 'r') -> BinaryIO:
+    """ Open a raw file in binary mode, (de)compressing on the fly according to its suffix """
+    compression = get_compression(path)
+    if compression == 'gzip':
+        return gzip.open(path, mode + 'b')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f'zstandard is required to read/write {path.name} (pip install zstandard)')
+        return zstandard.open(path, mode + 'b')
+    return path.open(mode + 'b')
+
+
+def loads(data: bytes) -> Any:
+    """ Decode a json document (orjson when installed) """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_json(path: Path) -> Any:
+    with open_binary(path) as f_in:
+        return loads(f_in.read())
+
+
+def snapshot_stem(path: Path) -> str:
+    """ Name of the snapshot without the json / compression suffixes """
+    name = path.name
+    compression = get_compression(path)
+    if compression is not None:
+        name = name[:-len(COMPRESSION_SUFFIXES[compression])]
+    if name.endswith(RAW_EXTENSION):
+        name = name[:-len(RAW_EXTENSION)]
+    return name
+
+
+def list_raw_files(dir_raw: Path, pattern: str = '*') -> List[Path]:
+    """ Sorted list of the raw json files (compressed or not) of a folder """
+    paths = []
+    for extension in [RAW_EXTENSION] + [RAW_EXTENSION + suffix for suffix in COMPRESSION_SUFFIXES.values()]:
+        paths.extend(path for path in dir_raw.glob(pattern + extension) if path.is_file())
+    return sorted(paths)
+
+
+def manifest_path(snapshot_path: Path) -> Path:
+    """ Manifest associated to a raw snapshot (same name, manifest suffix) """
+    return snapshot_path.with_name(snapshot_stem(snapshot_path) + MANIFEST_SUFFIX)
+
+
+def read_manifest(snapshot_path: Path) -> Optional[Dict[str, Any]]:
+    path = manifest_path(snapshot_path)
+    if not path.exists():
+        return None
+    with path.open(encoding='utf-8') as f_in:
+        return json.load(f_in)
+
+
+def write_manifest(snapshot_path: Path, manifest: Dict[str, Any]):
+    atomic_write_text(manifest_path(snapshot_path), json.dumps(manifest))
+
+
+def atomic_write_text(path: Path, text: str):
+    """ Write into a temporary file then rename it, readers never see a half-written file """
+    tmp_path = path.with_name(path.name + PARTIAL_SUFFIX)
+    with open_text(tmp_path, 'w') as f_out:
+        f_out.write(text)
+    os.replace(tmp_path, path)
+
+
+def is_complete(snapshot_path: Path) -> bool:
+    """
+    A snapshot is complete if it exists and its manifest (if any) says so
+    Snapshots written before manifests existed don't have one and are considered complete
+    """
+    if not snapshot_path.is_file():
+        return False
+    manifest = read_manifest(snapshot_path)
+    return manifest is None or manifest.get('complete', False)
+
+
+def list_complete_snapshots(dir_raw: Path, pattern: str = '*') -> List[Path]:
+    """ Sorted list of the complete snapshots (compressed or not) of a raw data folder """
+    return [path for path in list_raw_files(dir_raw, pattern) if is_complete(path)]
@@ -0,0 +1,158 @@
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+import pandas as pd
+import fpl.constants.fields as fld
+from fpl.constants.schema import get_dtype
+
+logger = logging.getLogger(__name__)
+
+# Intermediate / processed datasets: the format is given by the suffix of the file
+# Large datasets are partitioned by season / gameweek (a folder per season, a file per gameweek)
+PARQUET_SUFFIX = '.parquet'
+FEATHER_SUFFIX = '.feather'
+CSV_SUFFIX = '.csv'
+FORMATS = [PARQUET_SUFFIX, FEATHER_SUFFIX, CSV_SUFFIX]
+DEFAULT_SUFFIX = PARQUET_SUFFIX
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast the columns registered in fpl.constants.schema to their type (the other columns are left as they are)
+    Values that can't be represented (e.g. 1.5 for an integer field) raise an error rather than being truncated
+    """
+    dtypes = {}
+    for column in df.columns:
+        dtype = get_dtype(column)
+        if dtype is not None and str(df[column].dtype) != dtype:
+            dtypes[column] = dtype
+    if not dtypes:
+        return df
+    df = df.copy()
+    for column, dtype in dtypes.items():
+        if dtype == 'boolean' and df[column].dtype == object:
+            # Booleans mixed with missing values (nan)
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+        df[column] = df[column].astype(dtype)
+    return df
+
+
+def write_table(df: pd.DataFrame, path: Path):
+    """
+    Write a dataset with the types of the schema registry
+    :param df:      Dataset
+    :param path:    Output file (.parquet, .feather or .csv)
+    """
+    suffix = _check_suffix(path)
+    df = apply_schema(df)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.partial')
+    if suffix == PARQUET_SUFFIX:
+        _require_pyarrow(path)
+        df.to_parquet(tmp_path, index=False)
+    elif suffix == FEATHER_SUFFIX:
+        _require_pyarrow(path)
+        df.reset_index(drop=True).to_feather(tmp_path)
+    else:
+        df.to_csv(tmp_path, index=False, encoding='utf-8')
+    tmp_path.replace(path)
+    logger.debug(f'Write {len(df)} rows to {path}')
+
+
+def read_table(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a dataset written by write_table
+    :param path:    Input file (.parquet, .feather or .csv)
+    :param columns: Columns to read (all if None), only these are loaded from parquet / feather files
+    """
+    suffix = _check_suffix(path)
+    if suffix == PARQUET_SUFFIX:
+        _require_pyarrow(path)
+        df = pd.read_parquet(path, columns=columns)
+    elif suffix == FEATHER_SUFFIX:
+        _require_pyarrow(path)
+        df = pd.read_feather(path, columns=columns)
+    else:
+        # utf-8-sig also reads the files written with a byte order mark by the previous versions
+        df = pd.read_csv(path, usecols=columns, encoding='utf-8-sig')
+    # Columnar files keep their types, csv files are typed here
+    return apply_schema(df)
+
+
+def partition_path(dir_dataset: Path, season_id: int, gw: int) -> Path:
+    """ File of a partition of a dataset: <dir>/season=<season id>/gameweek=<gameweek>.parquet """
+    return dir_dataset / f'{fld.SEASON_ID}={season_id}' / f'{fld.GW}={gw}{DEFAULT_SUFFIX}'
+
+
+def list_partitions(dir_dataset: Path) -> List[Tuple[int, int]]:
+    """ Partitions (season id, gameweek) of a dataset, sorted, found from the file names only """
+    partitions = []
+    for path in dir_dataset.glob(f'{fld.SEASON_ID}=*/{fld.GW}=*{DEFAULT_SUFFIX}'):
+        partitions.append((int(path.parent.name.split('=')[1]), int(path.name[:-len(DEFAULT_SUFFIX)].split('=')[1])))
+    return sorted(partitions)
+
+
+def latest_partition(dir_dataset: Path) -> Optional[Tuple[int, int]]:
+    """ Last gameweek of the last season of a dataset, None if the dataset is empty """
+    partitions = list_partitions(dir_dataset)
+    return partitions[-1] if partitions else None
+
+
+def write_partitions(df: pd.DataFrame, dir_dataset: Path, overwrite: bool = False):
+    """
+    Write a dataset partitioned by season / gameweek (one file per partition)
+    :param df:          Dataset (every row must have a season and a gameweek)
+    :param dir_dataset: Folder of the dataset
+    :param overwrite:   Remove the partitions which are not in df (otherwise only the partitions of df are replaced)
+    """
+    if df[fld.SEASON_ID].isna().any() or df[fld.GW].isna().any():
+        raise ValueError(f'Rows without {fld.SEASON_ID} / {fld.GW} can not be partitioned')
+    written = set()
+    for (season_id, gw), df_partition in df.groupby([fld.SEASON_ID, fld.GW], sort=True):
+        partition = (int(season_id), int(gw))
+        write_table(df_partition, partition_path(dir_dataset, *partition))
+        written.add(partition)
+    if overwrite:
+        for partition in set(list_partitions(dir_dataset)) - written:
+            partition_path(dir_dataset, *partition).unlink()
+    logger.info(f'Write {len(written)} partitions to {dir_dataset}')
+
+
+def read_partitions(
+        dir_dataset: Path,
+        seasons: Optional[Iterable[int]] = None,
+        gameweeks: Optional[Iterable[int]] = None,
+        columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Read a partitioned dataset, only the files of the selected partitions are opened
+    :param dir_dataset: Folder of the dataset
+    :param seasons:     Season ids to read (all if None)
+    :param gameweeks:   Gameweeks to read (all if None)
+    :param columns:     Columns to read (all if None)
+    :return:            Rows sorted by season / gameweek (empty if no partition is selected)
+    """
+    seasons = None if seasons is None else set(seasons)
+    gameweeks = None if gameweeks is None else set(gameweeks)
+    partitions = [
+        (season_id, gw) for season_id, gw in list_partitions(dir_dataset)
+        if (seasons is None or season_id in seasons) and (gameweeks is None or gw in gameweeks)
+    ]
+    logger.debug(f'Read {len(partitions)} partitions from {dir_dataset}')
+    if not partitions:
+        return pd.DataFrame(columns=columns)
+    list_df = [read_table(partition_path(dir_dataset, *partition), columns) for partition in partitions]
+    return apply_schema(pd.concat(list_df, ignore_index=True))
+
+
+def _check_suffix(path: Path) -> str:
+    if path.suffix not in FORMATS:
+        raise ValueError(f'Unknown format of {path.name}, expected one of {FORMATS}')
+    return path.suffix
+
+
+def _require_pyarrow(path: Path):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(f'pyarrow is required to read/write {path.name} (pip install pyarrow)')
@@ -1,11 +1,26 @@
+import hashlib
 import json
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
 import pandas as pd
 import fpl.constants.fields as fld
-from fpl.constants.structure import DIR_RAW_PLAYER_DETAILS, FILE_INTER_HISTORICAL
+from fpl.pipeline import storage
+from fpl.pipeline.raw_store import list_complete_snapshots, loads, open_text, snapshot_stem
+from fpl.constants.structure import DIR_RAW_PLAYER_DETAILS, FILE_INTER_HISTORICAL, DIR_INTER_HISTORY_CACHE
+from fpl.utils.metrics import instrument
 
 TOTAL_POINTS = 'total_points'
 
+# History cache: the past seasons of a player are stored once per distinct history_past block (player, hash)
+HISTORY_HASH = 'history_hash'
+SNAPSHOT = 'snapshot'     # last snapshot where the block was seen
+FILE_NAME = 'file_name'
+FILE_SIZE = 'size'
+FILE_MTIME_NS = 'mtime_ns'
+CACHE_RECORDS_COLUMNS = [fld.PLAYER_ID, HISTORY_HASH, fld.SEASON_ID, TOTAL_POINTS]
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,7 +33,7 @@ def add_avg_prev_season(df):
     df_prev = df.copy()
     # Calculate average previous season
     df_prev[fld.SEASON_ID] = df_prev[fld.SEASON_ID] + 1
-    df_prev[fld.STAT_POINTS_AVG_SEASON_PREV] = df_prev[TOTAL_POINTS].apply(lambda x: round(x / 38, 2))
+    df_prev[fld.STAT_POINTS_AVG_SEASON_PREV] = (df_prev[TOTAL_POINTS] / 38).round(2)
     # Select only fields of interest
     df_prev = df_prev[[fld.PLAYER_ID, fld.SEASON_ID, fld.STAT_POINTS_AVG_SEASON_PREV]]
     # Merge
@@ -47,22 +62,189 @@ def get_historical_info(history_json):
     return df_history
 
 
-def build_bootstrap_dataset(dir_data_raw_hist):
-    list_df = []
-    for file_path in dir_data_raw_hist.glob('*.json'):
-        logger.info(f'Processing file {file_path.name}')
-        with open(file_path) as file_in:
-            for idx, line in enumerate(file_in, start=1):
-                logging.debug(f'File {file_path} - Line {idx}')
-                player_json = json.loads(line)
-                if player_json['history_past']:
-                    df_history = get_historical_info(player_json)
-                    list_df.append(df_history)
-    df_all_history = pd.concat(list_df)
-    df_all_history_clean = df_all_history.drop_duplicates()
-    return df_all_history_clean
-
-
-def run():
-    output_historical = build_bootstrap_dataset(DIR_RAW_PLAYER_DETAILS)
-    output_historical.to_csv(FILE_INTER_HISTORICAL, index=False)
+def read_history_records(file_path: Path) -> pd.DataFrame:
+    """
+    Past seasons of all the players of a player-details snapshot (one player per line)
+    The records are collected into columns, a single DataFrame is built for the whole file
+    :return: player id, season id and total points (duplicates removed)
+    """
+    logger.info(f'Processing file {file_path.name}')
+    player_ids, season_ids, total_points = [], [], []
+    with open_text(file_path) as file_in:
+        for line in file_in:
+            for record in loads(line)['history_past']:
+                player_ids.append(record['element_code'])
+                season_ids.append(record['season'])
+                total_points.append(record[TOTAL_POINTS])
+    df_records = pd.DataFrame({
+        fld.PLAYER_ID: pd.Series(player_ids, dtype='int64'),
+        fld.SEASON_ID: pd.Series(season_ids, dtype='int64'),
+        TOTAL_POINTS: pd.Series(total_points, dtype='int64')
+    })
+    return df_records.drop_duplicates()
+
+
+def build_bootstrap_dataset(dir_data_raw_hist, workers: int = 1):
+    """
+    Average points of the previous season for each player / season, from all the player-details snapshots
+    :param dir_data_raw_hist:   Folder of the player-details snapshots
+    :param workers:             Number of processes reading the snapshots
+    """
+    # Snapshots still being extracted (incomplete manifest) are ignored
+    file_paths = list_complete_snapshots(dir_data_raw_hist)
+    if workers > 1 and len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list_df = list(pool.map(read_history_records, file_paths))
+    else:
+        list_df = [read_history_records(file_path) for file_path in file_paths]
+    # A season corrected in a later snapshot keeps its last value (the snapshots are sorted by date)
+    df_records = pd.concat(list_df, ignore_index=True).drop_duplicates([fld.PLAYER_ID, fld.SEASON_ID], keep='last')
+
+    # Previous season of all the players at once
+    df_history = add_avg_prev_season(df_records)
+    df_history = df_history[[fld.PLAYER_ID, fld.SEASON_ID, fld.STAT_POINTS_AVG_SEASON_PREV]]
+    return df_history.drop_duplicates().reset_index(drop=True)
+
+
+def update_history_cache(dir_data_raw_hist: Path, dir_cache: Path) -> Set[int]:
+    """
+    Add the new player-details snapshots to the history cache
+    * snapshots already scanned (same name, size and modification time) are not opened
+    * each history_past block is hashed (canonical json), a known (player, hash) only updates the snapshot
+      where it was last seen, only new / changed blocks are added as records
+    Snapshots removed from the raw folder stay in the cache
+    :return: Players whose history changed
+    """
+    df_files, df_entries, df_records = _read_cache(dir_cache)
+    scanned = {record[FILE_NAME]: record for record in df_files.to_dict('records')}
+    entries = {
+        (record[fld.PLAYER_ID], record[HISTORY_HASH]): record[SNAPSHOT] for record in df_entries.to_dict('records')
+    }
+    latest_before = _latest_hashes(entries)
+
+    new_records = []
+    for file_path in list_complete_snapshots(dir_data_raw_hist):
+        stat = file_path.stat()
+        known = scanned.get(file_path.name)
+        if known is not None and known[FILE_SIZE] == stat.st_size and known[FILE_MTIME_NS] == stat.st_mtime_ns:
+            continue
+        snapshot = snapshot_stem(file_path)
+        nb_parsed = 0
+        with open_text(file_path) as file_in:
+            for line in file_in:
+                history_past = loads(line)['history_past']
+                if not history_past:
+                    continue
+                player_id = history_past[0]['element_code']
+                digest = history_hash(history_past)
+                if (player_id, digest) in entries:
+                    entries[(player_id, digest)] = max(entries[(player_id, digest)], snapshot)
+                    continue
+                nb_parsed += 1
+                entries[(player_id, digest)] = snapshot
+                new_records.extend(
+                    (player_id, digest, record['season'], record[TOTAL_POINTS]) for record in history_past
+                )
+        logger.info(f'Cache file {file_path.name}: {nb_parsed} new or changed histories')
+        scanned[file_path.name] = {FILE_NAME: file_path.name, FILE_SIZE: stat.st_size, FILE_MTIME_NS: stat.st_mtime_ns}
+
+    latest_after = _latest_hashes(entries)
+    affected = {player_id for player_id, digest in latest_after.items() if latest_before.get(player_id) != digest}
+    affected.update(player_id for player_id, _, _, _ in new_records)
+
+    # Save
+    dir_cache.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(list(scanned.values()), columns=[FILE_NAME, FILE_SIZE, FILE_MTIME_NS])\
+        .to_csv(dir_cache / 'files.csv', index=False)
+    df_entries = pd.DataFrame(
+        [(player_id, digest, snapshot) for (player_id, digest), snapshot in entries.items()],
+        columns=[fld.PLAYER_ID, HISTORY_HASH, SNAPSHOT]
+    )
+    storage.write_table(df_entries, dir_cache / f'entries{storage.DEFAULT_SUFFIX}')
+    df_new_records = pd.DataFrame(new_records, columns=CACHE_RECORDS_COLUMNS)
+    df_records = pd.concat([df_records, df_new_records], ignore_index=True) if len(df_records) else df_new_records
+    storage.write_table(df_records, dir_cache / f'records{storage.DEFAULT_SUFFIX}')
+    return affected
+
+
+def build_historical_from_cache(dir_cache: Path, player_ids: Optional[Set[int]] = None) -> pd.DataFrame:
+    """
+    Average points of the previous season from the cached histories
+    :param dir_cache:   Folder of the history cache
+    :param player_ids:  Only these players (all if None)
+    """
+    _, df_entries, df_records = _read_cache(dir_cache)
+    if player_ids is not None:
+        df_entries = df_entries[df_entries[fld.PLAYER_ID].isin(player_ids)]
+    df_records = df_records.merge(df_entries, on=[fld.PLAYER_ID, HISTORY_HASH])
+    # A season corrected in a later snapshot keeps its last value
+    df_records = df_records\
+        .sort_values(SNAPSHOT, kind='stable')\
+        .drop_duplicates([fld.PLAYER_ID, fld.SEASON_ID], keep='last')[[fld.PLAYER_ID, fld.SEASON_ID, TOTAL_POINTS]]
+    df_history = add_avg_prev_season(df_records)
+    df_history = df_history[[fld.PLAYER_ID, fld.SEASON_ID, fld.STAT_POINTS_AVG_SEASON_PREV]]
+    return df_history.drop_duplicates().reset_index(drop=True)
+
+
+def update_historical_incremental(dir_data_raw_hist: Path, dir_cache: Path, historical_path: Path) -> pd.DataFrame:
+    """
+    Maintain the historical dataset from the history cache: only the rows of the players whose history changed
+    are recomputed
+    """
+    table_exists = historical_path.exists() and (dir_cache / 'files.csv').exists()
+    affected = update_history_cache(dir_data_raw_hist, dir_cache)
+    if not table_exists:
+        df_historical = build_historical_from_cache(dir_cache)
+    else:
+        logger.info(f'{len(affected)} players with a new or changed history')
+        df_historical = storage.read_table(historical_path)
+        if affected:
+            df_historical = pd.concat([
+                df_historical[~df_historical[fld.PLAYER_ID].isin(affected)],
+                storage.apply_schema(build_historical_from_cache(dir_cache, affected))
+            ], ignore_index=True)
+    storage.write_table(df_historical, historical_path)
+    return df_historical
+
+
+def history_hash(history_past: List[Dict[str, Any]]) -> str:
+    """ Hash of the canonical json of a history_past block (same history, same hash whatever the layout) """
+    canonical = json.dumps(history_past, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _latest_hashes(entries: Dict[Tuple[int, str], str]) -> Dict[int, str]:
+    """ Most recently seen history block of each player """
+    latest = {}
+    for (player_id, digest), snapshot in sorted(entries.items(), key=lambda x: (x[1], x[0][1])):
+        latest[player_id] = digest
+    return latest
+
+
+def _read_cache(dir_cache: Path) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """ Scanned files, history blocks and their records """
+    if not (dir_cache / 'files.csv').exists():
+        return (
+            pd.DataFrame(columns=[FILE_NAME, FILE_SIZE, FILE_MTIME_NS]),
+            pd.DataFrame(columns=[fld.PLAYER_ID, HISTORY_HASH, SNAPSHOT]),
+            pd.DataFrame(columns=CACHE_RECORDS_COLUMNS)
+        )
+    return (
+        pd.read_csv(dir_cache / 'files.csv'),
+        storage.read_table(dir_cache / f'entries{storage.DEFAULT_SUFFIX}'),
+        storage.read_table(dir_cache / f'records{storage.DEFAULT_SUFFIX}')
+    )
+
+
+@instrument(inputs=[DIR_RAW_PLAYER_DETAILS], outputs=[FILE_INTER_HISTORICAL])
+def run(workers: int = 1, incremental: bool = False) -> pd.DataFrame:
+    """
+    Build the intermediate historical dataset
+    :param workers:     Number of processes reading the player-details snapshots
+    :param incremental: Only parse the new / changed histories (history cache) and update the players concerned
+    """
+    if incremental:
+        return update_historical_incremental(DIR_RAW_PLAYER_DETAILS, DIR_INTER_HISTORY_CACHE, FILE_INTER_HISTORICAL)
+    output_historical = build_bootstrap_dataset(DIR_RAW_PLAYER_DETAILS, workers)
+    storage.write_table(output_historical, FILE_INTER_HISTORICAL)
+    return output_historical
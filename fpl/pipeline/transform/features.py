@@ -1,34 +1,67 @@
+from typing import Optional
 import pandas as pd
-import constants.fields as fld
-from constants import FILE_INTER_HISTORICAL, FILE_INTER_BOOTSTRAP, FILE_PROC_FEATURES
-import pipeline.transform.preprocess_bootstrap
-import pipeline.transform.clean_historical
+import fpl.constants.fields as fld
+from fpl.constants.structure import (
+    FILE_INTER_HISTORICAL, FILE_INTER_BOOTSTRAP, FILE_INTER_FORM_STATE, FILE_INTER_FORM_WEEKS, DIR_PROC_FEATURES
+)
+from fpl.pipeline import storage
+from fpl.pipeline.transform import rolling
+from fpl.utils.metrics import instrument
+import fpl.pipeline.transform.preprocess_bootstrap
+import fpl.pipeline.transform.clean_historical
 
 
-def prepare_features(df_bootstrap: pd.DataFrame, df_historical: pd.DataFrame):
+def prepare_features(df_bootstrap: pd.DataFrame, df_historical: pd.DataFrame, df_form: Optional[pd.DataFrame] = None):
 
     # Merge Bootstrap (current season) + Historical
     df_combined = df_bootstrap.merge(df_historical, how='left', on=[fld.PLAYER_ID, fld.SEASON_ID])
 
-    # Create New Features - Other module
+    # Create New Features - Form of the current season (rolling module)
+    if df_form is not None:
+        df_combined = df_combined.merge(df_form, how='left', on=[fld.PLAYER_ID, fld.SEASON_ID, fld.GW])
 
     # Select Fields
 
     return df_combined
 
 
-def run(reload_data: bool):
+@instrument(inputs=[FILE_INTER_BOOTSTRAP, FILE_INTER_HISTORICAL], outputs=[DIR_PROC_FEATURES])
+def run(reload_data: bool, incremental: bool = False) -> pd.DataFrame:
     """ Merge datasets and create features
     
     Arguments:
         reload_data {bool} -- If True, process previous steps (extract_raw data)
+        incremental {bool} -- If True, only add the gameweeks after the last one processed
+                              (the form accumulators of the players are persisted between runs),
+                              the season of a gameweek changed since the last run is processed again
     """
     if reload_data:
-        pipeline.transform.preprocess_bootstrap.run()
-        pipeline.transform.clean_historical.run()
+        fpl.pipeline.transform.preprocess_bootstrap.run(incremental=incremental)
+        fpl.pipeline.transform.clean_historical.run(incremental=incremental)
 
-    df_bootstrap = pd.read_csv(FILE_INTER_BOOTSTRAP, encoding='utf-8-sig')
-    df_historical = pd.read_csv(FILE_INTER_HISTORICAL)
+    df_bootstrap = storage.read_table(FILE_INTER_BOOTSTRAP)
+    df_historical = storage.read_table(FILE_INTER_HISTORICAL)
 
-    df_combined = prepare_features(df_bootstrap, df_historical)
-    df_combined.to_csv(FILE_PROC_FEATURES, index=False, encoding='utf-8-sig')
+    df_signatures = rolling.week_signatures(df_bootstrap)
+    df_state = None
+    changed = []
+    if incremental:
+        changed = rolling.changed_weeks(df_signatures, rolling.read_signatures(FILE_INTER_FORM_WEEKS))
+        df_bootstrap, df_state = rolling.rewind(df_bootstrap, rolling.read_state(FILE_INTER_FORM_STATE), changed)
+    df_form, df_state = rolling.update_form(df_bootstrap, df_state)
+
+    df_combined = prepare_features(df_bootstrap, df_historical, df_form)
+    if changed:
+        # Only the gameweeks from the first change are rewritten (a rewound season is processed from its start)
+        season_id, gw = changed[0]
+        after = (df_combined[fld.SEASON_ID] > season_id) \
+            | ((df_combined[fld.SEASON_ID] == season_id) & (df_combined[fld.GW] >= gw))
+        df_combined = df_combined[after]
+        removed = set(changed) - set(zip(df_signatures[fld.SEASON_ID], df_signatures[fld.GW]))
+        for partition in removed:
+            storage.partition_path(DIR_PROC_FEATURES, *partition).unlink(missing_ok=True)
+    if not df_combined.empty:
+        storage.write_partitions(df_combined, DIR_PROC_FEATURES, overwrite=not incremental)
+    rolling.write_state(df_state, FILE_INTER_FORM_STATE)
+    rolling.write_signatures(df_signatures, FILE_INTER_FORM_WEEKS)
+    return df_combined
@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import fpl.constants.fields as fld
+
+
+@dataclass
+class FixtureHorizon(object):
+    """
+    Fixtures of a season as dense arrays (team x gameweek x game)
+    * teams:             team ids (season) of the rows, sorted
+    * gameweeks:         gameweeks of the columns, sorted
+    * game_nb:           number of games of the team in the gameweek (team x gameweek)
+    * opponent:          team id (season) of the opponent, 0 if no game (team x gameweek x game)
+    * is_home:           True if the team plays at home (team x gameweek x game)
+    * opponent_strength: strength of the opponent, nan if no game or unknown strength (team x gameweek x game)
+    Games of a team in a gameweek are ordered home games first, then away games (order of the fixtures)
+    """
+    teams: np.ndarray
+    gameweeks: np.ndarray
+    game_nb: np.ndarray
+    opponent: np.ndarray
+    is_home: np.ndarray
+    opponent_strength: np.ndarray
+
+    def lookup(self, team_id_season: int, gameweek: int) -> List[Dict[str, Any]]:
+        """ Games of a team for a gameweek: [{home, opponent, opponent strength}, ...] """
+        team_idx = np.searchsorted(self.teams, team_id_season)
+        gw_idx = np.searchsorted(self.gameweeks, gameweek)
+        if team_idx >= len(self.teams) or self.teams[team_idx] != team_id_season \
+                or gw_idx >= len(self.gameweeks) or self.gameweeks[gw_idx] != gameweek:
+            return []
+        return [
+            {
+                fld.GAME_1_HOME: bool(self.is_home[team_idx, gw_idx, game]),
+                fld.TEAM_ID_SEASON: int(self.opponent[team_idx, gw_idx, game]),
+                fld.TEAM_STRENGTH: self.opponent_strength[team_idx, gw_idx, game]
+            }
+            for game in range(self.game_nb[team_idx, gw_idx])
+        ]
+
+    def window(self, start_gw: int, horizon: int) -> 'FixtureHorizon':
+        """ Gameweeks start_gw to start_gw + horizon - 1 (gameweeks without fixtures are empty) """
+        gameweeks = np.arange(start_gw, start_gw + horizon)
+        if not len(self.gameweeks):
+            # No fixture with a gameweek (e.g. pre-season): no game in the window
+            return self.empty_window(gameweeks)
+        gw_idx = np.searchsorted(self.gameweeks, gameweeks).clip(max=len(self.gameweeks) - 1)
+        found = self.gameweeks[gw_idx] == gameweeks
+        game_nb = np.where(found[None, :], self.game_nb[:, gw_idx], 0)
+        mask = found[None, :, None]
+        return FixtureHorizon(
+            teams=self.teams,
+            gameweeks=gameweeks,
+            game_nb=game_nb,
+            opponent=np.where(mask, self.opponent[:, gw_idx], 0),
+            is_home=np.where(mask, self.is_home[:, gw_idx], False),
+            opponent_strength=np.where(mask, self.opponent_strength[:, gw_idx], np.nan)
+        )
+
+    def empty_window(self, gameweeks: np.ndarray) -> 'FixtureHorizon':
+        """ Window of the gameweeks without any game (same teams and number of games by gameweek) """
+        shape = (len(self.teams), len(gameweeks), self.opponent.shape[2])
+        return FixtureHorizon(
+            teams=self.teams,
+            gameweeks=gameweeks,
+            game_nb=np.zeros(shape[:2], dtype=np.int64),
+            opponent=np.zeros(shape, dtype=np.int64),
+            is_home=np.zeros(shape, dtype=bool),
+            opponent_strength=np.full(shape, np.nan)
+        )
+
+    def to_features(self, start_gw: Optional[int], horizon: int) -> pd.DataFrame:
+        """
+        Features of the next gameweeks for each team (k = 1 is start_gw):
+        number of games, number of home games, average strength of the opponents
+        and the totals over the horizon
+        """
+        if start_gw is None:
+            # End of the season: no game to play
+            window = self.empty_window(np.arange(horizon))
+        else:
+            window = self.window(start_gw, horizon)
+        played = window.opponent > 0
+        home_nb = (window.is_home & played).sum(axis=2)
+        strength_sum = np.where(played, window.opponent_strength, 0).sum(axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            strength_avg = np.where(window.game_nb > 0, strength_sum / window.game_nb, np.nan)
+            strength_horizon = strength_sum.sum(axis=1) / window.game_nb.sum(axis=1)
+
+        features = {fld.TEAM_ID_SEASON: window.teams}
+        for k in range(horizon):
+            features[fld.FIXTURE_K_GAME_NB.format(k + 1)] = window.game_nb[:, k]
+            features[fld.FIXTURE_K_HOME_NB.format(k + 1)] = home_nb[:, k]
+            features[fld.FIXTURE_K_OPPONENT_STRENGTH.format(k + 1)] = strength_avg[:, k]
+        features[fld.FIXTURE_HORIZON_GAME_NB] = window.game_nb.sum(axis=1)
+        features[fld.FIXTURE_HORIZON_OPPONENT_STRENGTH] = strength_horizon
+        return pd.DataFrame(features)
+
+
+def build_fixture_horizon(
+        fixture_json: List[Dict[str, Any]],
+        team_strength: Optional[Dict[int, float]] = None
+) -> FixtureHorizon:
+    """
+    Build the dense fixture arrays in one pass over the fixtures (fixtures without gameweek are ignored)
+    :param fixture_json:    Fixtures from the api
+    :param team_strength:   Strength of each team (team id season -> strength)
+    """
+    fixtures = [fixture for fixture in fixture_json if fixture['event'] is not None]
+    event = np.array([fixture['event'] for fixture in fixtures], dtype=np.int64)
+    team_h = np.array([fixture['team_h'] for fixture in fixtures], dtype=np.int64)
+    team_a = np.array([fixture['team_a'] for fixture in fixtures], dtype=np.int64)
+
+    # One entry by team and game: home entries first, then away entries (stable sort keeps that order)
+    entry_team = np.concatenate([team_h, team_a])
+    entry_opponent = np.concatenate([team_a, team_h])
+    entry_home = np.concatenate([np.ones(len(fixtures), dtype=bool), np.zeros(len(fixtures), dtype=bool)])
+    entry_gw = np.concatenate([event, event])
+
+    teams = np.unique(entry_team)
+    gameweeks = np.unique(entry_gw)
+    team_idx = np.searchsorted(teams, entry_team)
+    gw_idx = np.searchsorted(gameweeks, entry_gw)
+
+    # Position of each game within its (team, gameweek)
+    cell = team_idx * len(gameweeks) + gw_idx
+    order = np.argsort(cell, kind='stable')
+    cell_sorted = cell[order]
+    group_start = np.r_[0, np.flatnonzero(np.diff(cell_sorted)) + 1] if len(cell_sorted) else np.array([], int)
+    group_size = np.diff(np.r_[group_start, len(cell_sorted)])
+    slot_sorted = np.arange(len(cell_sorted)) - np.repeat(group_start, group_size)
+    slot = np.empty_like(slot_sorted)
+    slot[order] = slot_sorted
+
+    max_games = int(slot.max()) + 1 if len(slot) else 1
+    shape = (len(teams), len(gameweeks), max_games)
+    game_nb = np.bincount(cell, minlength=len(teams) * len(gameweeks)).reshape(shape[:2])
+    opponent = np.zeros(shape, dtype=np.int64)
+    opponent[team_idx, gw_idx, slot] = entry_opponent
+    is_home = np.zeros(shape, dtype=bool)
+    is_home[team_idx, gw_idx, slot] = entry_home
+
+    opponent_strength = np.full(shape, np.nan)
+    if team_strength:
+        strength_ids = np.array(sorted(team_strength), dtype=np.int64)
+        strength_values = np.array([team_strength[x] for x in strength_ids], dtype=float)
+        pos = np.searchsorted(strength_ids, entry_opponent).clip(max=len(strength_ids) - 1)
+        known = strength_ids[pos] == entry_opponent
+        opponent_strength[team_idx, gw_idx, slot] = np.where(known, strength_values[pos], np.nan)
+
+    return FixtureHorizon(teams, gameweeks, game_nb, opponent, is_home, opponent_strength)
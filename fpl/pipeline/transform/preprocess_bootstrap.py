@@ -1,11 +1,17 @@
+import hashlib
 import json
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal, Tuple
 import numpy as np
 import pandas as pd
 import fpl.constants.fields as fld
 import fpl.constants.structure as struc
+from fpl.pipeline import raw_store, storage
+from fpl.pipeline.transform import snapshot_index
+from fpl.pipeline.transform.fixture_horizon import build_fixture_horizon
+from fpl.utils.metrics import instrument
 
 logger = logging.getLogger(__name__)
 
@@ -17,11 +23,73 @@ TEAM_FIELDS = [
 ]
 
 
+# Sections of the bootstrap used by the preprocessing ('current-event' only exists in the old API)
+BOOTSTRAP_SECTIONS = ['elements', 'teams', 'element_types', 'events', 'current-event']
+
+# Types of the player fields (the api sends some numbers as strings, e.g. "12.3", the other fields are strings)
+PLAYER_DTYPES = {
+    fld.PLAYER_ID_SEASON: 'int64',
+    fld.TEAM_ID: 'int64',
+    fld.PLAYER_ID: 'int64',
+    fld.PLAYER_COST: 'int64',
+    fld.PLAYER_CHANCE_PLAY: 'float64',
+    fld.FPL_COST_CHANGE: 'int64',
+    fld.FPL_SELECTED_BY: 'float64',
+    fld.FPL_EXPECTED_POINTS: 'float64',
+    fld.FPL_INFLUENCE: 'float64',
+    fld.FPL_CREATIVITY: 'float64',
+    fld.FPL_THREAT: 'float64',
+    fld.FPL_ICT_INDEX: 'float64',
+    fld.FPL_TRANSFERS_OUT: 'int64',
+    fld.FPL_TRANSFERS_IN: 'int64',
+    fld.RESULT_POINTS_PREV: 'int64',
+    fld.STAT_MINUTES_TOTAL_SEASON: 'int64',
+    fld.POSITION_ID: 'int64',
+    fld.TEAM_ID_SEASON: 'int64'
+}
+
+# Types of the team fields
+TEAM_DTYPES = {
+    fld.TEAM_ID: 'int64',
+    fld.TEAM_ID_SEASON: 'int64',
+    fld.TEAM_STRENGTH: 'int64'
+}
+
+
+def load_bootstrap(bootstrap_path: Path) -> Dict[str, Any]:
+    """
+    Read a bootstrap snapshot, keeping only the sections used by the preprocessing
+    (the rest of the document is released as soon as it is decoded)
+    """
+    bootstrap_json = raw_store.load_json(bootstrap_path)
+    return {section: bootstrap_json[section] for section in BOOTSTRAP_SECTIONS if section in bootstrap_json}
+
+
+def project_records(
+        records: List[Dict[str, Any]],
+        mapping: Dict[str, str],
+        dtypes: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    DataFrame of the mapped fields of json records, built column by column (the other keys are never copied)
+    :param records: Records from the api
+    :param mapping: Api key -> field
+    :param dtypes:  Field -> type (inferred if missing)
+    """
+    keys = set().union(*records) if records else set()
+    if not set(mapping.keys()).issubset(keys):
+        raise KeyError(f'{set(mapping.keys()) - keys}')
+    dtypes = dtypes or {}
+    return pd.DataFrame({
+        field: pd.Series([record.get(key) for record in records], dtype=dtypes.get(field))
+        for key, field in mapping.items()
+    })
+
+
 def get_player_info(bootstrap_json: Dict[str, Any]) -> pd.DataFrame:
     """
     Take the json extracted from the api and returns a DataFrame with player info
     """
-    df_player = pd.DataFrame(bootstrap_json['elements'])
     mapping = {
         'id': fld.PLAYER_ID_SEASON,
         'web_name': fld.PLAYER_NAME,
@@ -44,29 +112,18 @@ def get_player_info(bootstrap_json: Dict[str, Any]) -> pd.DataFrame:
         'element_type': fld.POSITION_ID,
         'team': fld.TEAM_ID_SEASON
     }
-    if not set(mapping.keys()).issubset(set(df_player.columns)):
-        raise KeyError(f'{set(mapping.keys()) - set(df_player.columns)}')
-
-    keep_fields = list(mapping.values())
-    df_player.rename(columns=mapping, inplace=True)
-    return df_player[keep_fields]
+    return project_records(bootstrap_json['elements'], mapping, PLAYER_DTYPES)
 
 
 def get_position_info(bootstrap_json: Dict[str, Any]) -> pd.DataFrame:
     """
     Take the json extracted from the api and returns a DataFrame with position info
     """
-    df_position = pd.DataFrame(bootstrap_json['element_types'])
     mapping = {
         'id': fld.POSITION_ID,
         'singular_name_short': fld.PLAYER_POSITION,
     }
-    if not set(mapping.keys()).issubset(set(df_position.columns)):
-        raise KeyError(f'{set(mapping.keys()) - set(df_position.columns)}')
-
-    keep_fields = list(mapping.values())
-    df_position.rename(columns=mapping, inplace=True)
-    return df_position[keep_fields]
+    return project_records(bootstrap_json['element_types'], mapping, {fld.POSITION_ID: 'int64'})
 
 
 def get_team_info_v1(bootstrap_json: Dict[str, Any]) -> pd.DataFrame:
@@ -75,19 +132,15 @@ def get_team_info_v1(bootstrap_json: Dict[str, Any]) -> pd.DataFrame:
     Valid for API until 2020
     """
 
-    df_team = pd.DataFrame(bootstrap_json['teams'])
-
     # Rename Fields
     mapping = {
         'id': fld.TEAM_ID_SEASON,
         'name': fld.TEAM_NAME,
         'code': fld.TEAM_ID,
-        'strength': fld.TEAM_STRENGTH
+        'strength': fld.TEAM_STRENGTH,
+        'next_event_fixture': 'next_event_fixture'
     }
-    if not set(mapping.keys()).issubset(set(df_team.columns)):
-        raise KeyError(f'{set(mapping.keys()) - set(df_team.columns)}')
-
-    df_team.rename(columns=mapping, inplace=True)
+    df_team = project_records(bootstrap_json['teams'], mapping, TEAM_DTYPES)
 
     # Extract Data Games
     df_strengths = df_team[[fld.TEAM_ID_SEASON, fld.TEAM_NAME, fld.TEAM_STRENGTH]]
@@ -124,24 +177,20 @@ def get_team_info_v1(bootstrap_json: Dict[str, Any]) -> pd.DataFrame:
     return df_team[TEAM_FIELDS]
 
 
-def get_team_info_v2(bootstrap_json: Dict[str, Any], fixture_json: Dict[str, Any]) -> pd.DataFrame:
+def get_team_info_v2(bootstrap_json: Dict[str, Any], fixture_json: Dict[str, Any], horizon: int = 0) -> pd.DataFrame:
     """
     Take the json extracted from the api and returns a DataFrame with team info
     Valid for API after 2020
+    :param horizon: Number of gameweeks of fixture features (next gameweek onwards), none if 0
     """
     # Get Team Data
-    df_team = pd.DataFrame(bootstrap_json['teams'])
     mapping = {
-        'id': fld.TEAM_ID_SEASON,
         'name': fld.TEAM_NAME,
         'code': fld.TEAM_ID,
+        'id': fld.TEAM_ID_SEASON,
         'strength': fld.TEAM_STRENGTH
     }
-    if not set(mapping.keys()).issubset(set(df_team.columns)):
-        raise KeyError(f'{set(mapping.keys()) - set(df_team.columns)}')
-    df_team.rename(columns=mapping, inplace=True)
-    keep_fields = [fld.TEAM_NAME, fld.TEAM_ID, fld.TEAM_ID_SEASON, fld.TEAM_STRENGTH]
-    df_team = df_team[keep_fields]
+    df_team = project_records(bootstrap_json['teams'], mapping, TEAM_DTYPES)
     # Get next gameweek fixtures
     season_name = extract_season_name(bootstrap_json)
     prev_gw = extract_prev_gameweek(bootstrap_json)
@@ -179,59 +228,81 @@ def get_team_info_v2(bootstrap_json: Dict[str, Any], fixture_json: Dict[str, Any
             suffixes=['', '_2']
         )
 
-    return df_format_gw2[TEAM_FIELDS]
+    df_team_info = df_format_gw2[TEAM_FIELDS]
+    if horizon > 0:
+        df_horizon = get_fixture_horizon_info(fixture_json, df_team, get_next_game(prev_gw, season_name), horizon)
+        df_team_info = df_team_info.merge(
+            df_team[[fld.TEAM_ID, fld.TEAM_ID_SEASON]].merge(df_horizon, on=fld.TEAM_ID_SEASON),
+            on=fld.TEAM_ID
+        ).drop(columns=fld.TEAM_ID_SEASON)
+    return df_team_info
 
 
-def get_fixtures_info(fixture_json: Dict[str, Any], gameweek: int) -> pd.DataFrame:
+def get_fixtures_info(fixture_json: List[Dict[str, Any]], gameweek: int) -> pd.DataFrame:
     """
     Extra the fixtures information
     Required to identify the next game
+    Teams playing in the gameweek (ascending team id), home games first
     """
-    fixtures_data = []
-    df = pd.DataFrame(fixture_json)
-    df_gw = df[df['event'] == gameweek]
-    teams_playing = set(df_gw['team_h']).union(set(df_gw['team_a']))
-    for team in teams_playing:
-        team_data = []
-        for home_against in df_gw[(df_gw['team_h'] == team)]['team_a'].to_list():
-            team_data.append((True, home_against))
-        for away_against in df_gw[(df_gw['team_a'] == team)]['team_h'].to_list():
-            team_data.append((False, away_against))
-        game_nb = len(team_data)
-        aggregated = {
-            fld.TEAM_ID_SEASON: team,
-            fld.GAME_NB: game_nb,
-            fld.GAME_1_HOME: team_data[0][0],
-            fld.GAME_1_TEAM_ID_SEASON: team_data[0][1]
-        }
-        if game_nb == 2:
-            aggregated.update({
-                fld.GAME_2_HOME: team_data[1][0],
-                fld.GAME_2_TEAM_ID_SEASON: team_data[1][1]
-            })
-        else:
-            aggregated.update({
-                fld.GAME_2_HOME: np.nan,
-                fld.GAME_2_TEAM_ID_SEASON: np.nan
-            })
-        fixtures_data.append(aggregated)
-    return pd.DataFrame(fixtures_data)
+    horizon = build_fixture_horizon(fixture_json).window(gameweek, 1)
+    game_nb = horizon.game_nb[:, 0]
+    playing = game_nb > 0
+    opponent = horizon.opponent[playing, 0]
+    is_home = horizon.is_home[playing, 0]
+    if opponent.shape[1] < 2:
+        opponent = np.c_[opponent, np.zeros(len(opponent), dtype=opponent.dtype)]
+        is_home = np.c_[is_home, np.zeros(len(is_home), dtype=bool)]
+    has_game_2 = game_nb[playing] >= 2
+    return pd.DataFrame({
+        fld.TEAM_ID_SEASON: horizon.teams[playing],
+        fld.GAME_NB: game_nb[playing],
+        fld.GAME_1_HOME: is_home[:, 0],
+        fld.GAME_1_TEAM_ID_SEASON: opponent[:, 0],
+        fld.GAME_2_HOME: pd.Series(is_home[:, 1], dtype=object).where(has_game_2, np.nan),
+        fld.GAME_2_TEAM_ID_SEASON: np.where(has_game_2, opponent[:, 1], np.nan)
+    })
+
+
+def get_fixture_horizon_info(
+        fixture_json: List[Dict[str, Any]],
+        df_team: pd.DataFrame,
+        gameweek: Optional[int],
+        horizon: int
+) -> pd.DataFrame:
+    """
+    Fixtures of the next gameweeks for each team (see fixture_horizon.FixtureHorizon.to_features)
+    :param fixture_json:    Fixtures from the api
+    :param df_team:         Teams of the season (team id season, team strength)
+    :param gameweek:        First gameweek of the horizon (None at the end of the season)
+    :param horizon:         Number of gameweeks
+    """
+    team_strength = dict(zip(df_team[fld.TEAM_ID_SEASON], df_team[fld.TEAM_STRENGTH]))
+    df_horizon = build_fixture_horizon(fixture_json, team_strength).to_features(gameweek, horizon)
+    # Teams without any game in the season file still get features: no game, unknown opponent strength
+    df_horizon = df_team[[fld.TEAM_ID_SEASON]].merge(df_horizon, on=fld.TEAM_ID_SEASON, how='left')
+    counts = [fld.FIXTURE_HORIZON_GAME_NB] + [
+        field.format(k + 1) for k in range(horizon) for field in [fld.FIXTURE_K_GAME_NB, fld.FIXTURE_K_HOME_NB]
+    ]
+    df_horizon[counts] = df_horizon[counts].fillna(0).astype('int64')
+    return df_horizon
 
 
 def get_week_info(
         bootstrap_json: Dict[str, Any],
         api_version: Literal[1, 2],
-        fixtures_json: Optional[Dict[str, Any]] = None
+        fixtures_json: Optional[Dict[str, Any]] = None,
+        horizon: int = 0
 ) -> pd.DataFrame:
     """
     Read the file, extract info from json, denormalize into a dataframe
+    :param horizon: Number of gameweeks of fixture features (new API only, the old snapshots have no fixtures)
     """
     # Merge Info Player / Team / Position
     df_player = get_player_info(bootstrap_json)
     if api_version == 1:
         df_team = get_team_info_v1(bootstrap_json)
     else:
-        df_team = get_team_info_v2(bootstrap_json, fixtures_json)
+        df_team = get_team_info_v2(bootstrap_json, fixtures_json, horizon)
     df_position = get_position_info(bootstrap_json)
 
     logging.debug(df_player.transpose().head())
@@ -250,62 +321,108 @@ def get_week_info(
     return df_week
 
 
-def preprocess_dataset(dir_bootstrap: Path, dir_fixtures: Optional[Path]) -> pd.DataFrame:
-    """ Scan through all files in the raw data folder and turn it into a CSV"""
+def select_snapshots(
+        dir_bootstrap: Path,
+        dir_fixtures: Optional[Path],
+        index_path: Optional[Path] = None
+) -> Tuple[Dict[str, Path], Dict[str, Path]]:
+    """
+    Select the files to preprocess through the snapshot index (only new or changed files are opened)
+    * bootstrap: the last file of each season / gameweek (key: <season name>_<previous gameweek>)
+    * fixtures: the file associated with the last gameweek of each season (key: season name)
+    """
     # Scan Fixtures
     last_fix_season_file = {}
     logger.info(f'Screen folder {dir_fixtures}')
-    for file_path in dir_fixtures.glob('*.json'):
-        if file_path.is_file():
-            with file_path.open(encoding='utf-8') as f_in:
-                fixture_json = json.load(f_in)
-                prev_gw = extract_fixture_prev_gameweek(fixture_json)
-                season_name = extract_fixture_season(fixture_json)
-                # Add the fixture path associated with the last gameweek for each season
-                if season_name in last_fix_season_file:
-                    if prev_gw > last_fix_season_file[season_name][1]:
-                        last_fix_season_file[season_name] = (file_path, prev_gw)
-                else:
-                    last_fix_season_file[season_name] = (file_path, prev_gw)
+    fixture_entries = snapshot_index.update_index(dir_fixtures, 'fixtures', _fixture_metadata, index_path)
+    for entry in fixture_entries:
+        file_path = Path(entry[snapshot_index.PATH])
+        prev_gw = entry[snapshot_index.GAMEWEEK]
+        season_name = entry[snapshot_index.SEASON_NAME]
+        # Add the fixture path associated with the last gameweek for each season
+        if season_name in last_fix_season_file:
+            if prev_gw is not None and (last_fix_season_file[season_name][1] is None
+                                        or prev_gw > last_fix_season_file[season_name][1]):
+                last_fix_season_file[season_name] = (file_path, prev_gw)
+        else:
+            last_fix_season_file[season_name] = (file_path, prev_gw)
     fixture_paths = {k: v[0] for k, v in last_fix_season_file.items()}
     logger.info(fixture_paths)
 
     # Scan Bootstraps
     last_bootstrap_gw_file = {}
     logger.info(f'Screen folder {dir_bootstrap}')
-    for file_path in sorted(dir_bootstrap.glob('*.json')):
-        if file_path.is_file():
-            logger.debug(f'Screen file {file_path.name}')
-            with file_path.open(encoding='utf-8') as f_in:
-                bootstrap_json = json.load(f_in)
-                season_gw = extract_season_name(bootstrap_json) + '_' + str(extract_prev_gameweek(bootstrap_json))
-                last_bootstrap_gw_file[season_gw] = file_path
-                logger.debug(f'Season gameweek: {season_gw}')
-
-    # Extract data
-    list_df = []
-    for bootstrap_path in last_bootstrap_gw_file.values():
-        logger.info(f'Preprocessing file {bootstrap_path.name}')
-        with bootstrap_path.open(encoding='utf-8') as f_in:
-            bootstrap_json = json.load(f_in)
-            # Extract data (old API)
-            if 'current-event' in bootstrap_json:
-                df_week = get_week_info(bootstrap_json, api_version=1)
-            # Extract data (new API)
-            else:
-                season = extract_season_name(bootstrap_json)
-                season_fixture_path = fixture_paths[season]
-                with season_fixture_path.open(encoding='utf-8') as fix_in:
-                    fixture_json = json.load(fix_in)
-                df_week = get_week_info(bootstrap_json, api_version=2, fixtures_json=fixture_json)
-            # Append data
-            list_df.append(df_week)
+    bootstrap_entries = snapshot_index.update_index(dir_bootstrap, 'bootstrap', _bootstrap_metadata, index_path)
+    for entry in bootstrap_entries:
+        season_gw = entry[snapshot_index.SEASON_NAME] + '_' + str(entry[snapshot_index.GAMEWEEK])
+        last_bootstrap_gw_file[season_gw] = Path(entry[snapshot_index.PATH])
+        logger.debug(f'Season gameweek: {season_gw}')
+
+    return last_bootstrap_gw_file, fixture_paths
+
+
+def extract_weeks(
+        bootstrap_paths: List[Path],
+        fixture_paths: Dict[str, Path],
+        workers: int = 1,
+        horizon: int = 0
+) -> List[pd.DataFrame]:
+    """ Weekly frames of the bootstrap snapshots (in the order of the paths) """
+    if workers > 1 and len(bootstrap_paths) > 1:
+        nb_paths = len(bootstrap_paths)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(extract_week, bootstrap_paths, [fixture_paths] * nb_paths, [horizon] * nb_paths))
+    return [extract_week(bootstrap_path, fixture_paths, horizon) for bootstrap_path in bootstrap_paths]
+
+
+def extract_week(bootstrap_path: Path, fixture_paths: Dict[str, Path], horizon: int = 0) -> pd.DataFrame:
+    """ Weekly frame of a bootstrap snapshot (the fixtures of its season are used for the new API) """
+    logger.info(f'Preprocessing file {bootstrap_path.name}')
+    bootstrap_json = load_bootstrap(bootstrap_path)
+    # Extract data (old API)
+    if 'current-event' in bootstrap_json:
+        df_week = get_week_info(bootstrap_json, api_version=1)
+    # Extract data (new API)
+    else:
+        season = extract_season_name(bootstrap_json)
+        season_fixture_path = fixture_paths[season]
+        fixture_json = raw_store.load_json(season_fixture_path)
+        df_week = get_week_info(bootstrap_json, api_version=2, fixtures_json=fixture_json, horizon=horizon)
+    return df_week
+
+
+def preprocess_dataset(
+        dir_bootstrap: Path,
+        dir_fixtures: Optional[Path],
+        index_path: Optional[Path] = None,
+        workers: int = 1,
+        horizon: int = 0
+) -> pd.DataFrame:
+    """
+    Scan through all files in the raw data folder and turn it into a CSV
+    The snapshots are independent, with workers > 1 they are transformed by a pool of processes
+    (the weekly frames are combined in the same order as the serial run)
+    :param horizon: Number of gameweeks of fixture features (fixture_<k>_... columns), none if 0
+    """
+    bootstrap_paths, fixture_paths = select_snapshots(dir_bootstrap, dir_fixtures, index_path)
+    list_df = extract_weeks(list(bootstrap_paths.values()), fixture_paths, workers, horizon)
 
     df_bootstrap = pd.concat(list_df)
     df_bootstrap.drop_duplicates(inplace=True)
 
+    df_merged = add_results(df_bootstrap)
+    return clean_dataset(df_merged)
+
+
+def add_results(df_bootstrap: pd.DataFrame, df_source: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Append the result of the gameweek, i.e. the points of the previous gameweek in the following snapshot
+    :param df_bootstrap:    Weekly rows
+    :param df_source:       Rows where the results are read from (default: df_bootstrap)
+    """
+    df_source = df_bootstrap if df_source is None else df_source
     # Append the result  (requires to merge on the previous gamweek)
-    df_result = df_bootstrap.copy()[[fld.SEASON_ID, fld.GW_PREV, fld.PLAYER_ID, fld.RESULT_POINTS_PREV]]
+    df_result = df_source.copy()[[fld.SEASON_ID, fld.GW_PREV, fld.PLAYER_ID, fld.RESULT_POINTS_PREV]]
     df_result.rename(columns={fld.RESULT_POINTS_PREV: fld.RESULT_POINTS, fld.GW_PREV: fld.GW},
                      inplace=True)
 
@@ -313,7 +430,10 @@ def preprocess_dataset(dir_bootstrap: Path, dir_fixtures: Optional[Path]) -> pd.
                                    how='left',
                                    on=[fld.SEASON_ID, fld.GW, fld.PLAYER_ID]
                                    )
+    return df_merged
 
+
+def clean_dataset(df_merged: pd.DataFrame) -> pd.DataFrame:
     # Clean
     # Remove empty gameweeks (end of season)
     df_c = df_merged.dropna(subset=[fld.GW])
@@ -327,6 +447,138 @@ def preprocess_dataset(dir_bootstrap: Path, dir_fixtures: Optional[Path]) -> pd.
     return df_c
 
 
+# Incremental mode: state of the weekly frames already extracted
+WEEK_KEY = 'key'
+WEEK_SIGNATURE = 'signature'
+WEEK_STATE_FIELDS = [WEEK_KEY, WEEK_SIGNATURE, fld.SEASON_ID, fld.GW_PREV, fld.GW]
+
+
+def update_dataset_incremental(
+        dir_bootstrap: Path,
+        dir_fixtures: Optional[Path],
+        index_path: Path,
+        dir_weeks: Path,
+        dir_partitions: Path,
+        workers: int = 1,
+        horizon: int = 0
+) -> List[Tuple[int, int]]:
+    """
+    Update the dataset partitioned by season / gameweek, only processing new or changed snapshots
+    * the weekly frame of each selected snapshot is kept in dir_weeks, with the hash of its sources
+      (the bootstrap file and the fixtures of the gameweeks it uses)
+    * only the partitions using a new / changed / removed weekly frame are recomputed,
+      i.e. its own gameweek and the previous one (its points are the result of the previous gameweek)
+    :return: Partitions (season id, gameweek) recomputed
+    """
+    bootstrap_paths, fixture_paths = select_snapshots(dir_bootstrap, dir_fixtures, index_path)
+    df_index = snapshot_index.read_index(index_path)
+    hashes = dict(zip(df_index[snapshot_index.PATH], df_index[snapshot_index.SHA256]))
+    prev_gameweeks = dict(zip(df_index[snapshot_index.PATH], df_index[snapshot_index.GAMEWEEK]))
+    fixtures_json = {}
+    signatures = {}
+    for key, bootstrap_path in bootstrap_paths.items():
+        season_name = key.rsplit('_', 1)[0]
+        signatures[key] = hashes[str(bootstrap_path)]
+        fixture_path = fixture_paths.get(season_name)
+        if fixture_path:
+            # Only the fixtures of the gameweeks used by the snapshot: a new fixtures file changes a few weeks
+            if season_name not in fixtures_json:
+                fixtures_json[season_name] = raw_store.load_json(fixture_path)
+            prev_gw = prev_gameweeks[str(bootstrap_path)]
+            prev_gw = None if pd.isna(prev_gw) else int(prev_gw)
+            signatures[key] += '_' + fixture_window_signature(fixtures_json[season_name], season_name, prev_gw, horizon)
+        if horizon > 0:
+            # The horizon changes the columns of the weekly frames
+            signatures[key] += f'_h{horizon}'
+
+    dir_weeks.mkdir(parents=True, exist_ok=True)
+    state_path = dir_weeks / 'state.csv'
+    state = {}
+    if state_path.exists():
+        df_state = pd.read_csv(state_path, dtype={fld.GW_PREV: 'Int64', fld.GW: 'Int64'})
+        state = {record[WEEK_KEY]: record for record in df_state.to_dict('records')}
+
+    affected = set()
+    for key in [key for key in state if key not in bootstrap_paths]:
+        affected.update(_week_partitions(state.pop(key)))
+        _week_path(dir_weeks, key).unlink(missing_ok=True)
+    changed = [key for key in bootstrap_paths if key not in state or state[key][WEEK_SIGNATURE] != signatures[key]]
+    logger.info(f'{len(changed)} new or changed snapshots out of {len(bootstrap_paths)}')
+    list_df = extract_weeks([bootstrap_paths[key] for key in changed], fixture_paths, workers, horizon)
+    for key, df_week in zip(changed, list_df):
+        if key in state:
+            affected.update(_week_partitions(state[key]))
+        storage.write_table(df_week, _week_path(dir_weeks, key))
+        state[key] = {
+            WEEK_KEY: key,
+            WEEK_SIGNATURE: signatures[key],
+            fld.SEASON_ID: df_week[fld.SEASON_ID].iloc[0],
+            fld.GW_PREV: df_week[fld.GW_PREV].iloc[0],
+            fld.GW: df_week[fld.GW].iloc[0]
+        }
+        affected.update(_week_partitions(state[key]))
+    pd.DataFrame(list(state.values()), columns=WEEK_STATE_FIELDS).to_csv(state_path, index=False)
+
+    for season_id, gw in sorted(affected):
+        _rebuild_partition(season_id, gw, state, dir_weeks, dir_partitions)
+    return sorted(affected)
+
+
+def fixture_window_signature(
+        fixture_json: List[Dict[str, Any]], season_name: str, prev_gw: Optional[int], horizon: int = 0
+) -> str:
+    """
+    Hash of the fixtures used by the weekly frame of a snapshot: the games (gameweek, home team, away team)
+    of its next gameweek and of its horizon, in the order of the file
+    """
+    next_gw = get_next_game(prev_gw, season_name)
+    current_gw = next_gw if next_gw is not None else prev_gw
+    gameweeks = {current_gw}
+    if horizon > 0 and next_gw is not None:
+        gameweeks.update(range(next_gw, next_gw + horizon))
+    games = [
+        [fixture['event'], fixture['team_h'], fixture['team_a']]
+        for fixture in fixture_json if fixture['event'] is not None and fixture['event'] in gameweeks
+    ]
+    return hashlib.sha256(json.dumps(games).encode('utf-8')).hexdigest()
+
+
+def _week_path(dir_weeks: Path, key: str) -> Path:
+    return dir_weeks / (key.replace('/', '-') + storage.DEFAULT_SUFFIX)
+
+
+def _week_partitions(record: Dict[str, Any]) -> List[Tuple[int, int]]:
+    """ Partitions using a weekly frame: its gameweek (rows) and its previous gameweek (results) """
+    return [
+        (int(record[fld.SEASON_ID]), int(record[field]))
+        for field in [fld.GW, fld.GW_PREV] if not pd.isna(record[field])
+    ]
+
+
+def _rebuild_partition(
+        season_id: int, gw: int, state: Dict[str, Dict[str, Any]], dir_weeks: Path, dir_partitions: Path
+):
+    def read_weeks(field):
+        return [
+            storage.read_table(_week_path(dir_weeks, key)) for key, record in state.items()
+            if record[fld.SEASON_ID] == season_id and not pd.isna(record[field]) and record[field] == gw
+        ]
+
+    partition_path = storage.partition_path(dir_partitions, season_id, gw)
+    list_df = read_weeks(fld.GW)
+    df_c = None
+    if list_df:
+        df_bootstrap = pd.concat(list_df).drop_duplicates()
+        list_df_result = read_weeks(fld.GW_PREV)
+        df_source = pd.concat(list_df_result) if list_df_result else df_bootstrap.iloc[0:0]
+        df_c = clean_dataset(add_results(df_bootstrap, df_source))
+    if df_c is None or df_c.empty:
+        partition_path.unlink(missing_ok=True)
+        return
+    logger.debug(f'Rebuild partition season {season_id} - gameweek {gw}')
+    storage.write_table(df_c, partition_path)
+
+
 def extract_season_name(bootstrap_json: Dict[str, Any]) -> str:
     events = bootstrap_json['events']
     year_start = events[0]['deadline_time'][:4]
@@ -343,21 +595,37 @@ def extract_prev_gameweek(bootstrap_json: Dict[str, Any]) -> Optional[int]:
     return None
 
 
-def extract_fixture_prev_gameweek(fixture_json: Dict[str, Any]) -> Optional[int]:
-    df = pd.DataFrame(fixture_json)
-    last_game_played = df[df['started'].astype('bool')].groupby('event').size().index.max()
-    return last_game_played
+def extract_fixture_prev_gameweek(fixture_json: List[Dict[str, Any]]) -> Optional[int]:
+    started_events = [
+        fixture['event'] for fixture in fixture_json if fixture['started'] and fixture['event'] is not None
+    ]
+    return max(started_events) if started_events else None
 
 
-def extract_fixture_season(fixture_json: Dict[str, Any]) -> str:
-    df = pd.DataFrame(fixture_json)
-    df_dates = df['kickoff_time'].dropna()
-    year_start = df_dates.str.slice(stop=4).min()
-    year_end = df_dates.str.slice(stop=4).max()
+def extract_fixture_season(fixture_json: List[Dict[str, Any]]) -> str:
+    years = [fixture['kickoff_time'][:4] for fixture in fixture_json if fixture['kickoff_time']]
+    year_start = min(years)
+    year_end = max(years)
     season_name = f'{year_start}/{year_end[2:]}'
     return season_name
 
 
+def _bootstrap_metadata(bootstrap_json: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        snapshot_index.SEASON_NAME: extract_season_name(bootstrap_json),
+        snapshot_index.GAMEWEEK: extract_prev_gameweek(bootstrap_json),
+        snapshot_index.API_VERSION: 1 if 'current-event' in bootstrap_json else 2
+    }
+
+
+def _fixture_metadata(fixture_json: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        snapshot_index.SEASON_NAME: extract_fixture_season(fixture_json),
+        snapshot_index.GAMEWEEK: extract_fixture_prev_gameweek(fixture_json),
+        snapshot_index.API_VERSION: None
+    }
+
+
 def get_next_game(gw: int, season_name: str) -> Optional[int]:
     # covid year
     if season_name == '2019/20':
@@ -382,9 +650,27 @@ def get_next_game(gw: int, season_name: str) -> Optional[int]:
     return next_gw
 
 
-def run():
-    df_bootstrap = preprocess_dataset(struc.DIR_RAW_BOOTSTRAP, struc.DIR_RAW_FIXTURES)
-    df_bootstrap.to_csv(struc.FILE_INTER_BOOTSTRAP, index=False, encoding='utf-8')
+@instrument(inputs=[struc.DIR_RAW_BOOTSTRAP, struc.DIR_RAW_FIXTURES], outputs=[struc.FILE_INTER_BOOTSTRAP])
+def run(workers: int = 1, incremental: bool = False, horizon: int = 0) -> pd.DataFrame:
+    """
+    Build the intermediate bootstrap dataset
+    :param workers:      Number of processes transforming the snapshots
+    :param incremental:  Only process the new / changed snapshots (dataset kept partitioned by season / gameweek)
+    :param horizon:      Number of gameweeks of fixture features, none if 0
+    """
+    if incremental:
+        update_dataset_incremental(
+            struc.DIR_RAW_BOOTSTRAP, struc.DIR_RAW_FIXTURES, struc.FILE_INTER_SNAPSHOT_INDEX,
+            struc.DIR_INTER_BOOTSTRAP_WEEKS, struc.DIR_INTER_BOOTSTRAP_PARTITIONS, workers=workers, horizon=horizon
+        )
+        df_bootstrap = storage.read_partitions(struc.DIR_INTER_BOOTSTRAP_PARTITIONS)
+    else:
+        df_bootstrap = preprocess_dataset(
+            struc.DIR_RAW_BOOTSTRAP, struc.DIR_RAW_FIXTURES, struc.FILE_INTER_SNAPSHOT_INDEX,
+            workers=workers, horizon=horizon
+        )
+    storage.write_table(df_bootstrap, struc.FILE_INTER_BOOTSTRAP)
+    return df_bootstrap
 
 
 if __name__ == '__main__':
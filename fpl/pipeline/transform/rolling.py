@@ -0,0 +1,225 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import fpl.constants.fields as fld
+from fpl.pipeline import storage
+
+logger = logging.getLogger(__name__)
+
+# Rolling form of the players during a season, known before the gameweek is played:
+# the observation of a row is the result of the previous gameweek (points, minutes played since the previous row)
+FORM_WINDOW = 5      # number of gameweeks of the rolling average
+FORM_ALPHA = 0.3     # weight of the last gameweek in the exponentially weighted averages
+
+# Accumulators of a player (one row per player, reset at the start of each season)
+STATE_COUNT = 'count'
+STATE_LAST = 'last_points_{}'       # last points, 1 is the most recent
+STATE_POINTS_EWMA = 'points_ewma'
+STATE_MINUTES_EWMA = 'minutes_ewma'
+STATE_POINTS_TOTAL = 'points_total'
+STATE_MINUTES_TOTAL = 'minutes_total'     # minutes of the season at the last row
+STATE_MINUTES_PLAYED = 'minutes_played'   # minutes observed since the first row of the season
+
+# Signature of the rows of each gameweek processed: a gameweek recomputed upstream rewinds the state
+WEEK_HASH = 'week_hash'
+
+FORM_FIELDS = [
+    fld.FORM_GAMEWEEKS_NB, fld.FORM_POINTS_AVG_LAST_N, fld.FORM_POINTS_EWMA, fld.FORM_MINUTES_EWMA,
+    fld.FORM_POINTS_PER_90
+]
+
+
+def empty_state(window: int = FORM_WINDOW) -> pd.DataFrame:
+    columns = [fld.PLAYER_ID, fld.SEASON_ID, fld.GW, STATE_COUNT] \
+        + [STATE_LAST.format(k) for k in range(1, window + 1)] \
+        + [STATE_POINTS_EWMA, STATE_MINUTES_EWMA, STATE_POINTS_TOTAL, STATE_MINUTES_TOTAL, STATE_MINUTES_PLAYED]
+    return pd.DataFrame(columns=columns).astype({fld.PLAYER_ID: 'int64', fld.SEASON_ID: 'int64', fld.GW: 'int64'})
+
+
+def read_state(state_path: Path, window: int = FORM_WINDOW) -> pd.DataFrame:
+    if not state_path.exists():
+        return empty_state(window)
+    return storage.read_table(state_path)
+
+
+def write_state(df_state: pd.DataFrame, state_path: Path):
+    storage.write_table(df_state, state_path)
+
+
+def last_week(df_state: pd.DataFrame) -> Optional[Tuple[int, int]]:
+    """ Last (season id, gameweek) added to the state, None if the state is empty """
+    if df_state.empty:
+        return None
+    last = df_state.sort_values([fld.SEASON_ID, fld.GW]).iloc[-1]
+    return int(last[fld.SEASON_ID]), int(last[fld.GW])
+
+
+def week_signatures(df_bootstrap: pd.DataFrame) -> pd.DataFrame:
+    """ Hash of the rows of each gameweek (season id, gameweek, hash), whatever the order of the rows / columns """
+    if df_bootstrap.empty:
+        return pd.DataFrame({fld.SEASON_ID: pd.Series(dtype='int64'), fld.GW: pd.Series(dtype='int64'), WEEK_HASH: []})
+    df_sorted = df_bootstrap[sorted(df_bootstrap.columns)].sort_values([fld.SEASON_ID, fld.GW, fld.PLAYER_ID])
+    row_hashes = pd.util.hash_pandas_object(df_sorted, index=False).to_numpy()
+    keys = df_sorted[[fld.SEASON_ID, fld.GW]].to_numpy(dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+    ends = np.r_[starts[1:], len(keys)]
+    return pd.DataFrame({
+        fld.SEASON_ID: keys[starts, 0],
+        fld.GW: keys[starts, 1],
+        WEEK_HASH: [hashlib.sha256(row_hashes[start:end].tobytes()).hexdigest() for start, end in zip(starts, ends)]
+    })
+
+
+def read_signatures(signatures_path: Path) -> pd.DataFrame:
+    if not signatures_path.exists():
+        return week_signatures(pd.DataFrame())
+    return storage.read_table(signatures_path)
+
+
+def write_signatures(df_signatures: pd.DataFrame, signatures_path: Path):
+    storage.write_table(df_signatures, signatures_path)
+
+
+def changed_weeks(df_signatures: pd.DataFrame, df_previous: pd.DataFrame) -> List[Tuple[int, int]]:
+    """ Gameweeks (season id, gameweek) new, changed or removed since the previous signatures, sorted """
+    df_merged = df_signatures.merge(
+        df_previous, how='outer', on=[fld.SEASON_ID, fld.GW], suffixes=('', '_previous')
+    )
+    df_changed = df_merged[df_merged[WEEK_HASH] != df_merged[WEEK_HASH + '_previous']]
+    return sorted(zip(df_changed[fld.SEASON_ID].astype(int), df_changed[fld.GW].astype(int)))
+
+
+def rewind(
+        df_bootstrap: pd.DataFrame, df_state: pd.DataFrame, changed: List[Tuple[int, int]]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Rows to process and state to start from when the gameweeks changed (see changed_weeks)
+    * only new gameweeks: the gameweeks after the last gameweek of the state
+    * a gameweek already in the state changed (e.g. recomputed by the incremental preprocessing): the accumulators
+      are not kept gameweek by gameweek, the season of this gameweek is processed again from its first gameweek
+    :return:    Rows to process, state
+    """
+    last = last_week(df_state)
+    if not changed or last is None or changed[0] > last:
+        return select_new_weeks(df_bootstrap, df_state), df_state
+    season_id, gw = changed[0]
+    logger.info(f'Form state rewound to the start of season {season_id} (gameweek {gw} changed)')
+    return df_bootstrap[df_bootstrap[fld.SEASON_ID] >= season_id], \
+        df_state[df_state[fld.SEASON_ID] < season_id].reset_index(drop=True)
+
+
+def select_new_weeks(df_bootstrap: pd.DataFrame, df_state: pd.DataFrame) -> pd.DataFrame:
+    """ Rows of the gameweeks after the last gameweek of the state """
+    last = last_week(df_state)
+    if last is None:
+        return df_bootstrap
+    season_id, gw = last
+    after = (df_bootstrap[fld.SEASON_ID] > season_id) \
+        | ((df_bootstrap[fld.SEASON_ID] == season_id) & (df_bootstrap[fld.GW] > gw))
+    return df_bootstrap[after]
+
+
+def update_form(
+        df_bootstrap: pd.DataFrame,
+        df_state: Optional[pd.DataFrame] = None,
+        window: int = FORM_WINDOW,
+        alpha: float = FORM_ALPHA
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Form features of the rows, gameweek after gameweek, from the accumulators of each player
+    Each gameweek costs O(players): the history is only read through the state
+    :param df_bootstrap:    Rows (player id, season id, gameweek, points of the previous gameweek,
+                            minutes of the season) of gameweeks after the last gameweek of the state
+    :param df_state:        Accumulators of the players (empty if None)
+    :param window:          Number of gameweeks of the rolling average
+    :param alpha:           Weight of the last gameweek in the exponentially weighted averages
+    :return:                Form features (player id, season id, gameweek + FORM_FIELDS), updated state
+    """
+    df_state = empty_state(window) if df_state is None else df_state
+    list_df_form = []
+    for (season_id, gw), df_week in df_bootstrap.groupby([fld.SEASON_ID, fld.GW], sort=True):
+        df_form, df_state = _update_week(df_state, df_week, int(season_id), int(gw), window, alpha)
+        list_df_form.append(df_form)
+    if not list_df_form:
+        return pd.DataFrame(columns=[fld.PLAYER_ID, fld.SEASON_ID, fld.GW] + FORM_FIELDS), df_state
+    logger.info(f'Form features of {len(list_df_form)} gameweeks')
+    return pd.concat(list_df_form, ignore_index=True), df_state
+
+
+def _update_week(
+        df_state: pd.DataFrame,
+        df_week: pd.DataFrame,
+        season_id: int,
+        gw: int,
+        window: int,
+        alpha: float
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    df_week = df_week.drop_duplicates(fld.PLAYER_ID)
+    players = df_week[fld.PLAYER_ID].to_numpy(dtype=np.int64)
+    st = df_state.set_index(fld.PLAYER_ID).reindex(players)
+    # New player or new season: start again
+    reset = st[fld.SEASON_ID].to_numpy(dtype=float, na_value=np.nan) != season_id
+    last_columns = [STATE_LAST.format(k) for k in range(1, window + 1)]
+    count = np.where(reset, 0, st[STATE_COUNT].to_numpy(dtype=float))
+    last = np.where(reset[:, None], np.nan, st[last_columns].to_numpy(dtype=float))
+    points_ewma = np.where(reset, np.nan, st[STATE_POINTS_EWMA].to_numpy(dtype=float))
+    minutes_ewma = np.where(reset, np.nan, st[STATE_MINUTES_EWMA].to_numpy(dtype=float))
+    points_total = np.where(reset, 0, st[STATE_POINTS_TOTAL].to_numpy(dtype=float))
+    minutes_total = np.where(reset, np.nan, st[STATE_MINUTES_TOTAL].to_numpy(dtype=float))
+    minutes_played = np.where(reset, 0, st[STATE_MINUTES_PLAYED].to_numpy(dtype=float))
+
+    # Observations: points of the previous gameweek, minutes played since the previous row
+    # (the first row of a season is only the starting point of the minutes)
+    points = df_week[fld.RESULT_POINTS_PREV].to_numpy(dtype=float)
+    minutes_season = df_week[fld.STAT_MINUTES_TOTAL_SEASON].to_numpy(dtype=float)
+    has_points = ~np.isnan(points)
+    has_minutes = ~np.isnan(minutes_season) & ~np.isnan(minutes_total)
+    minutes = np.where(has_minutes, np.clip(minutes_season - minutes_total, 0, None), np.nan)
+
+    last = np.where(has_points[:, None], np.c_[points, last[:, :-1]], last)
+    count = count + has_points
+    points_ewma = _ewma(points_ewma, points, has_points, alpha)
+    minutes_ewma = _ewma(minutes_ewma, minutes, has_minutes, alpha)
+    points_total = np.where(has_points, points_total + np.nan_to_num(points), points_total)
+    minutes_played = np.where(has_minutes, minutes_played + np.nan_to_num(minutes), minutes_played)
+    minutes_total = np.where(np.isnan(minutes_season), minutes_total, minutes_season)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        nb_last = (~np.isnan(last)).sum(axis=1)
+        points_avg = np.where(nb_last > 0, np.nansum(last, axis=1) / nb_last, np.nan)
+        points_per_90 = np.where(minutes_played > 0, 90 * points_total / minutes_played, np.nan)
+
+    df_form = pd.DataFrame({
+        fld.PLAYER_ID: players,
+        fld.SEASON_ID: season_id,
+        fld.GW: gw,
+        fld.FORM_GAMEWEEKS_NB: count.astype('int64'),
+        fld.FORM_POINTS_AVG_LAST_N: points_avg,
+        fld.FORM_POINTS_EWMA: points_ewma,
+        fld.FORM_MINUTES_EWMA: minutes_ewma,
+        fld.FORM_POINTS_PER_90: points_per_90
+    })
+    df_week_state = pd.DataFrame({
+        fld.PLAYER_ID: players,
+        fld.SEASON_ID: season_id,
+        fld.GW: gw,
+        STATE_COUNT: count,
+        **{column: last[:, k] for k, column in enumerate(last_columns)},
+        STATE_POINTS_EWMA: points_ewma,
+        STATE_MINUTES_EWMA: minutes_ewma,
+        STATE_POINTS_TOTAL: points_total,
+        STATE_MINUTES_TOTAL: minutes_total,
+        STATE_MINUTES_PLAYED: minutes_played
+    })
+    df_other = df_state[~df_state[fld.PLAYER_ID].isin(players)]
+    df_state = pd.concat([df_other, df_week_state], ignore_index=True) if len(df_other) else df_week_state
+    return df_form, df_state
+
+
+def _ewma(previous: np.ndarray, value: np.ndarray, observed: np.ndarray, alpha: float) -> np.ndarray:
+    """ Exponentially weighted average, the first observation starts it """
+    updated = np.where(np.isnan(previous), value, alpha * value + (1 - alpha) * previous)
+    return np.where(observed, updated, previous)
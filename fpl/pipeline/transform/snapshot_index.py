@@ -0,0 +1,91 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import pandas as pd
+from fpl.pipeline import raw_store
+
+logger = logging.getLogger(__name__)
+
+# Index fields
+PATH = 'path'
+KIND = 'kind'
+SEASON_NAME = 'season_name'
+GAMEWEEK = 'gameweek'
+API_VERSION = 'api_version'
+SHA256 = 'sha256'
+MTIME_NS = 'mtime_ns'
+SIZE = 'size'
+INDEX_FIELDS = [PATH, KIND, SEASON_NAME, GAMEWEEK, API_VERSION, SHA256, MTIME_NS, SIZE]
+
+
+def read_index(index_path: Optional[Path]) -> pd.DataFrame:
+    if index_path is None or not index_path.exists():
+        return pd.DataFrame(columns=INDEX_FIELDS)
+    return pd.read_csv(index_path, dtype={GAMEWEEK: 'Int64', API_VERSION: 'Int64'})
+
+
+def update_index(
+        dir_raw: Path,
+        kind: str,
+        extract_metadata: Callable[[Any], Dict[str, Any]],
+        index_path: Optional[Path] = None
+) -> List[Dict[str, Any]]:
+    """
+    Metadata (season, gameweek, api version) of all the raw snapshots of a folder
+    Only the files which are new or changed since the last scan are opened:
+    * same size and modification time: the entry of the index is reused
+    * otherwise the file is hashed, a known hash reuses the metadata, a new one parses the file
+    :param dir_raw:             Folder of raw snapshots
+    :param kind:                Kind of snapshot (e.g. bootstrap, fixtures)
+    :param extract_metadata:    Function json -> {season_name, gameweek, api_version}
+    :param index_path:          Persistent index (not saved if None)
+    :return:                    Index entries of the folder (sorted by file name)
+    """
+    df_index = read_index(index_path)
+    known = {
+        entry[PATH]: entry
+        for entry in df_index[df_index[KIND] == kind].to_dict('records')
+    }
+    known_hashes = {entry[SHA256]: entry for entry in known.values()}
+
+    entries = []
+    nb_parsed = 0
+    for file_path in raw_store.list_raw_files(dir_raw):
+        path = str(file_path.resolve())
+        stat = file_path.stat()
+        entry = known.get(path)
+        if entry is not None and entry[MTIME_NS] == stat.st_mtime_ns and entry[SIZE] == stat.st_size:
+            entries.append(entry)
+            continue
+        sha256 = _hash_file(file_path)
+        if sha256 in known_hashes:
+            metadata = {field: known_hashes[sha256][field] for field in [SEASON_NAME, GAMEWEEK, API_VERSION]}
+        else:
+            logger.debug(f'Screen file {file_path.name}')
+            metadata = extract_metadata(raw_store.load_json(file_path))
+            nb_parsed += 1
+        entries.append({
+            PATH: path, KIND: kind, **metadata, SHA256: sha256, MTIME_NS: stat.st_mtime_ns, SIZE: stat.st_size
+        })
+    logger.info(f'Index {dir_raw}: {len(entries)} files, {nb_parsed} parsed')
+
+    for entry in entries:
+        if pd.isna(entry[GAMEWEEK]):
+            entry[GAMEWEEK] = None
+
+    if index_path is not None:
+        df_other = df_index[df_index[KIND] != kind]
+        df_new = pd.DataFrame(entries, columns=INDEX_FIELDS)
+        df_all = pd.concat([df_other, df_new]) if len(df_other) else df_new
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        df_all.to_csv(index_path, index=False)
+    return entries
+
+
+def _hash_file(file_path: Path) -> str:
+    sha = hashlib.sha256()
+    with file_path.open('rb') as f_in:
+        for block in iter(lambda: f_in.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
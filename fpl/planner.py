@@ -0,0 +1,319 @@
+"""
+Transfer planning over several gameweeks (rolling horizon)
+
+For each gameweek t of the horizon and each player i the problem decides the squad s[i, t], the captain c[i, t],
+the players bought b[i, t] and sold o[i, t]. Free transfers are banked from one gameweek to the next
+(up to max_free_transfers), extra transfers cost a hit, and the bank follows the selling / buying prices
+Variables (in this order): s, c, b, o (players x gameweeks), free transfers, hits, bank (gameweeks)
+"""
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from scipy import sparse
+import fpl.constants.fields as fld
+from fpl import milp
+from fpl.manager import ManagerTeam
+from fpl.manager_player import ManagerPlayer, PlayerRole
+from fpl.optimise import MAX_BY_TEAM, SQUAD_POSITIONS, SQUAD_ROLE, SQUAD_SIZE
+
+logger = logging.getLogger(__name__)
+
+HIT_COST = 4
+MAX_FREE_TRANSFERS = 5
+
+# Columns of the plan
+TRANSFER = 'transfer'
+TRANSFER_IN = 'in'
+TRANSFER_OUT = 'out'
+TRANSFER_PRICE = 'transfer_price'
+NB_TRANSFERS = 'nb_transfers'
+FREE_TRANSFERS = 'free_transfers'
+HITS = 'hits'
+BANK = 'bank'
+POINTS = 'points'
+
+
+@dataclass
+class TransferPlan(object):
+    """
+    Solution over the horizon
+    * df_squads:    squad of each gameweek (gameweek, player, role, predicted points)
+    * df_transfers: players bought / sold each gameweek and their price
+    * df_gameweeks: transfers, free transfers available, hits, bank after the transfers and predicted points
+    """
+    df_squads: pd.DataFrame
+    df_transfers: pd.DataFrame
+    df_gameweeks: pd.DataFrame
+    result: milp.MilpResult
+
+
+def prediction_matrix(df_predict: pd.DataFrame, col_id: str = fld.PLAYER_ID_SEASON,
+                      col_pred: str = fld.ML_PREDICT, col_gw: str = fld.GW) -> pd.DataFrame:
+    """ Predictions (one line per player and gameweek) to a players x gameweeks matrix """
+    return df_predict.pivot_table(index=col_id, columns=col_gw, values=col_pred, aggfunc='sum')
+
+
+def plan_transfers(
+        df_players: pd.DataFrame,
+        df_points: pd.DataFrame,
+        team: ManagerTeam,
+        horizon: Optional[int] = None,
+        hit_cost: float = HIT_COST,
+        max_free_transfers: int = MAX_FREE_TRANSFERS,
+        decay: float = 1.,
+        nb_candidates: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        mip_rel_gap: Optional[float] = None,
+        backend: str = milp.BACKEND_AUTO,
+        col_id: str = fld.PLAYER_ID_SEASON,
+        col_cost: str = fld.PLAYER_COST,
+        col_pos: str = fld.PLAYER_POSITION,
+        col_team: str = fld.TEAM_NAME
+) -> TransferPlan:
+    """
+    Best squads and transfers over the next gameweeks
+    The prices are the ones of df_players over the whole horizon (a player bought is sold at this price)
+    :param df_players:          One line per player (id, cost, position, team)
+    :param df_points:           Predicted points, players (index: id) x gameweeks (columns, in order)
+    :param col_id:              Id of the players: the id of the season by default, the id of the players of the
+                                team of the manager (ManagerPlayer.id_season, the 'element' of the picks)
+    :param team:                Current team of the manager (bank, free transfers, players and selling prices)
+    :param horizon:             Number of gameweeks planned (first columns of df_points), all if None
+    :param hit_cost:            Points lost for each transfer above the free ones
+    :param max_free_transfers:  Maximum number of free transfers banked
+    :param decay:               Weight of the points of a gameweek relative to the previous one (uncertainty)
+    :param nb_candidates:       Only consider the best players of each position (+ the current squad)
+    :param time_limit:          Maximum solving time (s), the best plan found is returned when reached
+    :param mip_rel_gap:         Relative gap between the plan and the bound at which the solver stops
+    """
+    gameweeks = list(df_points.columns[:horizon])
+    df_players = df_players.drop_duplicates(col_id).set_index(col_id)
+    owned = {player.id_season: player for player in team.players}
+    missing = set(owned) - set(df_players.index)
+    if missing:
+        raise ValueError(f'Players of the team not in the pool: {sorted(missing)}')
+
+    points = df_points[gameweeks].reindex(df_players.index).fillna(0.)
+    if nb_candidates is not None:
+        total = points.sum(axis=1)
+        best = total.groupby(df_players[col_pos]).nlargest(nb_candidates).index.get_level_values(-1)
+        keep = df_players.index.isin(best) | df_players.index.isin(list(owned))
+        df_players, points = df_players[keep], points[keep]
+
+    unlimited = team.unlimited_transfers or not team.players
+    free_transfers = None if unlimited else min(team.free_transfers, max_free_transfers)
+    problem = build_plan_problem(
+        df_players, points.to_numpy(dtype=float), owned, team.money_bank, free_transfers,
+        hit_cost, max_free_transfers, decay, col_cost, col_pos, col_team
+    )
+    logger.info(f'Plan {len(df_players)} players over gameweeks {gameweeks}: {len(problem.c)} variables')
+    result = milp.solve(problem, backend=backend, time_limit=time_limit, mip_rel_gap=mip_rel_gap)
+    logger.info(f'Plan solved ({result.backend}): {result.status} - points {result.objective} - gap {result.mip_gap}')
+    return get_plan(result, df_players, points, gameweeks, owned, free_transfers, max_free_transfers, col_id, col_cost)
+
+
+def build_plan_problem(
+        df_players: pd.DataFrame,
+        points: np.ndarray,
+        owned: dict,
+        bank: float,
+        free_transfers: Optional[int],
+        hit_cost: float,
+        max_free_transfers: int,
+        decay: float,
+        col_cost: str,
+        col_pos: str,
+        col_team: str
+) -> milp.MilpProblem:
+    """
+    Problem of plan_transfers, each group of constraints is one sparse block (kronecker products over gameweeks)
+    :param points:          Predicted points, players x gameweeks
+    :param owned:           Players of the current team by id
+    :param free_transfers:  Free transfers of the first gameweek, None if unlimited (wildcard / new team)
+    """
+    nb_players, nb_gw = points.shape
+    N = nb_players * nb_gw
+    I_n, I_N, I_T = sparse.identity(nb_players), sparse.identity(N), sparse.identity(nb_gw)
+    previous = sparse.eye(nb_gw, k=-1)
+    ones = sparse.csr_matrix(np.ones((1, nb_players)))
+
+    def by_gw(block):
+        return sparse.kron(I_T, block)
+
+    cost = df_players[col_cost].to_numpy(dtype=float)
+    in_team = df_players.index.isin(list(owned)).astype(float)
+    selling = np.array([owned[i].selling_price if i in owned else c for i, c in zip(df_players.index, cost)])
+    positions = list(SQUAD_POSITIONS)
+    position_rows = sparse.csr_matrix(
+        np.vstack([(df_players[col_pos] == position).to_numpy(dtype=float) for position in positions])
+    )
+    codes, teams = pd.factorize(df_players[col_team])
+    team_rows = sparse.csr_matrix(
+        (np.ones(nb_players), (codes, np.arange(nb_players))), shape=(len(teams), nb_players)
+    )
+
+    # Blocks of columns: s, c, b, o, free transfers, hits, bank
+    groups = [
+        # Squad, positions and teams
+        ([by_gw(ones), None, None, None, None, None, None], SQUAD_SIZE, SQUAD_SIZE),
+        ([by_gw(position_rows), None, None, None, None, None, None],
+         np.tile([SQUAD_POSITIONS[position] for position in positions], nb_gw),
+         np.tile([SQUAD_POSITIONS[position] for position in positions], nb_gw)),
+        ([by_gw(team_rows), None, None, None, None, None, None], -np.inf, MAX_BY_TEAM),
+        # One captain, in the squad
+        ([None, by_gw(ones), None, None, None, None, None], 1, 1),
+        ([-I_N, I_N, None, None, None, None, None], -np.inf, 0),
+        # Squad = previous squad + bought - sold, a player isn't bought and sold the same week
+        ([I_N - sparse.kron(previous, I_n), None, -I_N, I_N, None, None, None],
+         np.concatenate([in_team, np.zeros(N - nb_players)]),
+         np.concatenate([in_team, np.zeros(N - nb_players)])),
+        ([None, None, I_N, I_N, None, None, None], -np.inf, 1),
+        # Bank = previous bank + sold - bought
+        ([None, None, by_gw(sparse.csr_matrix(cost)), by_gw(sparse.csr_matrix(-selling)), None, None,
+          I_T - previous],
+         np.concatenate([[bank], np.zeros(nb_gw - 1)]),
+         np.concatenate([[bank], np.zeros(nb_gw - 1)])),
+        # Transfers <= free transfers + hits, hits <= transfers
+        ([None, None, by_gw(ones), None, -I_T, -I_T, None], -np.inf, 0),
+        ([None, None, by_gw(-ones), None, None, I_T, None], -np.inf, 0),
+    ]
+    if nb_gw > 1:
+        # Free transfers banked: next <= free transfers - (transfers - hits) + 1
+        this_gw = sparse.eye(nb_gw - 1, nb_gw)
+        groups.append((
+            [None, None, sparse.kron(this_gw, ones), None, (I_T - previous).tocsr()[1:], -this_gw, None], -np.inf, 1
+        ))
+
+    A = sparse.bmat([blocks for blocks, _, _ in groups], format='csr')
+    lb = np.concatenate([np.broadcast_to(np.asarray(lb, float), blocks_height(blocks)) for blocks, lb, _ in groups])
+    ub = np.concatenate([np.broadcast_to(np.asarray(ub, float), blocks_height(blocks)) for blocks, _, ub in groups])
+
+    weights = decay ** np.arange(nb_gw)
+    gain = (points * weights).T.reshape(-1)
+    c = np.concatenate([gain, gain, np.zeros(2 * N), np.zeros(nb_gw), -hit_cost * weights, np.zeros(nb_gw)])
+
+    integrality = np.concatenate([np.ones(4 * N + 2 * nb_gw), np.zeros(nb_gw)]).astype(np.int64)
+    x_lb = np.zeros(len(c))
+    x_ub = np.concatenate([np.ones(4 * N), np.full(nb_gw, max_free_transfers), np.full(nb_gw, SQUAD_SIZE),
+                           np.full(nb_gw, np.inf)])
+    # Free transfers of the first gameweek are known, back to 1 after unlimited transfers
+    if free_transfers is None:
+        x_lb[4 * N] = x_ub[4 * N] = SQUAD_SIZE
+        x_ub[4 * N + 1:4 * N + min(nb_gw, 2)] = 1
+    else:
+        x_lb[4 * N] = x_ub[4 * N] = free_transfers
+    return milp.MilpProblem(c=c, A=A, lb=lb, ub=ub, integrality=integrality, x_lb=x_lb, x_ub=x_ub)
+
+
+def blocks_height(blocks: list) -> int:
+    return next(block.shape[0] for block in blocks if block is not None)
+
+
+def get_plan(
+        result: milp.MilpResult,
+        df_players: pd.DataFrame,
+        points: pd.DataFrame,
+        gameweeks: list,
+        owned: dict,
+        free_transfers: Optional[int],
+        max_free_transfers: int,
+        col_id: str,
+        col_cost: str
+) -> TransferPlan:
+    """
+    Squads, transfers and summary of each gameweek from the solution of the problem
+    The free transfers and hits are computed from the transfers: the variables of the problem are only bounds
+    (e.g. nothing prevents the solver from taking useless hits when they cost no point)
+    """
+    if not milp.has_solution(result):
+        empty = pd.DataFrame()
+        return TransferPlan(empty, empty, empty, result)
+    nb_players, nb_gw = points.shape
+    N = nb_players * nb_gw
+    squad, captain, bought, sold = (result.x[k * N:(k + 1) * N].reshape(nb_gw, nb_players) > .5 for k in range(4))
+    bank = result.x[4 * N + 2 * nb_gw:]
+    nb_transfers = bought.sum(axis=1)
+    free, hits = [], []
+    for nb in nb_transfers:
+        free.append(SQUAD_SIZE if free_transfers is None else free_transfers)
+        hits.append(max(nb - free[-1], 0))
+        free_transfers = next_free_transfers(free_transfers, nb, max_free_transfers)
+
+    ids = df_players.index.to_numpy()
+    cost = df_players[col_cost].to_numpy(dtype=float)
+    selling = np.array([owned[i].selling_price if i in owned else c for i, c in zip(ids, cost)])
+    t, i = np.nonzero(squad)
+    df_squads = pd.DataFrame({
+        fld.GW: np.asarray(gameweeks)[t],
+        col_id: ids[i],
+        SQUAD_ROLE: np.where(captain[t, i], PlayerRole.CAPTAIN, PlayerRole.NORMAL),
+        POINTS: points.to_numpy()[i, t] * np.where(captain[t, i], 2, 1)
+    })
+    transfers = []
+    for moves, kind, price in [(bought, TRANSFER_IN, cost), (sold, TRANSFER_OUT, selling)]:
+        t, i = np.nonzero(moves)
+        transfers.append(pd.DataFrame({
+            fld.GW: np.asarray(gameweeks)[t], col_id: ids[i], TRANSFER: kind, TRANSFER_PRICE: price[i]
+        }))
+    df_transfers = pd.concat(transfers, ignore_index=True).sort_values([fld.GW, TRANSFER], ignore_index=True)
+    df_gameweeks = pd.DataFrame({
+        fld.GW: gameweeks,
+        NB_TRANSFERS: nb_transfers,
+        FREE_TRANSFERS: free,
+        HITS: hits,
+        BANK: bank,
+        POINTS: df_squads.groupby(fld.GW)[POINTS].sum().reindex(gameweeks).to_numpy()
+    })
+    return TransferPlan(df_squads, df_transfers, df_gameweeks, result)
+
+
+def next_free_transfers(free_transfers: Optional[int], nb_transfers: int, max_free_transfers: int) -> int:
+    """ Free transfers of the next gameweek: the ones not used + 1 (1 after unlimited transfers) """
+    if free_transfers is None:
+        return 1
+    return min(max(free_transfers - nb_transfers, 0) + 1, max_free_transfers)
+
+
+def apply_first_gameweek(plan: TransferPlan, team: ManagerTeam, max_free_transfers: int = MAX_FREE_TRANSFERS,
+                         col_id: str = fld.PLAYER_ID_SEASON) -> ManagerTeam:
+    """ Team of the manager after the transfers of the first gameweek of the plan """
+    first = plan.df_gameweeks.iloc[0]
+    owned = {player.id_season: player for player in team.players}
+    df_transfers = plan.df_transfers[plan.df_transfers[fld.GW] == first[fld.GW]]
+    prices = df_transfers[df_transfers[TRANSFER] == TRANSFER_IN].set_index(col_id)[TRANSFER_PRICE]
+
+    next_team = ManagerTeam(money=first[BANK])
+    df_squad = plan.df_squads[plan.df_squads[fld.GW] == first[fld.GW]]
+    next_team.players = [
+        owned[player_id] if player_id in owned else ManagerPlayer(player_id, role, prices[player_id], prices[player_id])
+        for player_id, role in zip(df_squad[col_id], df_squad[SQUAD_ROLE])
+    ]
+    next_team.money_total = first[BANK] + sum(player.selling_price for player in next_team.players)
+    unlimited = team.unlimited_transfers or not team.players
+    next_team.free_transfers = next_free_transfers(
+        None if unlimited else first[FREE_TRANSFERS], first[NB_TRANSFERS], max_free_transfers
+    )
+    return next_team
+
+
+def rolling_horizon(df_players: pd.DataFrame, df_points: pd.DataFrame, team: ManagerTeam, horizon: int,
+                    **kwargs) -> List[TransferPlan]:
+    """
+    Plan each gameweek of df_points over the next `horizon` gameweeks, and only apply the transfers of the first one
+    :param kwargs:  Options of plan_transfers
+    :return: Plan made at each gameweek
+    """
+    plans = []
+    for start in range(len(df_points.columns)):
+        plan = plan_transfers(df_players, df_points.iloc[:, start:start + horizon], team, **kwargs)
+        if not milp.has_solution(plan.result):
+            logger.warning(f'No plan found at gameweek {df_points.columns[start]}: {plan.result.status}')
+            break
+        plans.append(plan)
+        team = apply_first_gameweek(
+            plan, team, kwargs.get('max_free_transfers', MAX_FREE_TRANSFERS),
+            kwargs.get('col_id', fld.PLAYER_ID_SEASON)
+        )
+    return plans
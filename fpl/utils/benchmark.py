@@ -0,0 +1,198 @@
+import argparse
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import pandas as pd
+import fpl.constants.structure as struc
+from fpl.utils import metrics, synthetic
+
+logger = logging.getLogger(__name__)
+
+# Sizes of the synthetic raw trees (seasons x snapshots per season x players)
+SCALES: Dict[str, Dict[str, int]] = {
+    'small': {'nb_seasons': 2, 'nb_snapshots': 4, 'nb_players': 100},
+    'medium': {'nb_seasons': 4, 'nb_snapshots': 10, 'nb_players': 400},
+    'large': {'nb_seasons': 6, 'nb_snapshots': 38, 'nb_players': 700}
+}
+
+# Fields of a result (on top of the metrics of the stage)
+SCALE = 'scale'
+RUN_ID = 'run_id'
+REPEAT = 'repeat'
+COMMIT = 'commit'
+PYTHON = 'python'
+WORKERS = 'workers'
+
+# Folders rebuilt by the pipeline: removed before each run so that every run starts cold
+PIPELINE_DIRS = ['intermediate', 'processed', 'results']
+
+
+def run_stages(workers: int = 1):
+    """
+    Run the pipeline stages on the data folder of the project (FPL_DATA_DIR), then select the team of the last
+    gameweek. Called in a new process by run_scale: the data folder and the metrics come from the environment
+    """
+    import fpl.constants.fields as fld
+    import fpl.model.predict
+    import fpl.optimise
+    import fpl.pipeline.transform.clean_historical
+    import fpl.pipeline.transform.features
+    import fpl.pipeline.transform.preprocess_bootstrap
+    fpl.pipeline.transform.preprocess_bootstrap.run(workers=workers)
+    fpl.pipeline.transform.clean_historical.run(workers=workers)
+    fpl.pipeline.transform.features.run(reload_data=False)
+    df_predict = fpl.model.predict.run(reload_data=False)
+    df_season = df_predict[df_predict[fld.SEASON_ID] == df_predict[fld.SEASON_ID].max()]
+    fpl.optimise.select_team(df_season[df_season[fld.GW] == df_season[fld.GW].max()])
+
+
+def run_scale(
+        scale: str,
+        dir_work: Path,
+        repeat: int = 1,
+        workers: int = 1,
+        sizes: Optional[Dict[str, int]] = None
+) -> pd.DataFrame:
+    """
+    Time the stages of the pipeline on a synthetic tree (generated once per scale, reused afterwards)
+    Each run is a new process starting from the raw data only
+    :param scale:       Name of the scale (key of SCALES)
+    :param dir_work:    Folder of the synthetic trees (one data folder per scale)
+    :param repeat:      Number of runs
+    :param workers:     Number of processes of the bootstrap / historical stages
+    :param sizes:       Size of the tree (nb_seasons, nb_snapshots, nb_players), SCALES[scale] if None
+    :return:            Metrics of the stages (one row per stage and run)
+    """
+    sizes = sizes or SCALES[scale]
+    dir_data = dir_work / '_'.join([scale] + [str(sizes[key]) for key in sorted(sizes)])
+    dir_raw = dir_data / struc.DIR_RAW_BOOTSTRAP.parent.name
+    if not dir_raw.exists():
+        logger.info(f'Generate synthetic tree {dir_data.name}')
+        synthetic.write_raw_tree(dir_raw.with_name(dir_raw.name + '.partial'), **sizes)
+        dir_raw.with_name(dir_raw.name + '.partial').rename(dir_raw)
+
+    package_dir = Path(__file__).parent.parent
+    env = dict(os.environ)
+    # The modules of the project are imported both as fpl.<module> and <module> (run from the package folder)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [str(package_dir), str(package_dir.parent)] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else [])
+    )
+    env['FPL_DATA_DIR'] = str(dir_data)
+    env.pop(metrics.ENV_PROFILE_DIR, None)
+
+    list_df = []
+    for idx in range(repeat):
+        for name in PIPELINE_DIRS:
+            shutil.rmtree(dir_data / name, ignore_errors=True)
+        metrics_path = dir_data / 'metrics' / f'run-{idx}.jsonl'
+        metrics_path.unlink(missing_ok=True)
+        env[metrics.ENV_METRICS_FILE] = str(metrics_path)
+        logger.info(f'Benchmark {scale} - run {idx + 1}/{repeat}')
+        subprocess.run(
+            [sys.executable, '-m', 'fpl.utils.benchmark', '--run-stages', '--workers', str(workers)],
+            env=env, cwd=dir_data, check=True, stdout=subprocess.DEVNULL
+        )
+        df_run = metrics.read_metrics(metrics_path)
+        df_run = df_run[df_run[metrics.PARENT].isna()]
+        df_run.insert(0, REPEAT, idx)
+        list_df.append(df_run)
+    df_scale = pd.concat(list_df, ignore_index=True)
+    df_scale.insert(0, SCALE, scale)
+    for key, value in sizes.items():
+        df_scale[key] = value
+    df_scale[WORKERS] = workers
+    return df_scale
+
+
+def benchmark(
+        scales: List[str],
+        results_path: Path = struc.FILE_BENCHMARKS,
+        dir_work: Path = struc.DIR_BENCHMARK,
+        repeat: int = 1,
+        workers: int = 1
+) -> pd.DataFrame:
+    """
+    Benchmark the pipeline at several scales, the results are appended to results_path (json lines)
+    :return: Results of this run
+    """
+    run_id = datetime.now().isoformat(timespec='seconds')
+    df_results = pd.concat(
+        [run_scale(scale, dir_work, repeat, workers) for scale in scales], ignore_index=True
+    )
+    df_results.insert(0, RUN_ID, run_id)
+    df_results[COMMIT] = _git_commit()
+    df_results[PYTHON] = platform.python_version()
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    text = df_results.to_json(orient='records', lines=True)
+    with results_path.open('a', encoding='utf-8') as f_out:
+        f_out.write(text if text.endswith('\n') else text + '\n')
+    return df_results
+
+
+def compare(
+        results_path: Path = struc.FILE_BENCHMARKS,
+        tolerance: float = 0.25,
+        min_slowdown_s: float = 0.1
+) -> pd.DataFrame:
+    """
+    Compare the last benchmark with the previous one (median wall time of each scale / stage)
+    :param results_path:    Results of the benchmarks
+    :param tolerance:       Relative slowdown above which a stage is flagged as a regression
+    :param min_slowdown_s:  Slowdowns shorter than this are noise (very fast stages)
+    :return:                scale, stage, previous / last wall time (s), ratio, regression
+    """
+    df_results = pd.read_json(results_path, lines=True)
+    run_ids = sorted(df_results[RUN_ID].astype(str).unique())
+    if len(run_ids) < 2:
+        raise ValueError(f'At least two benchmarks are needed to compare, found {len(run_ids)}')
+    df_results[RUN_ID] = df_results[RUN_ID].astype(str)
+    df_wall = df_results[df_results[RUN_ID].isin(run_ids[-2:])] \
+        .groupby([SCALE, metrics.STAGE, RUN_ID])[metrics.WALL_S].median() \
+        .unstack(RUN_ID) \
+        .rename(columns={run_ids[-2]: 'previous_s', run_ids[-1]: 'last_s'})
+    df_wall.columns.name = None
+    df_wall['ratio'] = df_wall['last_s'] / df_wall['previous_s']
+    df_wall['regression'] = (df_wall['ratio'] > 1 + tolerance) \
+        & (df_wall['last_s'] - df_wall['previous_s'] > min_slowdown_s)
+    return df_wall.reset_index()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def _parse_args(args: List[str]) -> Any:
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline on synthetic data')
+    parser.add_argument('--scales', nargs='+', default=['small'], choices=list(SCALES))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--compare', action='store_true', help='Compare the last two benchmarks')
+    parser.add_argument('--run-stages', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    ARGS = _parse_args(sys.argv[1:])
+    if ARGS.run_stages:
+        # The logs of the stages would be part of the timings
+        logging.getLogger('fpl').setLevel(logging.WARNING)
+        run_stages(ARGS.workers)
+    elif ARGS.compare:
+        print(compare().to_string(index=False))
+    else:
+        print(benchmark(ARGS.scales, repeat=ARGS.repeat, workers=ARGS.workers)
+              [[SCALE, REPEAT, metrics.STAGE, metrics.WALL_S, metrics.PEAK_RSS_MB, metrics.ROWS_OUT]]
+              .to_string(index=False))
@@ -1,19 +1,84 @@
+from typing import Iterable, List, Union
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_extension_array_dtype, is_integer_dtype
+
+
 def add_prev_groupby(df_init, col_group, col_sort, col_shift):
-    indexes = col_group + [col_sort]
-    s_next = df_init.groupby(col_group).apply(lambda x: resample_shift_prev(x, col_index=col_sort, col_shift=col_shift))
-    df_next = s_next.reset_index(level=indexes)
+    """
+    Add the value of the previous index (col_sort - 1) of each group, as <column>_prev
+    Missing indexes are not skipped: the previous value of a row following a gap is empty
+    """
+    return add_lags(df_init, col_group, col_sort, col_shift, lags=[1])
+
+
+def add_lags(
+        df: pd.DataFrame,
+        col_group: List[str],
+        col_sort: str,
+        col_shift: Union[str, List[str]],
+        lags: Iterable[int] = (1,)
+) -> pd.DataFrame:
+    """
+    Add lagged values of columns within groups, in a single vectorized pass (no per-group python code)
+    The lag is gap-aware: the lag k of a row is the row of the same group with col_sort - k, empty if it doesn't exist
+    (e.g. the lag 1 of gameweek 5 is empty if the player has no row for gameweek 4)
+    :param df:          Rows, at most one per group / col_sort value
+    :param col_group:   Columns of the groups (e.g. player id, season id)
+    :param col_sort:    Integer column of the position in the group (e.g. gameweek)
+    :param col_shift:   Column(s) to lag
+    :param lags:        Lags to compute, lag 1 is named <column>_prev, lag k <column>_prev_<k>
+    :return:            Copy of df (same index and row order) with the lagged columns,
+                        integer and boolean columns become nullable (Int64 / boolean), the other types are kept
+    """
+    col_shift = [col_shift] if isinstance(col_shift, str) else list(col_shift)
+    lags = list(lags)
+    if any(lag < 1 for lag in lags):
+        raise ValueError(f'Lags must be positive, got {lags}')
+    df_result = df.copy()
+    if df.empty:
+        for lag in lags:
+            for column in col_shift:
+                df_result[_lag_name(column, lag)] = df[column]
+        return df_result
+
+    # Composite key (group, position): the row k positions before is key - k, in the band of its group
+    group_ids = df.groupby(col_group, sort=False, dropna=False).ngroup().to_numpy(dtype=np.int64)
+    position = df[col_sort]
+    valid = position.notna().to_numpy()
+    position = position.fillna(0).to_numpy(dtype=np.int64)
+    max_lag = max(lags)
+    offset = position - position[valid].min() + max_lag if valid.any() else position
+    span = int(offset[valid].max()) + 1 if valid.any() else 1
+    keys = np.where(valid, group_ids * span + offset, -1)
+
+    order = np.argsort(keys, kind='stable')
+    keys_sorted = keys[order]
+    if (np.diff(keys_sorted[keys_sorted >= 0]) == 0).any():
+        raise ValueError(f'Several rows with the same {col_group} / {col_sort}')
+
+    for lag in lags:
+        target = keys - lag
+        pos = np.searchsorted(keys_sorted, target).clip(max=len(keys_sorted) - 1)
+        found = valid & (keys_sorted[pos] == target)
+        indices = np.where(found, order[pos], -1)
+        for column in col_shift:
+            df_result[_lag_name(column, lag)] = pd.Series(
+                _nullable(df[column]).array.take(indices, allow_fill=True), index=df.index
+            )
+    return df_result
 
-    # Set columns to merge as objects, otherwise pandas  might change column dtype then complain it can't merge
-    df_init[indexes] = df_init[indexes].apply(lambda x: x.astype('object'))
-    df_next[indexes] = df_next[indexes].apply(lambda x: x.astype('object'))
 
-    df_final = df_init.merge(df_next, how='left', on=indexes, suffixes=('', '_prev'))
-    return df_final
+def _lag_name(column: str, lag: int) -> str:
+    return f'{column}_prev' if lag == 1 else f'{column}_prev_{lag}'
 
 
-def resample_shift_prev(df, col_index, col_shift):
-    df_index = df.set_index(col_index)
-    new_index = range(min(df_index.index), max(df_index.index) + 1)
-    df_resampled = df_index.reindex(new_index)
-    df_shift = df_resampled.shift(1)[col_shift]
-    return df_shift
+def _nullable(series: pd.Series) -> pd.Series:
+    """ Integer / boolean columns as nullable types (a lag can be missing) """
+    if is_extension_array_dtype(series.dtype):
+        return series
+    if is_bool_dtype(series.dtype):
+        return series.astype('boolean')
+    if is_integer_dtype(series.dtype):
+        return series.astype('Int64')
+    return series
@@ -0,0 +1,228 @@
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Metrics of the instrumented functions (one json line per call), recorded only once enabled:
+# configure() or the environment variables FPL_METRICS_FILE (metrics file) / FPL_PROFILE_DIR (cProfile dumps)
+ENV_METRICS_FILE = 'FPL_METRICS_FILE'
+ENV_PROFILE_DIR = 'FPL_PROFILE_DIR'
+
+# Fields of a record
+STAGE = 'stage'
+PARENT = 'parent'
+START = 'start'
+STATUS = 'status'
+WALL_S = 'wall_s'
+CPU_S = 'cpu_s'
+PEAK_RSS_MB = 'peak_rss_mb'
+ROWS_IN = 'rows_in'
+ROWS_OUT = 'rows_out'
+BYTES_IN = 'bytes_in'
+BYTES_OUT = 'bytes_out'
+PROFILE = 'profile'
+
+_config: Dict[str, Optional[Path]] = {
+    'metrics_path': Path(os.environ[ENV_METRICS_FILE]) if os.environ.get(ENV_METRICS_FILE) else None,
+    'profile_dir': Path(os.environ[ENV_PROFILE_DIR]) if os.environ.get(ENV_PROFILE_DIR) else None
+}
+_stack: List[Dict[str, Any]] = []
+
+
+def configure(metrics_path: Optional[Path] = None, profile_dir: Optional[Path] = None):
+    """
+    Enable (or disable with None) the recording of the metrics
+    :param metrics_path:    File of the metrics (json lines, appended)
+    :param profile_dir:     Folder of the cProfile dumps (one per call of a stage), no profiling if None
+    """
+    _config['metrics_path'] = metrics_path
+    _config['profile_dir'] = profile_dir
+
+
+def is_enabled() -> bool:
+    return _config['metrics_path'] is not None or _config['profile_dir'] is not None
+
+
+def instrument(
+        name: Optional[str] = None,
+        inputs: Iterable[Union[str, Path]] = (),
+        outputs: Iterable[Union[str, Path]] = ()
+) -> Callable:
+    """
+    Decorator recording the wall time, cpu time, peak memory, row counts and input / output bytes of a function
+    Nested calls are recorded with their parent stage, a cProfile dump is only made for the outermost stage
+    :param name:    Name of the stage (module.function by default)
+    :param inputs:  Files / folders read: paths or names of arguments holding a path
+    :param outputs: Files / folders written: paths or names of arguments holding a path
+                    (the paths returned by the function are counted as outputs)
+    """
+    inputs = list(inputs)
+    outputs = list(outputs)
+
+    def decorator(func: Callable) -> Callable:
+        stage = name or f'{func.__module__}.{func.__qualname__}'
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            arguments = signature.bind_partial(*args, **kwargs)
+            arguments.apply_defaults()
+            dataframes_in = [value for value in arguments.arguments.values() if _is_dataframe(value)]
+            record = {
+                STAGE: stage,
+                PARENT: _stack[-1][STAGE] if _stack else None,
+                START: datetime.now().isoformat(timespec='seconds'),
+                ROWS_IN: _count_rows(dataframes_in),
+                BYTES_IN: _count_bytes(_resolve_paths(inputs, arguments.arguments))
+            }
+            profiler = _start_profile()
+            if _stack:
+                # The peak memory is reset for this stage: the peak of the parent so far is kept apart
+                _update_peak(_stack[-1], _peak_rss_mb())
+            _reset_peak_rss()
+            _stack.append(record)
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            record[STATUS] = 'error'
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                record[STATUS] = 'ok'
+                record[ROWS_OUT] = _count_rows([result])
+                return result
+            finally:
+                record[WALL_S] = round(time.perf_counter() - wall_start, 6)
+                record[CPU_S] = round(time.process_time() - cpu_start, 6)
+                _stack.pop()
+                _update_peak(record, _peak_rss_mb())
+                if _stack:
+                    # The peak of the parent includes the peak of its children
+                    _update_peak(_stack[-1], record[PEAK_RSS_MB])
+                # Files returned by the function (e.g. snapshot written by a scrape function) are outputs too
+                returned = result if isinstance(result, list) else [result]
+                record[BYTES_OUT] = _count_bytes(
+                    _resolve_paths(outputs, arguments.arguments) + [path for path in returned if isinstance(path, Path)]
+                )
+                record[PROFILE] = _stop_profile(profiler, stage)
+                _write_record(record)
+        return wrapper
+    return decorator
+
+
+def read_metrics(metrics_path: Path) -> 'pd.DataFrame':
+    """ Records of a metrics file, one row per call """
+    import pandas as pd
+    if not metrics_path.exists():
+        return pd.DataFrame(columns=[STAGE, PARENT, START, STATUS, WALL_S, CPU_S, PEAK_RSS_MB])
+    return pd.read_json(metrics_path, lines=True)
+
+
+def _write_record(record: Dict[str, Any]):
+    metrics_path = _config['metrics_path']
+    logger.debug(f'Metrics {record}')
+    if metrics_path is None:
+        return
+    metrics_path.parent.mkdir(parents=True, exist_ok=True)
+    with metrics_path.open('a', encoding='utf-8') as f_out:
+        f_out.write(json.dumps(record, default=str) + '\n')
+
+
+def _start_profile() -> Optional[cProfile.Profile]:
+    # A single profiler can be active: nested stages are part of the profile of the outermost stage
+    if _config['profile_dir'] is None or _stack:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profile(profiler: Optional[cProfile.Profile], stage: str) -> Optional[str]:
+    if profiler is None:
+        return None
+    profiler.disable()
+    profile_dir = _config['profile_dir']
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profile_path = profile_dir / f'{stage}-{datetime.now():%Y%m%d%H%M%S%f}.prof'
+    profiler.dump_stats(profile_path)
+    return str(profile_path)
+
+
+def _resolve_paths(paths: List[Union[str, Path]], arguments: Dict[str, Any]) -> List[Path]:
+    resolved = []
+    for path in paths:
+        value = arguments.get(path) if isinstance(path, str) else path
+        if isinstance(value, (str, Path)):
+            resolved.append(Path(value))
+    return resolved
+
+
+def _count_bytes(paths: List[Path]) -> Optional[int]:
+    if not paths:
+        return None
+    total = 0
+    for path in paths:
+        if path.is_file():
+            total += path.stat().st_size
+        elif path.is_dir():
+            total += sum(file_path.stat().st_size for file_path in path.rglob('*') if file_path.is_file())
+    return total
+
+
+def _count_rows(values: Iterable[Any]) -> Optional[int]:
+    """ Rows of the dataframes (or length of the lists) among the values, None if there is none """
+    rows = [len(value) for value in values if isinstance(value, list) or _is_dataframe(value)]
+    return sum(rows) if rows else None
+
+
+def _is_dataframe(value: Any) -> bool:
+    # pandas is not imported for the stages which don't use it (a dataframe implies pandas is loaded)
+    pandas = sys.modules.get('pandas')
+    return pandas is not None and isinstance(value, pandas.DataFrame)
+
+
+def _update_peak(record: Dict[str, Any], peak_rss_mb: Optional[float]):
+    if peak_rss_mb is not None:
+        record[PEAK_RSS_MB] = max(record.get(PEAK_RSS_MB) or 0, peak_rss_mb)
+    else:
+        record.setdefault(PEAK_RSS_MB, None)
+
+
+def _reset_peak_rss():
+    """ Reset the peak memory of the process (Linux only), otherwise the peak is the one since the start """
+    try:
+        Path('/proc/self/clear_refs').write_text('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        with open('/proc/self/status', 'r') as f_in:
+            for line in f_in:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
@@ -0,0 +1,298 @@
+# Synthetic FPL API payloads (same shape as the real API, random values)
+# Used to run the scrapers and the pipeline without network access
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import fpl.constants.structure as struc
+from fpl.pipeline import raw_store
+
+NB_TEAMS = 20
+NB_GAMEWEEKS = 38
+POSITIONS = [(1, 'GKP', 'Goalkeeper'), (2, 'DEF', 'Defender'), (3, 'MID', 'Midfielder'), (4, 'FWD', 'Forward')]
+POSITION_WEIGHTS = [2, 5, 5, 3]
+# Old API (bootstrap with 'current-event' and the next fixtures of each team) before this season
+API_V2_FIRST_YEAR = 2020
+# 2019/20 (covid) has its own calendar (gameweeks 39 to 47), it is not generated
+COVID_YEAR = 2019
+
+
+def season_id(year_start: int) -> int:
+    """ Season id used in the project (2006/07 is season 1) """
+    return year_start - 2006 + 1
+
+
+def player_code(player_id: int) -> int:
+    """ Code of a player (stable between seasons, unlike the id) """
+    return 10000 + player_id
+
+
+def bootstrap_payload(
+        year_start: int = 2020,
+        gameweek: Optional[int] = 10,
+        nb_players: int = 600,
+        seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Bootstrap (API after 2020) for a season and a current gameweek (None before the season starts)
+    """
+    rng = random.Random(f'{seed}-{year_start}-{gameweek}')
+    return {
+        'events': _events(year_start, gameweek),
+        'teams': _teams(year_start),
+        'total_players': 8_000_000,
+        'elements': [_element(player_id, gameweek, rng) for player_id in range(1, nb_players + 1)],
+        'element_types': _element_types()
+    }
+
+
+def bootstrap_payload_v1(
+        year_start: int = 2017,
+        gameweek: Optional[int] = 10,
+        nb_players: int = 600,
+        seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Bootstrap (API until 2020) for a season and a current gameweek: the teams hold their next fixtures
+    """
+    payload = bootstrap_payload(year_start, gameweek, nb_players, seed)
+    next_event = (gameweek or 0) + 1
+    next_fixtures = {team_id: [] for team_id in range(1, NB_TEAMS + 1)}
+    for event, (team_h, team_a) in _schedule():
+        if event == next_event:
+            next_fixtures[team_h].append({'event': event, 'is_home': True, 'opponent': team_a})
+            next_fixtures[team_a].append({'event': event, 'is_home': False, 'opponent': team_h})
+    for team in payload['teams']:
+        team['next_event_fixture'] = next_fixtures[team['id']]
+    return {
+        'events': payload['events'],
+        'teams': payload['teams'],
+        'total-players': payload.pop('total_players'),
+        'current-event': gameweek,
+        'next-event': next_event if next_event <= NB_GAMEWEEKS else None,
+        'elements': payload['elements'],
+        'element_types': payload['element_types']
+    }
+
+
+def fixtures_payload(year_start: int = 2020, gameweek: Optional[int] = 10) -> List[Dict[str, Any]]:
+    """ All the games of the season (double round robin), games up to the current gameweek are started """
+    fixtures = []
+    for event, (team_h, team_a) in _schedule():
+        fixtures.append({
+            'id': len(fixtures) + 1,
+            'code': 2_000_000 + year_start * 1000 + len(fixtures),
+            'event': event,
+            'kickoff_time': _deadline(year_start, event),
+            'started': gameweek is not None and event <= gameweek,
+            'finished': gameweek is not None and event <= gameweek,
+            'team_h': team_h,
+            'team_a': team_a,
+            'team_h_difficulty': 1 + (team_a % 5),
+            'team_a_difficulty': 1 + (team_h % 5),
+            'stats': []
+        })
+    return fixtures
+
+
+def player_details_payload(player_id: int, year_start: int = 2020, nb_seasons_past: int = 3) -> Dict[str, Any]:
+    """ Detailed data of a player (element-summary) with the previous seasons """
+    code = player_code(player_id)
+    history_past = []
+    for year in range(year_start - nb_seasons_past, year_start):
+        # Same values for a season whatever the snapshot
+        rng = random.Random(f'history-{player_id}-{year}')
+        history_past.append({
+            'season_name': f'{year}/{str(year + 1)[2:]}',
+            'season': season_id(year),
+            'element_code': code,
+            'start_cost': 45 + rng.randint(0, 80),
+            'end_cost': 45 + rng.randint(0, 80),
+            'total_points': rng.randint(0, 250),
+            'minutes': rng.randint(0, 3420)
+        })
+    return {'fixtures': [], 'history': [], 'history_past': history_past}
+
+
+def manager_history_payload(manager_id: int, year_start: int = 2020, gameweek: Optional[int] = 10) -> Dict[str, Any]:
+    """ History of a manager (entry/{id}/history) """
+    rng = random.Random(f'manager-{manager_id}')
+    current = [
+        {'event': event, 'points': rng.randint(20, 100), 'total_points': 0, 'rank': rng.randint(1, 8_000_000)}
+        for event in range(1, (gameweek or 0) + 1)
+    ]
+    past = [
+        {'season_name': f'{year}/{str(year + 1)[2:]}', 'total_points': rng.randint(1000, 2500),
+         'rank': rng.randint(1, 8_000_000)}
+        for year in range(year_start - rng.randint(0, 5), year_start)
+    ]
+    return {'current': current, 'past': past, 'chips': []}
+
+
+def season_years(nb_seasons: int, last_year: int = 2022) -> List[int]:
+    """ First year of the last nb_seasons seasons up to last_year (the covid season is skipped) """
+    years = []
+    year = last_year
+    while len(years) < nb_seasons:
+        if year != COVID_YEAR:
+            years.append(year)
+        year -= 1
+    return sorted(years)
+
+
+def snapshot_gameweeks(nb_snapshots: int) -> List[int]:
+    """ Current gameweeks of nb_snapshots snapshots spread over a season (the last one is the end of the season) """
+    nb_snapshots = min(max(nb_snapshots, 1), NB_GAMEWEEKS)
+    if nb_snapshots == 1:
+        return [NB_GAMEWEEKS]
+    return sorted({1 + (NB_GAMEWEEKS - 1) * i // (nb_snapshots - 1) for i in range(nb_snapshots)})
+
+
+def write_raw_tree(
+        dir_raw: Path,
+        nb_seasons: int = 2,
+        nb_snapshots: int = 4,
+        nb_players: int = 100,
+        last_year: int = 2022,
+        seed: int = 0,
+        compression: Optional[str] = None
+) -> Dict[str, List[Path]]:
+    """
+    Write a raw data tree (same layout and file names as the scrapers) for nb_seasons x nb_snapshots x nb_players:
+    * bootstrap: one snapshot per gameweek of snapshot_gameweeks, old API before API_V2_FIRST_YEAR
+    * fixtures: one snapshot with each bootstrap snapshot (new API only)
+    * player-details: one snapshot per season (at its last gameweek), one player per line
+    :param dir_raw:         Raw data folder (e.g. data/raw)
+    :param nb_seasons:      Number of seasons, the last one starts in last_year
+    :param nb_snapshots:    Number of snapshots per season
+    :param nb_players:      Number of players per season (the same players every season)
+    :param last_year:       First year of the last season
+    :param seed:            Seed of the random values
+    :param compression:     Compression of the files ('gzip' or 'zstd'), None to write plain json
+    :return:                Paths written by kind of snapshot (bootstrap, fixtures, player-details)
+    """
+    dirs = {
+        'bootstrap': dir_raw / struc.DIR_RAW_BOOTSTRAP.name,
+        'fixtures': dir_raw / struc.DIR_RAW_FIXTURES.name,
+        'player-details': dir_raw / struc.DIR_RAW_PLAYER_DETAILS.name
+    }
+    for dir_kind in dirs.values():
+        dir_kind.mkdir(parents=True, exist_ok=True)
+    extension = raw_store.raw_extension(compression)
+    written = {kind: [] for kind in dirs}
+
+    def write(kind: str, date: str, name: str, text: str):
+        path = dirs[kind] / f'{date}_{name}.{extension}'
+        raw_store.atomic_write_text(path, text)
+        written[kind].append(path)
+
+    for year in season_years(nb_seasons, last_year):
+        gameweeks = snapshot_gameweeks(nb_snapshots)
+        for gameweek in gameweeks:
+            date = _deadline(year, gameweek)[:10].replace('-', '')
+            if year < API_V2_FIRST_YEAR:
+                write('bootstrap', date, 'bootstrap_static', json.dumps(
+                    bootstrap_payload_v1(year, gameweek, nb_players, seed)))
+            else:
+                write('bootstrap', date, 'bootstrap_static', json.dumps(
+                    bootstrap_payload(year, gameweek, nb_players, seed)))
+                write('fixtures', date, 'fixtures', json.dumps(fixtures_payload(year, gameweek)))
+        date = _deadline(year, gameweeks[-1])[:10].replace('-', '')
+        write('player-details', date, 'player_detailed_data', ''.join(
+            json.dumps(player_details_payload(player_id, year)) + '\n' for player_id in range(1, nb_players + 1)
+        ))
+    return written
+
+
+def _deadline(year_start: int, event: int) -> str:
+    # One gameweek per week from the 8th of August, the last ones are in April of the following year
+    month_lengths = [(8, 31), (9, 30), (10, 31), (11, 30), (12, 31), (1, 31), (2, 28), (3, 31), (4, 30), (5, 31)]
+    day = 8 + 7 * (event - 1)
+    year = year_start
+    for month, length in month_lengths:
+        if day <= length:
+            break
+        day -= length
+        if month == 12:
+            year += 1
+    return f'{year}-{month:02d}-{day:02d}T11:00:00Z'
+
+
+def _events(year_start: int, gameweek: Optional[int]) -> List[Dict[str, Any]]:
+    return [
+        {
+            'id': event,
+            'name': f'Gameweek {event}',
+            'deadline_time': _deadline(year_start, event),
+            'finished': gameweek is not None and event <= gameweek,
+            'is_previous': gameweek is not None and event == gameweek - 1,
+            'is_current': event == gameweek,
+            'is_next': event == (gameweek or 0) + 1
+        }
+        for event in range(1, NB_GAMEWEEKS + 1)
+    ]
+
+
+def _teams(year_start: int) -> List[Dict[str, Any]]:
+    rng = random.Random(f'teams-{year_start}')
+    return [
+        {'id': team_id, 'code': team_id + 100, 'name': f'Team {team_id}', 'short_name': f'T{team_id:02d}',
+         'strength': rng.randint(2, 5)}
+        for team_id in range(1, NB_TEAMS + 1)
+    ]
+
+
+def _element_types() -> List[Dict[str, Any]]:
+    return [
+        {'id': position_id, 'singular_name': name, 'singular_name_short': short_name}
+        for position_id, short_name, name in POSITIONS
+    ]
+
+
+def _element(player_id: int, gameweek: Optional[int], rng: random.Random) -> Dict[str, Any]:
+    played = gameweek or 0
+    position_id = random.Random(player_id).choices([p[0] for p in POSITIONS], weights=POSITION_WEIGHTS)[0]
+    team = 1 + (player_id % NB_TEAMS)
+    ict = [round(rng.uniform(0, 100), 1) for _ in range(3)]
+    return {
+        'id': player_id,
+        'code': player_code(player_id),
+        'web_name': f'Player {player_id}',
+        'team': team,
+        'team_code': team + 100,
+        'element_type': position_id,
+        'status': rng.choice(['a'] * 9 + ['i', 'd']),
+        'now_cost': 40 + 5 * rng.randint(0, 16),
+        'chance_of_playing_next_round': rng.choice([None] * 8 + [0, 25, 50, 75]),
+        'cost_change_event': rng.choice([-1, 0, 0, 0, 1]),
+        'selected_by_percent': f'{rng.uniform(0, 60):.1f}',
+        'transfers_in_event': rng.randint(0, 200_000),
+        'transfers_out_event': rng.randint(0, 200_000),
+        'ep_next': f'{rng.uniform(0, 10):.1f}',
+        'influence': f'{ict[0] * played:.1f}',
+        'creativity': f'{ict[1] * played:.1f}',
+        'threat': f'{ict[2] * played:.1f}',
+        'ict_index': f'{sum(ict) * played / 10:.1f}',
+        'event_points': rng.randint(-2, 15) if played else 0,
+        'total_points': rng.randint(0, 10) * played,
+        'minutes': rng.randint(0, 90) * played
+    }
+
+
+def _schedule() -> List[Any]:
+    """ Double round robin (circle method): list of (gameweek, (home team, away team)) """
+    teams = list(range(1, NB_TEAMS + 1))
+    half = []
+    for round_idx in range(NB_TEAMS - 1):
+        games = []
+        for i in range(NB_TEAMS // 2):
+            home, away = teams[i], teams[NB_TEAMS - 1 - i]
+            games.append((home, away) if (round_idx + i) % 2 == 0 else (away, home))
+        half.append(games)
+        teams = [teams[0]] + [teams[-1]] + teams[1:-1]
+    schedule = []
+    for round_idx, games in enumerate(half, start=1):
+        schedule.extend((round_idx, game) for game in games)
+    for round_idx, games in enumerate(half, start=NB_TEAMS):
+        schedule.extend((round_idx, (away, home)) for home, away in games)
+    return schedule
@@ -7,6 +7,8 @@ setup(
     author='sfog17',
     author_email='',
     description='Optimise team selection for Fantasy Football using machine learning',
-    install_requires=['requests', 'numpy', 'pandas'],
-    packages=['fpl']
+    install_requires=['requests', 'numpy', 'pandas', 'pyarrow', 'scipy', 'pulp'],
+    extras_require={'zstd': ['zstandard'], 'fast': ['orjson']},
+    packages=find_packages(include=['fpl', 'fpl.*']),
+    entry_points={'console_scripts': ['fpl=fpl.cli:main']}
 )
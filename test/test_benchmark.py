@@ -0,0 +1,37 @@
+from pathlib import Path
+import constants.fields as fld
+import fpl.constants.structure as struc
+import pipeline.transform.preprocess_bootstrap as pb
+import pipeline.transform.clean_historical as ch
+from fpl.utils import benchmark, metrics, synthetic
+
+
+def test_write_raw_tree(tmp_path: Path):
+    # 2018/19 (old API) and 2020/21 (new API), the covid season is skipped
+    written = synthetic.write_raw_tree(tmp_path, nb_seasons=2, nb_snapshots=3, nb_players=30, last_year=2020)
+    assert [len(written[kind]) for kind in ['bootstrap', 'fixtures', 'player-details']] == [6, 3, 2]
+
+    df_bootstrap = pb.preprocess_dataset(
+        tmp_path / struc.DIR_RAW_BOOTSTRAP.name, tmp_path / struc.DIR_RAW_FIXTURES.name
+    )
+    assert sorted(df_bootstrap[fld.SEASON_NAME].unique()) == ['2018/19', '2020/21']
+    assert df_bootstrap.groupby([fld.SEASON_ID, fld.GW]).size().eq(30).all()
+
+    df_historical = ch.build_bootstrap_dataset(tmp_path / struc.DIR_RAW_PLAYER_DETAILS.name)
+    assert df_historical[fld.PLAYER_ID].nunique() == 30
+
+
+def test_benchmark_compare(tmp_path: Path):
+    sizes = {'nb_seasons': 1, 'nb_snapshots': 2, 'nb_players': 40}
+    df_scale = benchmark.run_scale('tiny', tmp_path / 'work', sizes=sizes)
+    assert df_scale[metrics.STAGE].str.split('.').str[-1].tolist() == ['run', 'run', 'run', 'run', 'select_team']
+    assert (df_scale[metrics.STATUS] == 'ok').all()
+
+    results_path = tmp_path / 'benchmarks.jsonl'
+    for run_id in ['2020-01-01T00:00:00', '2020-01-02T00:00:00']:
+        df_results = df_scale.assign(**{benchmark.RUN_ID: run_id})
+        with results_path.open('a') as f_out:
+            f_out.write(df_results.to_json(orient='records', lines=True) + '\n')
+    df_compare = benchmark.compare(results_path)
+    assert len(df_compare) == 5
+    assert not df_compare['regression'].any()
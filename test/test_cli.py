@@ -0,0 +1,28 @@
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from fpl import cli
+
+
+def test_build_parser():
+    args = cli.build_parser().parse_args(['--metrics', 'preprocess', '--workers', '4', '--incremental'])
+    assert args.func is cli.cmd_preprocess
+    assert (args.metrics, args.workers, args.incremental, args.horizon) == (True, 4, True, 0)
+
+    args = cli.build_parser().parse_args(['scrape', 'history', '--nb-managers', '10'])
+    assert (args.func, args.target, args.nb_managers) == (cli.cmd_scrape, 'history', 10)
+
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(['scrape', 'unknown'])
+
+
+def test_lazy_imports(tmp_path: Path):
+    # Neither the heavy dependencies nor the log file are loaded / created before a command runs
+    code = 'import sys, fpl.cli; print(sorted({"pandas", "pulp", "numpy"} & set(sys.modules)))'
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=tmp_path, capture_output=True, text=True, check=True,
+        env={'PYTHONPATH': str(Path(cli.__file__).parent.parent)}
+    )
+    assert result.stdout.strip() == '[]'
+    assert not list(tmp_path.iterdir())
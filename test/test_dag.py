@@ -0,0 +1,99 @@
+from functools import partial
+from pathlib import Path
+import pytest
+from fpl.pipeline import dag
+
+
+def copy_upper(input_path: Path, output_path: Path):
+    output_path.write_text(input_path.read_text().upper())
+
+
+def concat(input_paths, output_path: Path):
+    output_path.write_text('|'.join(path.read_text() for path in input_paths))
+
+
+def get_stages(tmp_path: Path):
+    raw_a, raw_b = tmp_path / 'raw-a.txt', tmp_path / 'raw-b.txt'
+    inter_a, inter_b, result = tmp_path / 'inter-a.txt', tmp_path / 'inter-b.txt', tmp_path / 'result.txt'
+    return [
+        dag.Stage('combine', partial(concat, [inter_a, inter_b], result), inputs=[inter_a, inter_b], outputs=[result]),
+        dag.Stage('a', partial(copy_upper, raw_a, inter_a), inputs=[raw_a], outputs=[inter_a]),
+        dag.Stage('b', partial(copy_upper, raw_b, inter_b), inputs=[raw_b], outputs=[inter_b]),
+    ]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_pipeline(tmp_path: Path, workers: int):
+    (tmp_path / 'raw-a.txt').write_text('a')
+    (tmp_path / 'raw-b.txt').write_text('b')
+    state_path = tmp_path / 'state.json'
+
+    assert dag.get_dependencies(get_stages(tmp_path)) == {'combine': {'a', 'b'}, 'a': set(), 'b': set()}
+    assert dag.run_pipeline(get_stages(tmp_path), state_path, workers) == {'a': True, 'b': True, 'combine': True}
+    assert (tmp_path / 'result.txt').read_text() == 'A|B'
+
+    # Nothing changed
+    assert dag.run_pipeline(get_stages(tmp_path), state_path, workers) == {'a': False, 'b': False, 'combine': False}
+
+    # Only the stages downstream of the change run
+    (tmp_path / 'raw-b.txt').write_text('c')
+    assert dag.run_pipeline(get_stages(tmp_path), state_path, workers) == {'a': False, 'b': True, 'combine': True}
+    assert (tmp_path / 'result.txt').read_text() == 'A|C'
+
+    # Input rewritten with the same content: skipped
+    (tmp_path / 'raw-a.txt').write_text('a')
+    assert not dag.run_pipeline(get_stages(tmp_path), state_path, workers)['a']
+
+    # The stage runs but its output is unchanged: the next stage is skipped
+    (tmp_path / 'raw-b.txt').write_text('C')
+    assert dag.run_pipeline(get_stages(tmp_path), state_path, workers) == {'a': False, 'b': True, 'combine': False}
+
+    # Missing output
+    (tmp_path / 'result.txt').unlink()
+    assert dag.run_pipeline(get_stages(tmp_path), state_path, workers)['combine']
+
+
+def test_get_dependencies_cycle(tmp_path: Path):
+    stages = [
+        dag.Stage('a', print, inputs=[tmp_path / 'x'], outputs=[tmp_path / 'y']),
+        dag.Stage('b', print, inputs=[tmp_path / 'y'], outputs=[tmp_path / 'x'])
+    ]
+    with pytest.raises(ValueError):
+        dag.get_dependencies(stages)
+
+
+def test_hash_inputs_ignored_files(tmp_path: Path):
+    raw = tmp_path / 'raw'
+    raw.mkdir()
+    (raw / '20200101-history.csv').write_text('a')
+    stage = dag.Stage('a', print, inputs=[raw], outputs=[])
+    digest = dag.hash_inputs(stage, {})
+
+    # Checkpoints, manifests and partial files change at each scrape without changing the data
+    (raw / '.20200101-history.csv.checkpoint').write_text('1')
+    (raw / '20200102-players.manifest').write_text('{}')
+    (raw / '20200102-players.json.partial').write_text('{')
+    (raw / '.state').mkdir()
+    (raw / '.state' / 'run.json').write_text('{}')
+    assert dag.hash_inputs(stage, {}) == digest
+
+    (raw / '20200102-history.csv').write_text('b')
+    assert dag.hash_inputs(stage, {}) != digest
+
+
+def test_get_stages():
+    stages = {stage.name: stage for stage in dag.get_stages(workers=3, incremental=True, horizon=2)}
+    for name in ['bootstrap', 'historical', 'features']:
+        assert stages[name].func.keywords['incremental']
+    assert stages['bootstrap'].func.keywords['workers'] == 3
+
+
+@pytest.mark.parametrize('workers, stage_workers, expected', [
+    (1, None, (1, 1)),
+    (2, None, (2, 1)),
+    (8, None, (2, 4)),
+    (8, 1, (1, 8)),
+    (3, 5, (3, 1))
+])
+def test_split_workers(workers, stage_workers, expected):
+    assert dag.split_workers(workers, stage_workers) == expected
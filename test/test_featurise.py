@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+import constants.fields as fld
+from fpl.utils.featurise import add_lags, add_prev_groupby
+
+
+def get_player_weeks():
+    return pd.DataFrame({
+        fld.PLAYER_ID: [100, 100, 100, 200, 200, 100],
+        fld.SEASON_ID: [15, 15, 15, 15, 15, 16],
+        fld.GW: [3, 1, 2, 1, 3, 1],
+        fld.RESULT_POINTS: [6, 2, 1, 8, 3, 5],
+        fld.PLAYER_POSITION: pd.Categorical(['MID', 'MID', 'MID', 'FWD', 'FWD', 'MID'])
+    })
+
+
+def test_add_prev_groupby():
+    df_result = add_prev_groupby(get_player_weeks(), [fld.PLAYER_ID, fld.SEASON_ID], fld.GW, [fld.RESULT_POINTS])
+    # Gameweek 2 is missing for player 200: no previous value for gameweek 3
+    expected = pd.array([1, np.nan, 2, np.nan, np.nan, np.nan], dtype='Int64')
+    assert_frame_equal(df_result[[fld.RESULT_POINTS + '_prev']], pd.DataFrame({fld.RESULT_POINTS + '_prev': expected}))
+    assert_frame_equal(df_result.iloc[:, :5], get_player_weeks())
+
+
+def test_add_lags_multiple():
+    df_result = add_lags(
+        get_player_weeks(), [fld.PLAYER_ID, fld.SEASON_ID], fld.GW, [fld.RESULT_POINTS, fld.PLAYER_POSITION],
+        lags=[1, 2]
+    )
+    assert df_result[fld.RESULT_POINTS + '_prev_2'].tolist()[:4] == [2, pd.NA, pd.NA, pd.NA]
+    assert df_result[fld.RESULT_POINTS + '_prev_2'].iloc[4] == 8
+    assert df_result[fld.PLAYER_POSITION + '_prev'].dtype == 'category'
+    assert df_result[fld.PLAYER_POSITION + '_prev'].tolist()[:3] == ['MID', np.nan, 'MID']
+
+
+def test_add_lags_duplicates():
+    df = pd.concat([get_player_weeks(), get_player_weeks().iloc[:1]])
+    with pytest.raises(ValueError):
+        add_lags(df, [fld.PLAYER_ID, fld.SEASON_ID], fld.GW, fld.RESULT_POINTS)
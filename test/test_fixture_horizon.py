@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pipeline.transform.preprocess_bootstrap as pb
+from pipeline.transform.fixture_horizon import build_fixture_horizon
+import constants.fields as fld
+
+TEST_RESOURCES = Path(__file__).parent / 'test-resources'
+BOOTSTRAP_2020_21 = TEST_RESOURCES.joinpath('20210114_bootstrap_static.json')
+FIXTURES_2020_21 = TEST_RESOURCES.joinpath('20210101_fixtures.json')
+
+
+def test_fixture_horizon_lookup():
+    fixture_json = json.load(FIXTURES_2020_21.open(encoding='utf-8'))
+    horizon = build_fixture_horizon(fixture_json)
+    df_fixtures = pb.get_fixtures_info(fixture_json, gameweek=19)
+    for record in df_fixtures.to_dict('records'):
+        games = horizon.lookup(record[fld.TEAM_ID_SEASON], 19)
+        assert len(games) == record[fld.GAME_NB]
+        assert games[0][fld.TEAM_ID_SEASON] == record[fld.GAME_1_TEAM_ID_SEASON]
+        assert games[0][fld.GAME_1_HOME] == record[fld.GAME_1_HOME]
+    # Each scheduled game is seen by both teams (postponed games have no gameweek)
+    assert horizon.game_nb.sum() == 2 * len([fixture for fixture in fixture_json if fixture['event'] is not None])
+    assert horizon.lookup(1, 100) == []
+
+
+def test_get_team_info_2020_21_horizon():
+    bootstrap_json = json.load(BOOTSTRAP_2020_21.open(encoding='utf-8'))
+    fixture_json = json.load(FIXTURES_2020_21.open(encoding='utf-8'))
+    df = pb.get_team_info_v2(bootstrap_json, fixture_json, horizon=3)
+    df_next = pb.get_team_info_v2(bootstrap_json, fixture_json)
+    assert len(df) == len(df_next)
+    # The first gameweek of the horizon is the next gameweek
+    np.testing.assert_array_equal(df[fld.FIXTURE_K_GAME_NB.format(1)], df_next[fld.GAME_NB].fillna(0))
+    total = sum(df[fld.FIXTURE_K_GAME_NB.format(k)] for k in range(1, 4))
+    np.testing.assert_array_equal(df[fld.FIXTURE_HORIZON_GAME_NB], total)
+    single = df[fld.GAME_NB] == 1
+    np.testing.assert_allclose(
+        df.loc[single, fld.FIXTURE_K_OPPONENT_STRENGTH.format(1)], df.loc[single, fld.GAME_1_TEAM_STRENGTH]
+    )
+
+
+def test_fixture_horizon_no_gameweek():
+    # Pre-season: the fixtures have no gameweek yet
+    fixture_json = json.load(FIXTURES_2020_21.open(encoding='utf-8'))
+    for fixture in fixture_json:
+        fixture['event'] = None
+    assert pb.get_fixtures_info(fixture_json, gameweek=1).empty
+
+    df_team = pd.DataFrame({fld.TEAM_ID_SEASON: [1, 2], fld.TEAM_STRENGTH: [3, 4]})
+    df = pb.get_fixture_horizon_info(fixture_json, df_team, gameweek=1, horizon=2)
+    assert len(df) == 2
+    assert (df[[fld.FIXTURE_K_GAME_NB.format(1), fld.FIXTURE_HORIZON_GAME_NB]] == 0).all().all()
+    assert df[fld.FIXTURE_HORIZON_OPPONENT_STRENGTH].isna().all()
+
+
+def test_fixture_horizon_end_of_season():
+    # After the last gameweek: no game in the horizon, whatever the fixtures of the season
+    fixture_json = json.load(FIXTURES_2020_21.open(encoding='utf-8'))
+    horizon = build_fixture_horizon(fixture_json, {team: 3 for team in range(1, 21)})
+    df = horizon.to_features(None, horizon=3)
+    assert len(df) == len(horizon.teams)
+    counts = [fld.FIXTURE_HORIZON_GAME_NB] + [
+        field.format(k) for k in range(1, 4) for field in [fld.FIXTURE_K_GAME_NB, fld.FIXTURE_K_HOME_NB]
+    ]
+    strengths = [fld.FIXTURE_HORIZON_OPPONENT_STRENGTH] + [
+        fld.FIXTURE_K_OPPONENT_STRENGTH.format(k) for k in range(1, 4)
+    ]
+    assert set(df.columns) == {fld.TEAM_ID_SEASON, *counts, *strengths}
+    assert (df[counts] == 0).all().all()
+    assert df[strengths].isna().all().all()
@@ -1,8 +1,11 @@
+import json
 import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
 import constants.fields as fld
-from pipeline.transform.clean_historical import add_avg_prev_season, TOTAL_POINTS
+from pipeline.transform.clean_historical import (
+    add_avg_prev_season, build_bootstrap_dataset, update_history_cache, update_historical_incremental, TOTAL_POINTS
+)
 pd.options.display.max_columns = 5
 
 
@@ -23,3 +26,71 @@ def test_simple():
     df_result = add_avg_prev_season(df_input)
 
     assert_frame_equal(df_result, df_expected)
+
+
+def history(player_id, seasons_points):
+    past = [
+        {'element_code': player_id, 'season': season, TOTAL_POINTS: points} for season, points in seasons_points
+    ]
+    return json.dumps({'fixtures': [], 'history': [], 'history_past': past}) + '\n'
+
+
+def test_build_bootstrap_dataset(tmp_path):
+    # Same histories in both snapshots, a new season in the second one
+    (tmp_path / '20200801_player_details.json').write_text(
+        history(100, [(9, 38), (10, 76)]) + history(200, []), encoding='utf-8'
+    )
+    (tmp_path / '20210801_player_details.json').write_text(
+        history(100, [(9, 38), (10, 76), (11, 19)]) + history(200, [(11, 0)]), encoding='utf-8'
+    )
+
+    df_expected = pd.DataFrame({
+        fld.PLAYER_ID: [100, 100, 100, 100, 200, 200],
+        fld.SEASON_ID: [9, 10, 11, 12, 11, 12],
+        fld.STAT_POINTS_AVG_SEASON_PREV: [np.nan, 1.0, 2.0, 0.5, np.nan, 0.0]
+    })
+    df_result = build_bootstrap_dataset(tmp_path, workers=2)
+    assert_frame_equal(df_result.sort_values([fld.PLAYER_ID, fld.SEASON_ID]).reset_index(drop=True), df_expected)
+
+
+def test_update_historical_incremental(tmp_path):
+    dir_raw = tmp_path / 'raw'
+    dir_raw.mkdir()
+    args = (dir_raw, tmp_path / 'cache', tmp_path / 'historical.parquet')
+    (dir_raw / '20200801_player_details.json').write_text(
+        history(100, [(9, 38), (10, 76)]) + history(200, [(10, 0)]), encoding='utf-8'
+    )
+    update_historical_incremental(*args)
+
+    # Unchanged snapshot: nothing to parse
+    (dir_raw / '20200901_player_details.json').write_text(
+        history(100, [(9, 38), (10, 76)]) + history(200, [(10, 0)]), encoding='utf-8'
+    )
+    assert update_history_cache(dir_raw, tmp_path / 'cache') == set()
+
+    # Corrected total of player 200: only this player is recomputed
+    (dir_raw / '20201001_player_details.json').write_text(
+        history(100, [(9, 38), (10, 76)]) + history(200, [(10, 19)]), encoding='utf-8'
+    )
+    df_result = update_historical_incremental(*args)
+    df_expected = build_bootstrap_dataset(dir_raw)
+    sort_fields = [fld.PLAYER_ID, fld.SEASON_ID]
+    assert_frame_equal(
+        df_result.sort_values(sort_fields).reset_index(drop=True),
+        df_expected.sort_values(sort_fields).reset_index(drop=True),
+        check_dtype=False
+    )
+    assert df_result.loc[df_result[fld.PLAYER_ID] == 200, fld.STAT_POINTS_AVG_SEASON_PREV].max() == 0.5
+
+
+def test_history_cache_layout(tmp_path):
+    # Same history written with another key order, spacing and an array after history_past: same cache entry
+    dir_raw = tmp_path / 'raw'
+    dir_raw.mkdir()
+    (dir_raw / '20200801_player_details.json').write_text(history(100, [(9, 38), (10, 76)]), encoding='utf-8')
+    assert update_history_cache(dir_raw, tmp_path / 'cache') == {100}
+
+    past = [{TOTAL_POINTS: points, 'season': season, 'element_code': 100} for season, points in [(9, 38), (10, 76)]]
+    line = json.dumps({'history_past': past, 'fixtures': [], 'history': [{'round': 1}]}, indent=1)
+    (dir_raw / '20200901_player_details.json').write_text(line.replace('\n', ' ') + '\n', encoding='utf-8')
+    assert update_history_cache(dir_raw, tmp_path / 'cache') == set()
@@ -0,0 +1,58 @@
+import pstats
+from pathlib import Path
+import pandas as pd
+import pytest
+from fpl.utils import metrics
+
+
+@metrics.instrument(name='inner', outputs=['output_path'])
+def write_rows(df: pd.DataFrame, output_path: Path) -> pd.DataFrame:
+    output_path.write_text(df.to_csv())
+    return df.head(2)
+
+
+@metrics.instrument(name='outer')
+def run(df: pd.DataFrame, output_path: Path) -> pd.DataFrame:
+    return write_rows(df, output_path)
+
+
+@metrics.instrument(name='failing')
+def fail():
+    raise RuntimeError('Stage failed')
+
+
+@pytest.fixture
+def metrics_path(tmp_path: Path):
+    metrics_path = tmp_path / 'metrics.jsonl'
+    metrics.configure(metrics_path, tmp_path / 'profiles')
+    yield metrics_path
+    metrics.configure(None, None)
+
+
+def test_instrument(tmp_path: Path, metrics_path: Path):
+    df = pd.DataFrame({'a': range(5)})
+    output_path = tmp_path / 'output.csv'
+    assert run(df, output_path).equals(df.head(2))
+    with pytest.raises(RuntimeError):
+        fail()
+
+    df_metrics = metrics.read_metrics(metrics_path).set_index(metrics.STAGE)
+    assert list(df_metrics.index) == ['inner', 'outer', 'failing']
+    assert df_metrics.loc['inner', metrics.PARENT] == 'outer'
+    assert df_metrics.loc['inner', metrics.ROWS_IN] == 5
+    assert df_metrics.loc['inner', metrics.ROWS_OUT] == 2
+    assert df_metrics.loc['inner', metrics.BYTES_OUT] == output_path.stat().st_size
+    assert df_metrics.loc['outer', metrics.WALL_S] >= df_metrics.loc['inner', metrics.WALL_S]
+    assert df_metrics.loc['outer', metrics.PEAK_RSS_MB] >= df_metrics.loc['inner', metrics.PEAK_RSS_MB] > 0
+    assert df_metrics.loc['failing', metrics.STATUS] == 'error'
+
+    # Only the outermost stage is profiled
+    assert pd.isna(df_metrics.loc['inner', metrics.PROFILE])
+    stats = pstats.Stats(df_metrics.loc['outer', metrics.PROFILE])
+    assert any(function_name == 'write_rows' for _, _, function_name in stats.stats)
+
+
+def test_instrument_disabled(tmp_path: Path):
+    metrics.configure(None, None)
+    run(pd.DataFrame({'a': range(5)}), tmp_path / 'output.csv')
+    assert not list(tmp_path.glob('*.jsonl'))
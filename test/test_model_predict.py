@@ -2,6 +2,8 @@ import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
 import constants.fields as fld
+from fpl import main
+from fpl.model import predict
 from fpl.model.predict import predict_simple
 
 
@@ -21,3 +23,13 @@ def test_predict_simple():
     assert_frame_equal(predict_simple(df_simple), df_expected)
 
 
+def test_run_no_partition(tmp_path, monkeypatch):
+    monkeypatch.setattr(predict, 'DIR_PROC_FEATURES', tmp_path / 'features')
+    monkeypatch.setattr(predict, 'DIR_PREDICTIONS', tmp_path / 'predictions')
+    assert predict.run(reload_data=False, seasons=[15], gameweeks=[1]).empty
+    assert not (tmp_path / 'predictions').exists()
+
+
+def test_select_weekly_players_no_features(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'DIR_PROC_FEATURES', tmp_path / 'features')
+    assert main.select_weekly_players() is None
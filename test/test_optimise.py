@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+import constants.fields as fld
+from fpl import milp, optimise
+from fpl.manager_player import PlayerRole
+
+
+def get_players(nb_players: int = 120, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        fld.PLAYER_ID: np.arange(nb_players) + 1,
+        fld.PLAYER_COST: rng.integers(40, 130, nb_players),
+        fld.ML_PREDICT: rng.uniform(0, 10, nb_players).round(2),
+        fld.PLAYER_POSITION: np.array(['GKP', 'DEF', 'MID', 'FWD'])[np.arange(nb_players) % 4],
+        fld.TEAM_NAME: 'Team ' + pd.Series(rng.integers(1, 21, nb_players)).astype(str)
+    })
+
+
+def check_team(selection: pd.DataFrame, value_team: int = 1000):
+    assert len(selection) == optimise.SQUAD_SIZE
+    assert selection[fld.PLAYER_ID].is_unique
+    assert selection[fld.PLAYER_COST].sum() <= value_team
+    assert selection[fld.PLAYER_POSITION].value_counts().to_dict() == optimise.SQUAD_POSITIONS
+    assert selection[fld.TEAM_NAME].value_counts().max() <= optimise.MAX_BY_TEAM
+    assert (selection[optimise.SQUAD_ROLE] == PlayerRole.CAPTAIN).sum() == 1
+
+
+@pytest.mark.parametrize('backend', [milp.BACKEND_SCIPY, milp.BACKEND_PULP])
+def test_select_team(backend, capsys):
+    df_players = get_players()
+    selection = optimise.select_team(df_players, backend=backend)
+    check_team(selection)
+    assert isinstance(selection, pd.DataFrame)
+    # The result is logged, nothing printed
+    assert capsys.readouterr().out == ''
+
+    # Same optimum whatever the backend
+    reference = optimise.select_team(df_players, backend=milp.BACKEND_AUTO)
+    assert selection[fld.ML_PREDICT].sum() == pytest.approx(reference[fld.ML_PREDICT].sum())
+
+    # The captain is the best player of the squad
+    is_captain = selection[optimise.SQUAD_ROLE] == PlayerRole.CAPTAIN
+    assert selection.loc[is_captain, fld.ML_PREDICT].iloc[0] / 2 >= selection.loc[~is_captain, fld.ML_PREDICT].max()
+
+
+def test_select_team_transfers():
+    df_players = get_players()
+    existing_team = list(optimise.select_team(df_players, value_team=800)[fld.PLAYER_ID])
+    selection = optimise.select_team(df_players, free_transfers=1, existing_team=existing_team)
+    check_team(selection)
+    assert (~selection[fld.PLAYER_ID].isin(existing_team)).sum() <= 1
+
+
+@pytest.mark.parametrize('backend', [milp.BACKEND_SCIPY, milp.BACKEND_PULP])
+def test_select_team_infeasible(backend):
+    # Not enough players to build a squad
+    df_players = get_players()
+    selection = optimise.select_team(df_players.head(8), backend=backend)
+    assert selection.empty
+
+    optimiser = optimise.TeamOptimiser(df_players, backend=backend)
+    optimiser.exclude(df_players[fld.PLAYER_ID].head(100))
+    assert optimiser.solve().empty
+    assert optimiser.result.status == milp.STATUS_INFEASIBLE
+    assert not milp.has_solution(optimiser.result)
+
+
+def test_team_optimiser():
+    df_players = get_players()
+    optimiser = optimise.TeamOptimiser(df_players)
+    squad = list(optimiser.solve()[fld.PLAYER_ID])
+    result = optimiser.result
+
+    # Excluding a player out of the squad keeps the solution (no solve)
+    others = list(df_players.loc[~df_players[fld.PLAYER_ID].isin(squad), fld.PLAYER_ID].head(5))
+    assert list(optimiser.what_if(sell=others)[fld.PLAYER_ID]) == squad
+    assert optimiser.result is result
+
+    # Same squad as a new model without the player sold, and the state is restored afterwards
+    selection = optimiser.what_if(sell=squad[:1])
+    check_team(selection)
+    expected = optimise.select_team(df_players[df_players[fld.PLAYER_ID] != squad[0]])
+    assert selection[fld.ML_PREDICT].sum() == pytest.approx(expected[fld.ML_PREDICT].sum())
+    assert list(optimiser.solve()[fld.PLAYER_ID]) == squad
+
+    # Updates in place
+    optimiser.lock(others[:1])
+    optimiser.set_budget(900)
+    selection = optimiser.solve()
+    check_team(selection, value_team=900)
+    assert others[0] in set(selection[fld.PLAYER_ID])
+
+    optimiser.unlock(others[:1])
+    optimiser.set_predictions(pd.Series({others[0]: 100.}))
+    assert optimiser.solve()[fld.ML_PREDICT].max() == pytest.approx(200)
+
+    with pytest.raises(KeyError):
+        optimiser.exclude([-1])
+
+
+def test_team_optimiser_contradictory():
+    df_players = get_players()
+    optimiser = optimise.TeamOptimiser(df_players)
+    optimiser.exclude([1, 2])
+    with pytest.raises(ValueError, match=r'\[2\] are excluded'):
+        optimiser.lock([3, 2])
+    optimiser.lock([3])
+    with pytest.raises(ValueError, match=r'\[3\] are locked'):
+        optimiser.exclude([3])
+    with pytest.raises(ValueError):
+        optimiser.what_if(sell=[4], buy=[4])
+
+    # Allowed once the previous constraint is removed
+    optimiser.include([2])
+    optimiser.lock([2])
+    optimiser.unlock([3])
+    optimiser.exclude([3])
+    selection = optimiser.solve()
+    check_team(selection)
+    assert 2 in set(selection[fld.PLAYER_ID])
+    assert not {1, 3} & set(selection[fld.PLAYER_ID])
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+import constants.fields as fld
+from fpl import milp, optimise, planner
+from fpl import manager
+from fpl.manager import ManagerTeam
+from test_optimise import check_team
+from test_optimise import get_players as get_pool
+
+
+def get_players(nb_players: int = 120, seed: int = 0) -> pd.DataFrame:
+    # Id of the season ('element' of the api) different from the id of the player, as in the bootstrap
+    df_players = get_pool(nb_players, seed)
+    return df_players.assign(**{fld.PLAYER_ID_SEASON: 1000 - df_players[fld.PLAYER_ID]})
+
+
+def get_points(df_players: pd.DataFrame, nb_gw: int = 3, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 10, (len(df_players), nb_gw)).round(2)
+    return pd.DataFrame(points, index=df_players[fld.PLAYER_ID_SEASON], columns=range(10, 10 + nb_gw))
+
+
+def get_team(df_players: pd.DataFrame, df_points: pd.DataFrame, free_transfers: int = 1) -> ManagerTeam:
+    # Team fetched from the api: picks of the elements of the season
+    df_gw = df_players.assign(**{fld.ML_PREDICT: df_points.iloc[:, 0].to_numpy()})
+    squad = optimise.TeamOptimiser(df_gw, value_team=950).solve()
+    picks = [
+        {'element': element, 'position': position, 'is_captain': False, 'is_vice_captain': False,
+         'purchase_price': cost, 'selling_price': cost - 1}
+        for position, (element, cost) in enumerate(zip(squad[fld.PLAYER_ID_SEASON], squad[fld.PLAYER_COST]), 1)
+    ]
+    manager_info = {
+        'helper': {'bank': 1000 - squad[fld.PLAYER_COST].sum(), 'transfers_state': {'free': free_transfers}},
+        'picks': picks
+    }
+    team = ManagerTeam()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(manager, 'scrape_manager_team', lambda email, password: manager_info)
+        team.fetch_fpl_info('email', 'password')
+    return team
+
+
+def test_new_team():
+    # Without a team, a single gameweek is the selection of the squad
+    df_players = get_players()
+    df_points = get_points(df_players, nb_gw=1)
+    plan = planner.plan_transfers(df_players, df_points, ManagerTeam(money=1000))
+    expected = optimise.select_team(df_players.assign(**{fld.ML_PREDICT: df_points.iloc[:, 0].to_numpy()}))
+    assert plan.result.objective == pytest.approx(expected[fld.ML_PREDICT].sum())
+    assert plan.df_gameweeks[planner.NB_TRANSFERS].iloc[0] == 15
+    assert plan.df_gameweeks[planner.HITS].iloc[0] == 0
+
+
+@pytest.mark.parametrize('hit_cost', [0, 4, 1000])
+def test_plan_transfers(hit_cost):
+    df_players = get_players()
+    df_points = get_points(df_players)
+    team = get_team(df_players, df_points)
+    plan = planner.plan_transfers(df_players, df_points, team, hit_cost=hit_cost, max_free_transfers=2)
+
+    df_squads = plan.df_squads.merge(df_players, on=fld.PLAYER_ID_SEASON)
+    squad = {player.id_season for player in team.players}
+    bank = team.money_bank
+    free_transfers = team.free_transfers
+    for gw, week in plan.df_gameweeks.set_index(fld.GW).iterrows():
+        check_team(df_squads[df_squads[fld.GW] == gw], value_team=np.inf)
+
+        # Squad and bank follow the transfers
+        df_transfers = plan.df_transfers[plan.df_transfers[fld.GW] == gw]
+        bought = df_transfers[df_transfers[planner.TRANSFER] == planner.TRANSFER_IN]
+        sold = df_transfers[df_transfers[planner.TRANSFER] == planner.TRANSFER_OUT]
+        squad = (squad - set(sold[fld.PLAYER_ID_SEASON])) | set(bought[fld.PLAYER_ID_SEASON])
+        assert squad == set(df_squads.loc[df_squads[fld.GW] == gw, fld.PLAYER_ID_SEASON])
+        bank += sold[planner.TRANSFER_PRICE].sum() - bought[planner.TRANSFER_PRICE].sum()
+        assert week[planner.BANK] == pytest.approx(bank)
+        assert bank >= 0
+
+        # Free transfers banked, hits for the extra ones
+        assert week[planner.FREE_TRANSFERS] == free_transfers
+        assert week[planner.HITS] == max(week[planner.NB_TRANSFERS] - free_transfers, 0)
+        free_transfers = min(max(free_transfers - week[planner.NB_TRANSFERS], 0) + 1, 2)
+    if hit_cost == 1000:
+        assert plan.df_gameweeks[planner.HITS].sum() == 0
+
+    points = plan.df_gameweeks[planner.POINTS].sum() - hit_cost * plan.df_gameweeks[planner.HITS].sum()
+    assert plan.result.objective == pytest.approx(points)
+
+
+def test_rolling_horizon():
+    df_players = get_players()
+    df_points = get_points(df_players, nb_gw=4)
+    team = get_team(df_players, df_points)
+    plans = planner.rolling_horizon(df_players, df_points, team, horizon=2, nb_candidates=15, mip_rel_gap=0.)
+    assert [list(plan.df_gameweeks[fld.GW]) for plan in plans] == [[10, 11], [11, 12], [12, 13], [13]]
+
+    # Each plan starts from the squad of the first gameweek of the previous one
+    for previous, plan in zip(plans, plans[1:]):
+        first_gw = previous.df_squads[previous.df_squads[fld.GW] == previous.df_gameweeks[fld.GW].iloc[0]]
+        team = planner.apply_first_gameweek(previous, team, max_free_transfers=planner.MAX_FREE_TRANSFERS)
+        assert {player.id_season for player in team.players} == set(first_gw[fld.PLAYER_ID_SEASON])
+        assert plan.df_gameweeks[planner.FREE_TRANSFERS].iloc[0] == team.free_transfers
+        assert plan.df_gameweeks[planner.BANK].iloc[0] >= 0
+
+
+@pytest.mark.parametrize('backend', [milp.BACKEND_SCIPY, milp.BACKEND_PULP])
+def test_plan_transfers_infeasible(backend):
+    # Not enough players to build a squad
+    df_players = get_players().head(8)
+    plan = planner.plan_transfers(df_players, get_points(df_players), ManagerTeam(money=1000), backend=backend)
+    assert plan.result.status == milp.STATUS_INFEASIBLE
+    assert plan.df_gameweeks.empty and plan.df_squads.empty and plan.df_transfers.empty
@@ -1,6 +1,9 @@
 import json
+import shutil
 from pathlib import Path
 import pipeline.transform.preprocess_bootstrap as pb
+import constants.fields as fld
+from fpl.pipeline import storage
 import pandas as pd
 
 from utils import assert_df_csv_no_index
@@ -58,6 +61,15 @@ def test_get_player_info_2020_21():
     assert_df_csv_no_index(df, TEST_RESOURCES.joinpath('bootstrap_player_info_2020_21.csv'))
 
 
+def test_load_bootstrap_sections():
+    bootstrap_json = pb.load_bootstrap(BOOTSTRAP_2020_21)
+    assert set(bootstrap_json) == {'elements', 'teams', 'element_types', 'events'}
+    df = pb.get_player_info(bootstrap_json)
+    assert df[fld.FPL_SELECTED_BY].dtype == 'float64'
+    assert df[fld.PLAYER_COST].dtype == 'int64'
+    assert_df_csv_no_index(df, TEST_RESOURCES.joinpath('bootstrap_player_info_2020_21.csv'))
+
+
 def test_get_position_info_2017_18():
     df = pb.get_position_info(json.load(BOOTSTRAP_2017_18.open(encoding='utf-8')))
     df_expected = pd.DataFrame({'position_id': [1, 2, 3, 4], 'player_position': ['GKP', 'DEF', 'MID', 'FWD']})
@@ -144,3 +156,88 @@ def test_get_week_info_2020_21_end():
         fixtures_json=json.load(FIXTURES_2020_21.open(encoding='utf-8'))
     )
     assert_df_csv_no_index(df, TEST_RESOURCES.joinpath('bootstrap_week_info_2020_21_end.csv'))
+
+
+def test_select_snapshots_index(tmp_path):
+    dir_bootstrap = tmp_path / 'bootstrap'
+    dir_fixtures = tmp_path / 'fixtures'
+    dir_bootstrap.mkdir()
+    dir_fixtures.mkdir()
+    for path in [BOOTSTRAP_2017_18, BOOTSTRAP_2020_21, BOOTSTRAP_2020_21_END]:
+        shutil.copy(path, dir_bootstrap)
+    for path in [FIXTURES_2019_20_COVID, FIXTURES_2020_21]:
+        shutil.copy(path, dir_fixtures)
+    index_path = tmp_path / 'index.csv'
+
+    bootstrap_paths, fixture_paths = pb.select_snapshots(dir_bootstrap, dir_fixtures, index_path)
+    assert {k: p.name for k, p in bootstrap_paths.items()} == {'2017/18_21': BOOTSTRAP_2017_18.name,
+                                                               '2020/21_18': BOOTSTRAP_2020_21.name,
+                                                               '2020/21_38': BOOTSTRAP_2020_21_END.name}
+    assert {k: p.name for k, p in fixture_paths.items()} == {'2019/20': FIXTURES_2019_20_COVID.name,
+                                                             '2020/21': FIXTURES_2020_21.name}
+    assert len(pd.read_csv(index_path)) == 5
+
+    # Second scan only uses the index
+    bootstrap_paths_2, fixture_paths_2 = pb.select_snapshots(dir_bootstrap, dir_fixtures, index_path)
+    assert bootstrap_paths_2 == bootstrap_paths
+    assert fixture_paths_2 == fixture_paths
+
+
+def test_extract_weeks_parallel_same_order():
+    bootstrap_paths = [BOOTSTRAP_2017_18, BOOTSTRAP_2020_21, BOOTSTRAP_2020_21_END]
+    fixture_paths = {'2020/21': FIXTURES_2020_21}
+    serial = pb.extract_weeks(bootstrap_paths, fixture_paths, workers=1)
+    parallel = pb.extract_weeks(bootstrap_paths, fixture_paths, workers=2)
+    for df_serial, df_parallel in zip(serial, parallel):
+        pd.testing.assert_frame_equal(df_serial, df_parallel)
+
+
+def test_update_dataset_incremental(tmp_path):
+    dir_bootstrap = tmp_path / 'bootstrap'
+    dir_fixtures = tmp_path / 'fixtures'
+    dir_bootstrap.mkdir()
+    dir_fixtures.mkdir()
+    shutil.copy(BOOTSTRAP_2020_21, dir_bootstrap)
+    shutil.copy(FIXTURES_2020_21, dir_fixtures)
+    args = (dir_bootstrap, dir_fixtures, tmp_path / 'index.csv', tmp_path / 'weeks', tmp_path / 'partitions')
+
+    assert pb.update_dataset_incremental(*args) == [(15, 18), (15, 19)]
+    # New snapshot: only its partitions are recomputed, unchanged snapshots are skipped
+    shutil.copy(BOOTSTRAP_2020_21_END, dir_bootstrap)
+    assert pb.update_dataset_incremental(*args) == [(15, 38)]
+    assert pb.update_dataset_incremental(*args) == []
+
+    sort_fields = ['season', 'gameweek', 'player_id']
+    df_full = storage.apply_schema(pb.preprocess_dataset(dir_bootstrap, dir_fixtures))
+    df_expected = df_full.sort_values(sort_fields).reset_index(drop=True)
+    df_incremental = storage.read_partitions(tmp_path / 'partitions').sort_values(sort_fields).reset_index(drop=True)
+    pd.testing.assert_frame_equal(df_incremental, df_expected, check_categorical=False)
+
+
+def test_update_dataset_incremental_fixtures(tmp_path):
+    dir_bootstrap = tmp_path / 'bootstrap'
+    dir_fixtures = tmp_path / 'fixtures'
+    dir_bootstrap.mkdir()
+    dir_fixtures.mkdir()
+    shutil.copy(BOOTSTRAP_2020_21, dir_bootstrap)
+    shutil.copy(FIXTURES_2020_21, dir_fixtures)
+    args = (dir_bootstrap, dir_fixtures, tmp_path / 'index.csv', tmp_path / 'weeks', tmp_path / 'partitions')
+    assert pb.update_dataset_incremental(*args) == [(15, 18), (15, 19)]
+    partition = storage.partition_path(tmp_path / 'partitions', 15, 19)
+    mtime_ns = partition.stat().st_mtime_ns
+
+    # Weekly fixtures snapshot: gameweeks 17 and 18 played, the gameweek used by the bootstrap (19) is unchanged
+    fixtures = json.load(FIXTURES_2020_21.open(encoding='utf-8'))
+    for fixture in fixtures:
+        if fixture['event'] in [17, 18]:
+            fixture.update(started=True, finished=True, team_h_score=1, team_a_score=0)
+    (dir_fixtures / '20210120_fixtures.json').write_text(json.dumps(fixtures), encoding='utf-8')
+    assert pb.update_dataset_incremental(*args) == []
+    assert partition.stat().st_mtime_ns == mtime_ns
+
+    # A game of gameweek 19 postponed: only the partitions of the bootstrap are rewritten
+    games_19 = [fixture for fixture in fixtures if fixture['event'] == 19]
+    games_19[0]['started'] = True
+    games_19[1]['event'] = None
+    (dir_fixtures / '20210125_fixtures.json').write_text(json.dumps(fixtures), encoding='utf-8')
+    assert pb.update_dataset_incremental(*args) == [(15, 18), (15, 19)]
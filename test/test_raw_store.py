@@ -0,0 +1,31 @@
+from fpl.pipeline import raw_store
+
+
+def test_list_complete_snapshots(tmp_path):
+    legacy = tmp_path / '20200101_player_detailed_data.json'
+    legacy.write_text('{}\n')
+    complete = tmp_path / '20200102_player_detailed_data.json'
+    complete.write_text('{}\n')
+    raw_store.write_manifest(complete, {'complete': True})
+    incomplete = tmp_path / '20200103_player_detailed_data.json'
+    incomplete.write_text('{}\n')
+    raw_store.write_manifest(incomplete, {'complete': False})
+
+    assert raw_store.list_complete_snapshots(tmp_path) == [legacy, complete]
+
+
+def test_atomic_write_text(tmp_path):
+    path = tmp_path / 'shard.json'
+    raw_store.atomic_write_text(path, 'abc')
+    assert path.read_text() == 'abc'
+    assert [p.name for p in tmp_path.iterdir()] == ['shard.json']
+
+
+def test_open_text_gzip(tmp_path):
+    path = tmp_path / '20200101_fixtures.json.gz'
+    with raw_store.open_text(path, 'w') as f_out:
+        f_out.write('[{"id": 1}]')
+    assert raw_store.get_compression(path) == 'gzip'
+    assert raw_store.snapshot_stem(path) == '20200101_fixtures'
+    assert raw_store.load_json(path) == [{'id': 1}]
+    assert raw_store.list_raw_files(tmp_path) == [path]
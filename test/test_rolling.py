@@ -0,0 +1,96 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+import constants.fields as fld
+from fpl.pipeline.transform import rolling
+
+
+def get_weeks():
+    # Player 100 plays every gameweek, player 200 misses gameweek 3 and joins again, new season for player 100
+    return pd.DataFrame({
+        fld.PLAYER_ID: [100, 200, 100, 200, 100, 100, 200, 100, 100],
+        fld.SEASON_ID: [15, 15, 15, 15, 15, 15, 15, 16, 16],
+        fld.GW: [1, 1, 2, 2, 3, 4, 4, 1, 2],
+        fld.RESULT_POINTS_PREV: [np.nan, np.nan, 2, 6, 8, 1, 3, np.nan, 4],
+        fld.STAT_MINUTES_TOTAL_SEASON: [0, 0, 90, 60, 180, 270, 150, 0, 45]
+    })
+
+
+def test_update_form():
+    df_form, df_state = rolling.update_form(get_weeks(), window=2, alpha=0.5)
+    df_form = df_form.set_index([fld.PLAYER_ID, fld.SEASON_ID, fld.GW])
+
+    player_100 = df_form.loc[(100, 15, 4)]
+    assert player_100[fld.FORM_GAMEWEEKS_NB] == 3
+    assert player_100[fld.FORM_POINTS_AVG_LAST_N] == pytest.approx((8 + 1) / 2)
+    assert player_100[fld.FORM_POINTS_EWMA] == pytest.approx(0.5 * 1 + 0.5 * (0.5 * 8 + 0.5 * 2))
+    assert player_100[fld.FORM_MINUTES_EWMA] == pytest.approx(90)
+    assert player_100[fld.FORM_POINTS_PER_90] == pytest.approx(90 * 11 / 270)
+
+    # Minutes played while the player had no row are counted once he's back
+    player_200 = df_form.loc[(200, 15, 4)]
+    assert player_200[fld.FORM_POINTS_EWMA] == pytest.approx(0.5 * 3 + 0.5 * 6)
+    assert player_200[fld.FORM_MINUTES_EWMA] == pytest.approx(0.5 * 90 + 0.5 * 60)
+
+    # New season: the accumulators start again
+    new_season = df_form.loc[(100, 16, 2)]
+    assert new_season[fld.FORM_GAMEWEEKS_NB] == 1
+    assert new_season[fld.FORM_POINTS_PER_90] == pytest.approx(90 * 4 / 45)
+    assert np.isnan(df_form.loc[(100, 16, 1), fld.FORM_POINTS_EWMA])
+    assert rolling.last_week(df_state) == (16, 2)
+
+
+def test_update_form_incremental(tmp_path: Path):
+    df_weeks = get_weeks()
+    df_form_full, df_state_full = rolling.update_form(df_weeks)
+
+    state_path = tmp_path / 'form-state.parquet'
+    df_form_start, df_state = rolling.update_form(df_weeks[df_weeks[fld.GW] <= 2].iloc[:4])
+    rolling.write_state(df_state, state_path)
+    df_state = rolling.read_state(state_path)
+    df_new = rolling.select_new_weeks(df_weeks, df_state)
+    assert len(df_new) == len(df_weeks) - 4
+    df_form_end, df_state = rolling.update_form(df_new, df_state)
+
+    df_form_incremental = pd.concat([df_form_start, df_form_end], ignore_index=True)
+    assert_frame_equal(df_form_incremental, df_form_full)
+    key = [fld.PLAYER_ID]
+    assert_frame_equal(
+        df_state.sort_values(key).reset_index(drop=True), df_state_full.sort_values(key).reset_index(drop=True),
+        check_dtype=False
+    )
+
+
+def test_update_form_rewind(tmp_path: Path):
+    df_weeks = get_weeks()
+    signatures_path = tmp_path / 'form-weeks.csv'
+    df_form, df_state = rolling.update_form(df_weeks)
+    rolling.write_signatures(rolling.week_signatures(df_weeks), signatures_path)
+
+    # Same rows in another order: nothing changed
+    df_previous = rolling.read_signatures(signatures_path)
+    assert rolling.changed_weeks(rolling.week_signatures(df_weeks.iloc[::-1]), df_previous) == []
+
+    # Gameweek 2 of season 15 recomputed upstream, before the last gameweek of the state
+    df_changed = df_weeks.copy()
+    df_changed.loc[(df_changed[fld.SEASON_ID] == 15) & (df_changed[fld.GW] == 2), fld.RESULT_POINTS_PREV] = 10
+    changed = rolling.changed_weeks(rolling.week_signatures(df_changed), df_previous)
+    assert changed == [(15, 2)]
+    df_rows, df_rewound = rolling.rewind(df_changed, df_state, changed)
+    assert len(df_rows) == len(df_changed)
+    assert df_rewound.empty
+
+    df_form_rewound, df_state_rewound = rolling.update_form(df_rows, df_rewound)
+    df_form_full, df_state_full = rolling.update_form(df_changed)
+    assert_frame_equal(df_form_rewound, df_form_full)
+    assert df_form_rewound[fld.FORM_POINTS_EWMA].tolist() != df_form[fld.FORM_POINTS_EWMA].tolist()
+
+    # Only a new gameweek: no rewind
+    df_new = pd.concat([df_weeks, df_weeks.tail(1).assign(**{fld.GW: 3})], ignore_index=True)
+    changed = rolling.changed_weeks(rolling.week_signatures(df_new), df_previous)
+    assert changed == [(16, 3)]
+    df_rows, df_kept = rolling.rewind(df_new, df_state, changed)
+    assert len(df_rows) == 1
+    assert df_kept is df_state
@@ -1,36 +1,189 @@
 import json
+import time
 from pathlib import Path
-from pipeline.download.scrape import scrape_bootstrap, scrape_fixtures, scrape_manager_history, _extract_season_name
+import pandas as pd
+import pytest
+import requests
+from fpl.pipeline.download import scrape
+from fpl.pipeline.download.scrape import scrape_bootstrap, scrape_fixtures, scrape_manager_history, \
+    _extract_season_name, scrape_player_detailed, set_url_base, URL_BASE
+from fpl.pipeline.download.client import RateLimiter, ScraperClient
+from fpl.pipeline.download.mock_server import MockFplServer
 
 
 TEST_RESOURCES = Path(__file__).parent / 'test-resources'
 
 
-def test_scrape_bootstrap():
-    filepath = scrape_bootstrap(Path('test-output'))
+def test_get_season_name():
+    example_boostrap = TEST_RESOURCES / '20180101-bootstrap-static.json'
+    with example_boostrap.open(encoding='utf-8') as f_in:
+        bootstrap_data = json.load(f_in)
+    assert _extract_season_name(bootstrap_data) == '2017/18'
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(rate=50, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        limiter.acquire()
+    # 5 tokens available immediately, the 10 others refill at 50 per second
+    assert time.monotonic() - start >= 0.18
+
+
+@pytest.fixture
+def mock_api():
+    with MockFplServer(nb_players=120, error_rate=0.1) as server:
+        set_url_base(server.url_base)
+        yield server
+    set_url_base(URL_BASE)
+
+
+def mock_client() -> ScraperClient:
+    return ScraperClient(rate_limit=None, backoff_factor=0.01)
+
+
+def test_scrape_bootstrap_mock(mock_api, tmp_path):
+    filepath = scrape_bootstrap(tmp_path, client=mock_client())
     assert filepath.exists()
+    assert len(json.loads(filepath.read_text())['elements']) == 120
 
 
-def test_scrape_fixtures():
-    filepath = scrape_fixtures(Path('test-output'))
+def test_scrape_fixtures_mock(mock_api, tmp_path):
+    filepath = scrape_fixtures(tmp_path, client=mock_client())
     assert filepath.exists()
 
 
-def test_scrape_manager_history():
-    file_paths = scrape_manager_history(output_dir=Path('test-output'), nb_managers=10, include_current=True)
+def test_scrape_manager_history_mock(mock_api, tmp_path):
+    file_paths = scrape_manager_history(output_dir=tmp_path, nb_managers=10, include_current=True, client=mock_client())
     assert len(file_paths) == 2
     assert file_paths[0].exists()
     assert file_paths[1].exists()
 
 
-def test_scrape_manager_history_past_only():
-    file_paths = scrape_manager_history(output_dir=Path('test-output'), nb_managers=10, include_current=False)
+def test_scrape_manager_history_past_only_mock(mock_api, tmp_path):
+    file_paths = scrape_manager_history(
+        output_dir=tmp_path, nb_managers=10, include_current=False, client=mock_client()
+    )
     assert len(file_paths) == 1
     assert file_paths[0].exists()
 
 
-def test_get_season_name():
-    example_boostrap = TEST_RESOURCES / 'bootstrap-static_2017.json'
-    with example_boostrap.open(encoding='utf-8') as f_in:
-        bootstrap_data = json.load(f_in)
-    assert _extract_season_name(bootstrap_data) == '2017/18'
+def test_scrape_player_detailed_mock(mock_api, tmp_path):
+    client = mock_client()
+    filepath = scrape_player_detailed(tmp_path, shard_size=50, client=client)
+    with filepath.open() as f_in:
+        lines = f_in.readlines()
+    assert len(lines) == 120
+    assert mock_api.nb_errors > 0   # errors were retried
+    assert [p.name for p in tmp_path.iterdir() if p.is_dir()] == []
+
+
+def test_scrape_bootstrap_unchanged_mock(mock_api, tmp_path):
+    first_path = scrape_bootstrap(tmp_path, client=mock_client())
+    second_path = scrape_bootstrap(tmp_path, client=mock_client())
+    assert first_path == second_path
+    assert len(list(tmp_path.glob('*.json'))) == 1
+
+
+class InterruptedClient(ScraperClient):
+    """ Client failing after a number of manager requests (interrupted run) """
+
+    def __init__(self, nb_managers: int):
+        super().__init__(rate_limit=None, backoff_factor=0.01)
+        self.nb_managers = nb_managers
+
+    def get(self, url: str, **kwargs):
+        if '/entry/' in url:
+            with self._bootstrap_lock:
+                self.nb_managers -= 1
+                if self.nb_managers < 0:
+                    raise ConnectionError('interrupted')
+        return super().get(url, **kwargs)
+
+
+def test_scrape_manager_history_resume_mock(mock_api, tmp_path, monkeypatch):
+    with pytest.raises(ConnectionError):
+        scrape_manager_history(
+            output_dir=tmp_path, nb_managers=30, include_current=True, chunk_size=10, max_workers=2,
+            client=InterruptedClient(15)
+        )
+    df_partial = pd.read_csv(next(tmp_path.glob('*_manager_current.csv')))
+    assert df_partial['manager'].nunique() == 10
+
+    # Resumed the next day: same sample and output file, only the remaining managers are fetched
+    monkeypatch.setattr(scrape, '_format_filename', lambda name, extension: f'20990101_{name}.{extension}')
+    file_paths = scrape_manager_history(
+        output_dir=tmp_path, nb_managers=30, include_current=True, chunk_size=10, client=mock_client()
+    )
+    assert file_paths[0].name == next(tmp_path.glob('*_manager_current.csv')).name != '20990101_manager_current.csv'
+    df_current = pd.read_csv(file_paths[0])
+    assert df_current['manager'].nunique() == 30
+    assert not df_current.duplicated().any()
+    # The run is complete: its hidden files are removed
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(p.name for p in file_paths)
+
+
+def test_append_csv_new_columns(tmp_path):
+    output_path = tmp_path / 'history.csv'
+    scrape._append_csv([{'manager': 1, 'points': 10}], output_path)
+    scrape._append_csv([{'points': 20, 'manager': 2}], output_path)
+    scrape._append_csv([{'manager': 3, 'points': 30, 'rank': 5}], output_path)
+    df = pd.read_csv(output_path)
+    assert list(df.columns) == ['manager', 'points', 'rank']
+    assert df['points'].tolist() == [10, 20, 30]
+    assert df['rank'].isna().tolist() == [True, True, False]
+
+
+def test_client_retry_after():
+    # Above 2 requests per second the server answers 429 with Retry-After: 1
+    with MockFplServer(nb_players=10, rate_limit=2) as server:
+        client = ScraperClient(rate_limit=None, backoff_factor=0.01)
+        start = time.monotonic()
+        responses = [client.get(f'{server.url_base}element-summary/{player_id}/') for player_id in range(1, 5)]
+        assert [response.status_code for response in responses] == [200] * 4
+        assert server.nb_throttled > 0
+        assert time.monotonic() - start >= 0.9
+
+
+def test_client_retry_backoff():
+    with MockFplServer(nb_players=10, error_rate=1.0) as server:
+        client = ScraperClient(rate_limit=None, retries=3, backoff_factor=0.1)
+        start = time.monotonic()
+        response = client.get(server.url_base + 'fixtures/')
+        # 1 request + 3 retries, backoff 0 / 0.2 / 0.4 s
+        assert response.status_code == 503
+        assert server.nb_requests == 4
+        assert time.monotonic() - start >= 0.6
+
+
+def test_client_retries_rate_limited():
+    # Retries take a token of the limiter: 4 attempts at 5 requests per second
+    with MockFplServer(nb_players=10, error_rate=1.0) as server:
+        client = ScraperClient(rate_limit=5, max_connections=1, retries=3, backoff_factor=0)
+        start = time.monotonic()
+        client.get(server.url_base + 'fixtures/')
+        assert server.nb_requests == 4
+        assert time.monotonic() - start >= 0.55
+
+
+def test_client_timeout():
+    with MockFplServer(nb_players=10, latency=1.0) as server:
+        client = ScraperClient(rate_limit=None, retries=0, timeout=0.2)
+        start = time.monotonic()
+        with pytest.raises(requests.exceptions.RequestException):
+            client.get(server.url_base + 'fixtures/')
+        assert time.monotonic() - start < 0.9
+
+
+def test_client_bootstrap_shared(tmp_path):
+    # A client shared by the scrapes downloads bootstrap once
+    with MockFplServer(nb_players=60) as server:
+        set_url_base(server.url_base)
+        try:
+            client = mock_client()
+            scrape_bootstrap(tmp_path / 'bootstrap', client=client)
+            scrape_player_detailed(tmp_path / 'players', shard_size=50, client=client)
+        finally:
+            set_url_base(URL_BASE)
+        assert server.nb_requests_by_path['/api/bootstrap-static/'] == 1
+        assert server.nb_requests == 61
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+import constants.fields as fld
+from fpl.constants.schema import get_dtype
+from fpl.pipeline import storage
+
+
+def get_dataset():
+    return pd.DataFrame({
+        fld.PLAYER_ID: [1, 2, 3],
+        fld.PLAYER_NAME: ['Salah', 'Kane', 'Salah'],
+        fld.GW: [1, 2, None],
+        fld.GAME_2_HOME: [True, np.nan, False],
+        fld.FIXTURE_K_GAME_NB.format(2): [1.0, 2.0, 0.0],
+        fld.RESULT_POINTS: [2, 6, 1],
+        'other': ['a', 'b', 'c']
+    })
+
+
+def test_get_dtype():
+    assert get_dtype(fld.PLAYER_POSITION) == 'category'
+    assert get_dtype(fld.GW) == 'Int64'
+    assert get_dtype(fld.FIXTURE_K_OPPONENT_STRENGTH.format(12)) == 'float64'
+    assert get_dtype('other') is None
+
+
+@pytest.mark.parametrize('suffix', ['.parquet', '.feather', '.csv'])
+def test_write_read_table(tmp_path, suffix):
+    path = tmp_path / f'dataset{suffix}'
+    storage.write_table(get_dataset(), path)
+    df = storage.read_table(path)
+    assert df[fld.PLAYER_ID].dtype == 'Int64'
+    assert df[fld.PLAYER_NAME].dtype == 'category'
+    assert df[fld.GAME_2_HOME].dtype == 'boolean'
+    assert df[fld.FIXTURE_K_GAME_NB.format(2)].dtype == 'Int64'
+    assert df[fld.RESULT_POINTS].dtype == 'float64'
+    assert df[fld.GW].isna().tolist() == [False, False, True]
+    pd.testing.assert_frame_equal(df, storage.apply_schema(get_dataset()))
+    assert list(storage.read_table(path, columns=[fld.PLAYER_ID]).columns) == [fld.PLAYER_ID]
+
+
+def test_read_partitions(tmp_path):
+    df = pd.DataFrame({
+        fld.SEASON_ID: [14, 14, 15, 15, 15],
+        fld.GW: [37, 38, 1, 1, 2],
+        fld.PLAYER_ID: [1, 1, 1, 2, 1]
+    })
+    storage.write_partitions(df, tmp_path)
+    assert storage.list_partitions(tmp_path) == [(14, 37), (14, 38), (15, 1), (15, 2)]
+    assert storage.latest_partition(tmp_path) == (15, 2)
+    df_gw = storage.read_partitions(tmp_path, seasons=[15], gameweeks=[1])
+    assert df_gw[fld.PLAYER_ID].tolist() == [1, 2]
+    assert len(storage.read_partitions(tmp_path, seasons=[16])) == 0
+    pd.testing.assert_frame_equal(storage.read_partitions(tmp_path), storage.apply_schema(df))
+    # Overwrite: the partitions which are not in the new dataset are removed
+    storage.write_partitions(df[df[fld.SEASON_ID] == 15], tmp_path, overwrite=True)
+    assert storage.list_partitions(tmp_path) == [(15, 1), (15, 2)]